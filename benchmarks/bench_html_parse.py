@@ -0,0 +1,71 @@
+"""
+Throughput of fast_parse (lxml, one pass) vs full_parse + get_metadata(extract_soup(...)) (BeautifulSoup, one soup each), on a sample of the lexis archive.
+
+Without the archive, --synthetic N runs on generated articles in the same NITF layout.
+
+Usage:
+    python benchmarks/bench_html_parse.py --index filtered_article_index_030923.csv [--json-path ...] [--sample 500]
+    python benchmarks/bench_html_parse.py --synthetic 500
+"""
+import argparse
+import random
+import time
+from sayswho.article_store import ArticleStore
+from sayswho.article_helpers import fast_parse, full_parse, extract_soup, get_metadata
+from sayswho.constants import json_path
+
+def synthetic_article(n: int, rng: random.Random) -> dict:
+    paras = "".join(
+        f'<p>Officers said,"there were {i} people at the scene," according to the report &amp; witnesses.</p>'
+        for i in range(rng.randint(5, 40))
+        )
+    content = (
+        f'<entry xmlns="http://www.w3.org/2005/Atom"><id>urn:contentItem:SYNTH-{n:05d}</id>'
+        '<content type="application/xml"><articleDoc xml:lang="en">'
+        '<nitf:body xmlns:nitf="http://iptc.org/std/NITF/2006-10-18/"><nitf:body.head>'
+        f'<nitf:hedline><nitf:hl1>Headline {n}</nitf:hl1><nitf:hl2>Subhead</nitf:hl2></nitf:hedline>'
+        '<nitf:byline><author><person><nameText>Jane Doe</nameText></person></author></nitf:byline>'
+        f'</nitf:body.head><nitf:body.content><bodyText><p>Summary.</p></bodyText><bodyText>{paras}</bodyText>'
+        '</nitf:body.content></nitf:body><metadata><wordCount number="500"/>'
+        '<publicationInfo><publicationName>The Daily News</publicationName></publicationInfo>'
+        '<dateText>June 1, 2020 Monday</dateText></metadata></articleDoc></content></entry>'
+        )
+    return {"ResultId": f"urn:contentItem:SYNTH-{n:05d}", "Document": {"Content": content}}
+
+def soup_parse(data: dict):
+    return full_parse(data, "\n"), get_metadata(extract_soup(data))
+
+def timed(f, articles: list) -> float:
+    start = time.perf_counter()
+    for data in articles:
+        f(data)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="csv with doc_id and file_name columns")
+    parser.add_argument("--json-path", default=json_path)
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, help="number of generated articles to use instead of the archive")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.synthetic:
+        articles = [synthetic_article(n, rng) for n in range(args.synthetic)]
+    elif args.index:
+        store = ArticleStore.from_csv(args.index, json_path=args.json_path)
+        doc_ids = rng.sample(list(store.index), min(args.sample, len(store)))
+        articles = [data for _, data in store.load_docs(doc_ids)]
+    else:
+        parser.error("pass --index or --synthetic")
+
+    mismatches = sum(fast_parse(data, "\n") != soup_parse(data) for data in articles)
+    n_chars = sum(len(data['Document']['Content']) for data in articles)
+    old = timed(soup_parse, articles)
+    new = timed(lambda data: fast_parse(data, "\n"), articles)
+    print(f"{len(articles)} articles ({n_chars/1e6:.1f}M chars of markup), {mismatches} mismatches")
+    print(f"soup {len(articles)/old:8.1f} docs/s | lxml {len(articles)/new:8.1f} docs/s | {old/new:5.1f}x")
+
+if __name__ == "__main__":
+    main()
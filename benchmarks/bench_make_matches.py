@@ -0,0 +1,101 @@
+"""
+Memory and time of Attributor.make_matches (adjacency-list joins) vs the old dense-matrix version, on synthetic entity-heavy documents.
+
+No models are needed: the Attributor is stubbed with the right number of quotes, clusters, persons and ents, and the pair lists are random but sparse (like real macro_ent_finder output).
+
+Usage:
+    python benchmarks/bench_make_matches.py [--sizes 100 500 2000] [--per-row 2]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+from sayswho.sayswho import Attributor
+from sayswho.constants import QuoteEntMatch, QuoteClusterMatch
+
+def make_matrix(a: Attributor, key: str, pairs: list) -> np.ndarray:
+    """
+    Dense 0/1 matrix of a pair list, ie quotes x ents for "quotes_ents" (what Attributor.make_matrix used to do).
+    """
+    x, y = key.split("_")
+    m = np.zeros([len(getattr(a, _)) for _ in [x,y]])
+    for i,j in pairs:
+        m[i,j] = 1
+    return m
+
+def dense_make_matches(a: Attributor, pairs_dicto: dict):
+    """
+    make_matches as it was, with dense float64 matrices.
+    """
+    arrays = {k: make_matrix(a, k, v) for k,v in pairs_dicto.items()}
+    ent_matches = [
+        QuoteEntMatch(quote_index=i, ent_index=j) for i,j in np.concatenate(
+            [
+                np.transpose(np.nonzero(arrays['quotes_ents'])),
+                np.transpose(np.nonzero(arrays['quotes_clusters'].dot(arrays['clusters_ents']))),
+                np.transpose(np.nonzero(arrays['quotes_persons'].dot(arrays['persons_ents']))),
+                np.transpose(np.nonzero(
+                    arrays['quotes_clusters'].dot(arrays['clusters_persons'].dot(arrays['persons_ents']))
+                    ))
+            ]
+        )]
+    a.ent_matches = sorted(list(set(ent_matches + a.get_manual_quote_ent_pairs())), key=lambda m: m.quote_index)
+    a.quote_matches = sorted(
+        list(set([
+        QuoteClusterMatch(i, j) for i,j in np.concatenate(
+            (np.transpose(np.nonzero(arrays['quotes_persons'].dot(arrays['clusters_persons'].T))),
+             np.transpose(np.nonzero(arrays['quotes_clusters'])))
+        )])), key=lambda m: m.quote_index
+    )
+
+def make_stub(n: int, per_row: float, seed: int=0):
+    """
+    Attributor with n quotes, n/2 clusters, 2n persons and 4n ents, plus random pair lists with about per_row pairs for each quote/cluster/person.
+    """
+    rng = random.Random(seed)
+    sizes = {"quotes": n, "clusters": max(n // 2, 1), "persons": 2 * n, "ents": 4 * n}
+    a = Attributor(ner_nlp=None)
+    a.models["ner_nlp"] = None
+    a.quotes = [SimpleNamespace(speaker=[SimpleNamespace(text="he")])] * sizes["quotes"]
+    a.clusters = {i: [] for i in range(sizes["clusters"])}
+    a.persons = [None] * sizes["persons"]
+    a.ner_doc = SimpleNamespace(ents=[None] * sizes["ents"])
+
+    pairs_dicto = {}
+    for key in ['quotes_persons', 'quotes_ents', 'quotes_clusters', 'clusters_ents', 'clusters_persons', 'persons_ents']:
+        x, y = key.split("_")
+        n_pairs = max(int(sizes[x] * per_row), 1)
+        pairs_dicto[key] = [(rng.randrange(sizes[x]), rng.randrange(sizes[y])) for _ in range(n_pairs)]
+    return a, pairs_dicto
+
+def measure(fn, *args) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="*", type=int, default=[100, 500, 2000])
+    parser.add_argument("--per-row", type=float, default=2)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        a, pairs_dicto = make_stub(n, args.per_row)
+        new_time, new_peak = measure(a.make_matches, pairs_dicto)
+        new = (a.ent_matches, a.quote_matches)
+        old_time, old_peak = measure(dense_make_matches, a, pairs_dicto)
+        assert new == (a.ent_matches, a.quote_matches)
+        print(
+            f"{n:>5} quotes, {4*n:>5} ents | "
+            f"dense: {old_time*1000:9.1f}ms {old_peak/2**20:8.1f}MiB | "
+            f"joins: {new_time*1000:8.1f}ms {new_peak/2**20:7.2f}MiB"
+            )
+
+if __name__ == "__main__":
+    main()
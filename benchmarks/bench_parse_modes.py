@@ -0,0 +1,53 @@
+"""
+Wall time per article for the two Attributor parse modes: separate docs (default) and shared doc.
+
+Runs on the article texts in tests/quote_parse_test_files by default.
+
+Usage:
+    python benchmarks/bench_parse_modes.py [--files PATH ...] [--repeat N]
+"""
+import argparse
+import glob
+import statistics
+import time
+from sayswho.sayswho import Attributor
+
+def time_mode(a: Attributor, texts: list, repeat: int=1) -> list:
+    """
+    Returns wall time (seconds) of a.attribute for each text, best of repeat.
+    """
+    times = []
+    for t in texts:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            a.attribute(t)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times.append(best)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=sorted(glob.glob("tests/quote_parse_test_files/*.txt")))
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = [open(f).read() for f in args.files]
+    a = Attributor()
+
+    # warm up, so model initialization isn't charged to the first article
+    a.attribute(texts[0])
+
+    for shared_doc in [False, True]:
+        a.shared_doc = shared_doc
+        times = time_mode(a, texts, args.repeat)
+        print(
+            f"{'shared' if shared_doc else 'separate':>8}: "
+            f"mean {statistics.mean(times):.3f}s, "
+            f"median {statistics.median(times):.3f}s, "
+            f"total {sum(times):.2f}s over {len(times)} articles"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Quote pairing on long documents: get_qtok_idx_pairs vs old_get_qtok_idx_pairs, and the bisect filter_quote_tokens vs the old any() scan.
+
+Uses a blank English tokenizer, so no models are needed.
+
+Usage:
+    python benchmarks/bench_quote_pairs.py [--sizes 50 200 800] [--repeat 3]
+"""
+import argparse
+import random
+import timeit
+import spacy
+import regex as re
+from spacy.tokens import Doc
+from sayswho.quote_helpers import get_qtok_idx_pairs, filter_quote_tokens
+from sayswho.constants import QUOTATION_MARK_PAIRS
+
+def old_get_qtok_idx_pairs(doc: Doc) -> list:
+    """
+    get_qtok_idx_pairs as it was, checking every later quote token for each opening mark.
+    """
+    qtoks = [tok for tok in doc if tok.is_quote or (re.match(r"(\n)+", tok.text))]
+    qtok_idx_pairs = [(-1,-1)]
+    for n, q in enumerate(qtoks):
+        if (
+            not bool(q.whitespace_)
+            and q.i not in [q_[1] for q_ in qtok_idx_pairs] 
+            and q.i > qtok_idx_pairs[-1][1]
+            ):
+            for q_ in qtoks[n+1:]:
+                if (ord(q.text), ord(q_.text)) in QUOTATION_MARK_PAIRS:
+                    qtok_idx_pairs.append((q.i, q_.i))
+                    break  
+    return qtok_idx_pairs[1:]
+
+def make_text(n_quotes: int, seed: int=0) -> str:
+    """
+    Op-ed/transcript-like text with n_quotes quotations, some of them unclosed or using curly marks.
+    """
+    rng = random.Random(seed)
+    marks = [('"', '"'), ("“", "”"), ("‘", "’"), ('"', "")]
+    words = "the police said that officers were called to the scene on Tuesday night".split()
+    paras = []
+    for _ in range(n_quotes):
+        open_, close = rng.choice(marks)
+        quote = " ".join(rng.choices(words, k=rng.randint(4, 20)))
+        filler = " ".join(rng.choices(words, k=rng.randint(5, 30)))
+        paras.append(f"{filler}. {open_}{quote},{close} he said.")
+    return "\n".join(paras)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="*", type=int, default=[50, 200, 800])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nlp = spacy.blank("en")
+    for n_quotes in args.sizes:
+        doc = nlp(make_text(n_quotes))
+        assert get_qtok_idx_pairs(doc) == old_get_qtok_idx_pairs(doc)
+        pairs = get_qtok_idx_pairs(doc)
+
+        new = min(timeit.repeat(lambda: get_qtok_idx_pairs(doc), number=1, repeat=args.repeat))
+        old = min(timeit.repeat(lambda: old_get_qtok_idx_pairs(doc), number=1, repeat=args.repeat))
+        new_filter = min(timeit.repeat(
+            lambda: [filter_quote_tokens(tok, pairs) for tok in doc], number=1, repeat=args.repeat
+            ))
+        old_filter = min(timeit.repeat(
+            lambda: [any(i <= tok.i <= j for i, j in pairs) for tok in doc], number=1, repeat=args.repeat
+            ))
+        print(
+            f"{n_quotes:>5} quotes, {len(doc):>6} tokens | "
+            f"pairs: old {old*1000:8.2f}ms new {new*1000:7.2f}ms ({old/new:5.1f}x) | "
+            f"filter: old {old_filter*1000:8.2f}ms new {new_filter*1000:7.2f}ms ({old_filter/new_filter:5.1f}x)"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Throughput of prep_text_for_quote_detection (single-pass para_quote_fixer) vs old_para_quote_fixer (re.search loop), on the test corpus and on synthetic wire copy with many glued quotes.
+
+Usage:
+    python benchmarks/bench_quote_prep.py [--repeat 5] [--glued 100 500 2000]
+"""
+import argparse
+import glob
+import timeit
+import regex as re
+from sayswho.quote_helpers import prep_text_for_quote_detection
+from sayswho.constants import all_quotes, brack_regex, double_quotes, double_quotes_nospace_regex
+
+def old_para_quote_fixer(p):
+    """
+    para_quote_fixer as it was, re-running re.search from the start of the paragraph for every glued quote.
+    """
+    if not p:
+        return
+    p = p.strip()
+    p = p.replace("\'\'", "\"")
+    p = re.sub(r"(.{3,8}s\')(\s)", r"\1x\2", p)
+
+    while re.search(double_quotes_nospace_regex, p):
+        match = re.search(double_quotes_nospace_regex, p)
+        if len(re.findall(brack_regex.format(double_quotes), p[:match.start()])) % 2 != 0:
+            replacer = '" '
+        else:
+            replacer = ' "'
+        p = p[:match.start()] + replacer + p[match.end():]
+    if (
+        not (p[0] == "'" and p[-1] == "'") 
+        and p[0] in all_quotes 
+        and len(re.findall(brack_regex.format(double_quotes), p[1:])) % 2 == 0
+        ):
+        p += '"'
+    return p
+
+
+def old_prep_text(t: str, para_char: str="\n") -> str:
+    return para_char.join([old_para_quote_fixer(p) for p in t.split(para_char) if p])
+
+def corpus() -> list:
+    files = sorted(glob.glob("tests/quote_parse_test_files/*.txt")) + ["quote_finder_for_tests.txt", "tests/qa_test_file.txt"]
+    return [open(f).read() for f in files]
+
+def glued_paragraph(n_quotes: int) -> str:
+    """
+    One long paragraph where every quote is glued to its neighbours, ie '...said,"We are...",he added...'
+    """
+    return "".join(f'Officers said,"there were {n} people at the scene",according to the report. ' for n in range(n_quotes // 2))
+
+def report(label: str, texts: list, repeat: int):
+    n_chars = sum(len(t) for t in texts)
+    assert [prep_text_for_quote_detection(t) for t in texts] == [old_prep_text(t) for t in texts]
+    new = min(timeit.repeat(lambda: [prep_text_for_quote_detection(t) for t in texts], number=1, repeat=repeat))
+    old = min(timeit.repeat(lambda: [old_prep_text(t) for t in texts], number=1, repeat=repeat))
+    print(
+        f"{label:>24} ({n_chars/1000:8.1f}k chars) | "
+        f"old {n_chars/old/1e6:6.2f}M chars/s | new {n_chars/new/1e6:6.2f}M chars/s | {old/new:6.1f}x"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--glued", nargs="*", type=int, default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    report("test corpus", corpus(), args.repeat)
+    for n_quotes in args.glued:
+        report(f"{n_quotes} glued quotes", [glued_paragraph(n_quotes)], args.repeat)
+
+if __name__ == "__main__":
+    main()
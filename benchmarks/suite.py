@@ -0,0 +1,348 @@
+"""
+Offline benchmark suite for the quote extraction, matching and rendering hot paths.
+
+No models are needed. Inputs are fixed:
+    - synthetic articles at several sizes and quote densities, built as fully annotated Docs (POS, lemmas, dependencies, PERSON ents, law enforcement ents and coref clusters), so every stage has realistic work to do
+    - the texts in tests/ and quote_finder_for_tests.txt, tokenized with a blank English pipeline plus a sentencizer (no POS, so only the text prep, quote pairing and windowing stages run on them)
+
+Each (case, stage) pair is timed separately with timeit (best of --repeat). Results can be saved as a JSON baseline and later runs compared against it; the run fails (exit code 1) if any stage got slower by more than --threshold.
+
+Usage:
+    python benchmarks/suite.py --save benchmarks/baseline.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json [--threshold 0.15]
+    python benchmarks/suite.py --only direct_quotations macro_ent_finder --cases synthetic-m-dense
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import spacy
+from spacy.tokens import Doc, Span
+from sayswho.sayswho import Attributor
+from sayswho.quotes import direct_quotations
+from sayswho.quote_helpers import prep_text_for_quote_detection, get_qtok_idx_pairs, windower, DocIndex
+from sayswho.attribution_helpers import prune_cluster_people
+from sayswho.rendering_helpers import render_attr_with_highlights, yield_quotes
+from sayswho.constants import color_key
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "the officers found a weapon near car and there were several people at scene when shots "
+    "fired into crowd outside bar late on night after argument over money between two men who "
+    "knew each other from neighborhood investigation is still ongoing witnesses asked come forward"
+).split()
+FIRST_NAMES = ["John", "Maria", "David", "Keisha", "Robert", "Ana", "Michael", "Linda", "James", "Sofia"]
+LAST_NAMES = ["Smith", "Garcia", "Johnson", "Williams", "Brown", "Lopez", "Miller", "Davis", "Wilson", "Moore"]
+TITLES = ["Officer", "Sgt.", "Detective", "Chief", "Lt."]
+AGENCIES = [["Springfield", "Police", "Department"], ["County", "Sheriff", "'s", "Office"], ["State", "Police"]]
+
+# (name, paragraphs) and (name, share of sentences that are quotes)
+SIZES = [("s", 10), ("m", 40), ("l", 160)]
+DENSITIES = [("sparse", 0.15), ("dense", 0.6)]
+
+class DocBuilder:
+    """
+    Accumulates tokens with their annotations, then builds one Doc (plus the NER doc) at the end.
+    """
+    def __init__(self):
+        self.words, self.spaces, self.pos, self.lemmas, self.deps, self.heads, self.sent_starts = [], [], [], [], [], [], []
+        self.persons, self.agencies = [], []
+        self.mentions = {}
+
+    def add(self, text: str, pos: str, dep: str, head: int=None, lemma: str=None, space: bool=True) -> int:
+        i = len(self.words)
+        self.words.append(text)
+        self.spaces.append(space)
+        self.pos.append(pos)
+        self.lemmas.append(lemma or text.lower())
+        self.deps.append(dep)
+        self.heads.append(head)
+        self.sent_starts.append(False)
+        return i
+
+    def sentence(self, tokens: list):
+        """
+        tokens - (text, pos, dep, lemma, space, head key) tuples; head key is the position (in tokens) of the head, or None for the root
+        """
+        start = len(self.words)
+        for text, pos, dep, lemma, space, head in tokens:
+            self.add(text, pos, dep, None if head is None else start + head, lemma, space)
+        self.sent_starts[start] = True
+        for i in range(start, len(self.words)):
+            if self.heads[i] is None:
+                self.heads[i] = i
+        return start
+
+    def linebreak(self):
+        # linebreaks hang off the previous sentence's root, like the "\n" tokens in real parses
+        root = max(i for i in range(len(self.words)) if self.heads[i] == i)
+        self.spaces[-1] = False
+        self.add("\n", "SPACE", "dep", root, space=False)
+
+    def build(self, vocab) -> tuple:
+        doc = Doc(
+            vocab, words=self.words, spaces=self.spaces, pos=self.pos, lemmas=self.lemmas,
+            deps=self.deps, heads=self.heads, sent_starts=self.sent_starts
+            )
+        doc.ents = [Span(doc, s, e, "PERSON") for s, e in self.persons]
+        for n, spans in enumerate(self.mentions.values()):
+            doc.spans[f"coref_clusters_{n+1}"] = [doc[s:e] for s, e in spans]
+        ner_doc = Doc(vocab, words=self.words, spaces=self.spaces)
+        ner_doc.ents = [Span(ner_doc, s, e, "LAW ENFORCEMENT") for s, e in self.agencies]
+        return doc, ner_doc
+
+def quote_words(rng: random.Random, n: int) -> list:
+    return [(w, "NOUN", "dobj", None, True, 0) for w in rng.sample(WORDS, n)]
+
+def name_tokens(name: tuple, title: str=None) -> list:
+    return ([(title, "PROPN", "compound", None, True, "last")] if title else []) + [
+        (name[0], "PROPN", "compound", None, True, "last"),
+        (name[1], "PROPN", "nsubj", None, True, "verb")
+        ]
+
+def agency_tokens(agency: list) -> list:
+    return [("the", "DET", "det", "the", True, "last")] + [
+        (w, "PROPN", "nsubj" if n == len(agency) - 1 else "compound", None, True, "verb" if n == len(agency) - 1 else "last")
+        for n, w in enumerate(agency)
+        ]
+
+def resolve(tokens: list) -> list:
+    """
+    Swaps the "verb" (sentence root) and "last" (the speaker's last name) head keys for positions.
+    """
+    heads = {
+        "verb": next(n for n, t in enumerate(tokens) if t[5] is None),
+        "last": next((n for n, t in enumerate(tokens) if t[1] == "PROPN" and t[2] == "nsubj"), None)
+        }
+    return [t[:5] + (heads.get(t[5], t[5]) if t[5] is not None else None,) for t in tokens]
+
+def synthetic_doc(vocab, n_paras: int, quote_density: float, seed: int=0) -> tuple:
+    """
+    A wire-style crime article: paragraphs of 1-3 sentences, where each sentence is a quote with a cue before or after it, a pronoun sentence ("He said ...") or a narrative sentence mentioning an agency.
+
+    Output:
+        doc, ner_doc (Doc)
+    """
+    rng = random.Random(seed)
+    b = DocBuilder()
+    people = [(f, l) for f in FIRST_NAMES for l in LAST_NAMES]
+    rng.shuffle(people)
+    cast = people[:max(2, n_paras // 8)]
+    last_person = None
+
+    for _ in range(n_paras):
+        for _ in range(rng.randint(1, 3)):
+            kind = rng.random()
+            person = rng.choice(cast)
+            if kind < quote_density:
+                content = quote_words(rng, rng.randint(6, 18))
+                content = [(content[0][0].capitalize(),) + content[0][1:]] + content[1:]
+                speaker_kind = rng.random()
+                if speaker_kind < 0.6:
+                    # "Content," said Officer Name. / "Content," said the Springfield Police Department.
+                    speaker = name_tokens(person, rng.choice(TITLES)) if speaker_kind < 0.4 else agency_tokens(rng.choice(AGENCIES))
+                    tokens = [('"', "PUNCT", "punct", None, False, "verb")] + content[:-1] + [
+                        (content[-1][0],) + content[-1][1:4] + (False, 0),
+                        (",", "PUNCT", "punct", None, False, "verb"),
+                        ('"', "PUNCT", "punct", None, True, "verb"),
+                        ("said", "VERB", "ROOT", "say", True, None),
+                        ] + speaker + [(".", "PUNCT", "punct", None, True, "verb")]
+                else:
+                    # Name said, "Content."
+                    tokens = name_tokens(person) + [
+                        ("said", "VERB", "ROOT", "say", False, None),
+                        (",", "PUNCT", "punct", None, True, "verb"),
+                        ('"', "PUNCT", "punct", None, False, "verb"),
+                        ] + content[:-1] + [
+                        (content[-1][0],) + content[-1][1:4] + (False, 0),
+                        (".", "PUNCT", "punct", None, False, "verb"),
+                        ('"', "PUNCT", "punct", None, True, "verb"),
+                        ]
+                tokens = [t[:5] + ("verb" if t[5] == 0 else t[5],) for t in tokens]
+            elif kind < quote_density + (1 - quote_density) / 3 and last_person is not None:
+                # He said the investigation is ongoing.
+                person = last_person
+                tokens = [("He", "PRON", "nsubj", "he", True, "verb"), ("said", "VERB", "ROOT", "say", True, None)] + [
+                    (w,) + t[1:4] + (True, "verb") for w, t in zip(rng.sample(WORDS, 6), quote_words(rng, 6))
+                    ] + [(".", "PUNCT", "punct", None, True, "verb")]
+            else:
+                # The Springfield Police Department said Name was arrested.
+                agency = rng.choice(AGENCIES)
+                tokens = [("The", "DET", "det", "the", True, "verb")] + [
+                    (w, "PROPN", "nsubj" if n == len(agency) - 1 else "compound", None, True, "verb") for n, w in enumerate(agency)
+                    ] + [("said", "VERB", "ROOT", "say", True, None)] + [
+                    (person[0], "PROPN", "compound", None, True, "verb"),
+                    (person[1], "PROPN", "nsubjpass", None, True, "verb"),
+                    ("was", "AUX", "auxpass", "be", True, "verb"),
+                    ("arrested", "VERB", "ccomp", "arrest", True, "verb"),
+                    (".", "PUNCT", "punct", None, True, "verb")
+                    ]
+
+            tokens = resolve(tokens)
+            start = b.sentence(tokens)
+            for n, t in enumerate(tokens):
+                if t[0] == "He":
+                    b.mentions.setdefault(person, []).append((start + n, start + n + 1))
+                elif t[0] == person[0] and n + 1 < len(tokens) and tokens[n + 1][0] == person[1]:
+                    b.persons.append((start + n, start + n + 2))
+                    b.mentions.setdefault(person, []).append((start + n, start + n + 2))
+            agency_starts = [
+                n for n, t in enumerate(tokens)
+                if t[0] in [a[0] for a in AGENCIES] and n and tokens[n - 1][0] in ("The", "the")
+                ]
+            for n in agency_starts:
+                agency = next(a for a in AGENCIES if a[0] == tokens[n][0])
+                b.agencies.append((start + n, start + n + len(agency)))
+            last_person = person
+        b.linebreak()
+    return b.build(vocab)
+
+def corpus_texts() -> dict:
+    files = sorted(glob.glob(os.path.join(REPO, "tests", "quote_parse_test_files", "*.txt"))) + [
+        os.path.join(REPO, "tests", "qa_test_file.txt"),
+        os.path.join(REPO, "quote_finder_for_tests.txt")
+        ]
+    return {os.path.relpath(f, REPO): open(f).read() for f in files}
+
+def load_attributor(doc: Doc, ner_doc: Doc) -> Attributor:
+    a = Attributor(ner_nlp="synthetic")
+    a.load_docs(doc, doc, ner_doc)
+    return a
+
+def make_cases(nlp) -> dict:
+    """
+    case name -> (text, doc, ner_doc or None)
+    """
+    cases = {}
+    for size_name, n_paras in SIZES:
+        for density_name, density in DENSITIES:
+            doc, ner_doc = synthetic_doc(nlp.vocab, n_paras, density, seed=n_paras)
+            cases[f"synthetic-{size_name}-{density_name}"] = (doc.text, doc, ner_doc)
+    texts = corpus_texts()
+    corpus = "\n".join(texts.values())
+    cases["corpus"] = (corpus, nlp(prep_text_for_quote_detection(corpus)), None)
+    return cases
+
+def stage_functions(text: str, doc: Doc, ner_doc: Doc) -> dict:
+    """
+    stage name -> zero-argument callable, for everything that can run on this case.
+    """
+    pairs = get_qtok_idx_pairs(doc)
+    contents = [doc[i:j] for i, j in pairs]
+
+    def windows():
+        index = DocIndex(doc)
+        for content in contents:
+            windower(content, "overlap", index)
+            windower(content, "linebreaks", index)
+
+    stages = {
+        "prep_text_for_quote_detection": lambda: prep_text_for_quote_detection(text),
+        "direct_quotations": lambda: list(direct_quotations(doc)),
+        "windower": windows,
+    }
+    if ner_doc is None:
+        return stages
+
+    a = load_attributor(doc, ner_doc)
+    pairs_dicto = a.macro_ent_finder()
+    clusters = [
+        cluster for k, cluster in doc.spans.items() if k.startswith("coref")
+        ]
+    a.make_matches(pairs_dicto)
+    stages.update({
+        "prune_cluster_people": lambda: [prune_cluster_people(cluster) for cluster in clusters],
+        "macro_ent_finder": a.macro_ent_finder,
+        "make_matches": lambda: a.make_matches(pairs_dicto),
+        "render_attr_with_highlights": lambda: render_attr_with_highlights(a, color_key),
+        "yield_quotes": lambda: list(yield_quotes(a)),
+    })
+    return stages
+
+def time_stage(f, repeat: int) -> float:
+    """
+    Best time per call, in seconds.
+    """
+    timer = timeit.Timer(f)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run(repeat: int, only: list=None, case_names: list=None) -> dict:
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    results = {}
+    for case, (text, doc, ner_doc) in make_cases(nlp).items():
+        if case_names and case not in case_names:
+            continue
+        results[case] = {"tokens": len(doc), "stages": {}}
+        for stage, f in stage_functions(text, doc, ner_doc).items():
+            if only and stage not in only:
+                continue
+            results[case]["stages"][stage] = time_stage(f, repeat)
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Output:
+        (case, stage, baseline seconds, new seconds, ratio) for every stage that got slower than baseline * (1 + threshold)
+    """
+    regressions = []
+    for case, result in results.items():
+        for stage, seconds in result["stages"].items():
+            old = baseline.get("results", {}).get(case, {}).get("stages", {}).get(stage)
+            if old and seconds > old * (1 + threshold):
+                regressions.append((case, stage, old, seconds, seconds / old))
+    return regressions
+
+def print_results(results: dict, baseline: dict=None):
+    for case, result in results.items():
+        print(f"{case} ({result['tokens']} tokens)")
+        for stage, seconds in result["stages"].items():
+            line = f"    {stage:<32}{seconds*1e3:>10.3f} ms"
+            old = (baseline or {}).get("results", {}).get(case, {}).get("stages", {}).get(stage)
+            if old:
+                line += f"  (baseline {old*1e3:.3f} ms, {seconds/old:5.2f}x)"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown vs the baseline (0.15 = 15%%)")
+    parser.add_argument("--only", nargs="*", help="only run these stages")
+    parser.add_argument("--cases", nargs="*", help="only run these cases")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.only, args.cases)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "spacy": spacy.__version__,
+                "machine": platform.platform(),
+                "repeat": args.repeat,
+                "results": results
+            }, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for case, stage, old, new, ratio in regressions:
+            print(f"REGRESSION {case} / {stage}: {old*1e3:.3f} ms -> {new*1e3:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions over {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,26 @@ Separating the code to load articles into its own doc.
 It was getting redundant.
 """
 import os
-import json
 from bs4 import BeautifulSoup
+from lxml import etree
 from collections import Counter
 import regex as re
 import warnings
+from typing import Iterable, Iterator, Tuple
 from .quote_helpers import prep_text_for_quote_detection
-from .constants import json_path, file_key
+from .article_store import ArticleStore
+from . import constants
+
+_store = None
+
+def get_store() -> ArticleStore:
+    """
+    Returns the shared ArticleStore (built from file_key on first use).
+    """
+    global _store
+    if _store is None:
+        _store = ArticleStore(constants.file_key, json_path=constants.json_path)
+    return _store
 
 def load_doc(doc_id: str) -> dict:
     """
@@ -18,16 +31,23 @@ def load_doc(doc_id: str) -> dict:
 
     Input:
         doc_id (str) - lexis document ID in the format (\S{4}-)-0{4}-00
-        df (DataFrame) - filtered dataframe of doc_id the json file (file_name) that contains the document
 
     Output:
         data (dict) - lexis document query result
     """
-    file_name = next(k['file_name'] for k in file_key if k['doc_id']==doc_id)
+    return get_store().load_doc(doc_id)
+
+def load_docs(doc_ids: Iterable[str]) -> Iterator[Tuple[str, dict]]:
+    """
+    Loads many documents, reading each archive file once. Results are grouped by file, not in the order of doc_ids.
 
-    data = json.load(open(os.path.join(json_path, file_name)))
-    data = next(d for d in data if doc_id in d['ResultId'])
-    return data
+    Input:
+        doc_ids (iterable of str) - lexis document IDs
+
+    Output:
+        (doc_id, data) tuples
+    """
+    return get_store().load_docs(doc_ids)
 
 def full_parse(data: dict, char: str="\n", exp: bool=False) -> str:
     """
@@ -75,6 +95,81 @@ def biggest_bodytext(soup):
     """
     return sorted(soup.find_all("bodytext"), key= lambda t: len(t.text), reverse=True)[0]
 
+def extract_tree(data: dict) -> etree._Element:
+    """
+    lxml version of extract_soup. Same parser (libxml2's HTML parser) as BeautifulSoup's "lxml" feature, so the tree has the same (lowercased) tag names, without building a soup on top.
+
+    Input:
+        data (dict) - article data from query json
+
+    Output:
+        root element of the document content
+    """
+    return etree.fromstring(
+        data['Document']['Content'].encode("utf-8"), 
+        etree.HTMLParser(encoding="utf-8")
+    )
+
+def element_text(el: etree._Element) -> str:
+    """
+    Equivalent of soup .text: all the text inside el, without comments.
+    """
+    return "".join(el.itertext())
+
+_metadata_tags = {"id", "nitf:hedline", "publicationname", "datetext", "nametext", "wordcount"}
+
+def scan_tree(root: etree._Element) -> Tuple[dict, list]:
+    """
+    One pass over the tree, collecting the first element of each metadata tag and every bodytext element.
+
+    Output:
+        firsts (dict) - tag name -> first element with that tag
+        bodytexts (list) - bodytext elements, in document order
+    """
+    firsts = {}
+    bodytexts = []
+    for el in root.iter():
+        tag = el.tag
+        if tag == "bodytext":
+            bodytexts.append(el)
+        elif tag in _metadata_tags and tag not in firsts:
+            firsts[tag] = el
+    return firsts, bodytexts
+
+def fast_parse(data: dict, char: str="\n", exp: bool=False) -> Tuple[str, dict]:
+    """
+    Does full_parse(data) and get_metadata(extract_soup(data)) in one go, with lxml and a single pass over the tree. Output is the same as the soup versions.
+
+    Input:
+        data (dict) - data of article as extracted from json archive file
+        char (str) - character to connect text from all article paragraphs
+
+    Output:
+        full_text (str) - article text, joined by char
+        metadata (dict) - article info to format article_template.html
+    """
+    firsts, bodytexts = scan_tree(extract_tree(data))
+    if not bodytexts:
+        raise IndexError("no bodytext in article")
+
+    # biggest bodytext, first one if there's a tie (like the stable sort in biggest_bodytext)
+    bodytext = max(bodytexts, key=lambda t: len(element_text(t)))
+    full_text = char.join([element_text(p).strip() for p in bodytext.iter("p")])
+    full_text = prep_text_for_quote_detection(full_text, "\n", exp=exp)
+
+    hedline = firsts.get("nitf:hedline")
+    metadata = {
+        'doc_id': element_text(firsts["id"]).replace("urn:contentItem:", ""),
+        'headline': " - ".join(
+            [element_text(t) for t in hedline.iterdescendants() if isinstance(t.tag, str)]
+            ) if hedline is not None else "",
+        'publication': element_text(firsts["publicationname"]) if "publicationname" in firsts else "",
+        'date': element_text(firsts["datetext"]) if "datetext" in firsts else "",
+        'byline': element_text(firsts["nametext"]) if "nametext" in firsts else "",
+        'wordcount': firsts["wordcount"].attrib['number']
+    }
+    return full_text, metadata
+
 def clean_article(t :str) -> str:
     """
     TODO: Amend with more text to remove
@@ -146,18 +241,10 @@ def pair_quote_matches(quotes, matches):
     
     This creates one index for each quote/match pair for Jinja to parse...
     instead of having to deal with index changes when quotes have multiple matches.
-    """
-    quote_matches = []
-    for q in quotes:
-        qm = []
-        for m in matches:
-            if m.content == q.content.text:
-                qm.append(m)
-        quote_matches.append((q, qm))
-    return quote_matches
-
-
-
-
-
 
+    Matches are indexed by their content text first, so this is linear in quotes + matches instead of comparing every pair.
+    """
+    matches_by_content = {}
+    for m in matches:
+        matches_by_content.setdefault(m.content, []).append(m)
+    return [(q, list(matches_by_content.get(q.content.text, []))) for q in quotes]
@@ -0,0 +1,166 @@
+"""
+Indexed, cached access to the lexis json archive.
+
+load_doc used to scan file_key for every doc_id, then json.load the whole archive file and scan it again. ArticleStore builds the doc_id -> file index once, remembers where each doc sits in its file, and keeps recently parsed archive files in an LRU cache.
+"""
+import os
+import csv
+import json
+from collections import OrderedDict
+from typing import Iterable, Iterator, Tuple
+from .constants import json_path
+
+def result_doc_id(result: dict) -> str:
+    """
+    Gets the doc_id out of a query result's ResultId (which looks like "urn:contentItem:<doc_id>").
+    """
+    return result['ResultId'].split(":")[-1]
+
+class ArticleStore:
+    """
+    Loads lexis query results by doc_id.
+
+    Keeps a doc_id -> (file_name, position) index. Positions are filled in for every doc in a file the first time that file is parsed (or up front, from a saved index). Parsed files are kept in an LRU cache, capped by the total on-disk size of the cached files.
+    """
+    def __init__(
+            self,
+            file_key: Iterable[dict],
+            json_path: str=json_path,
+            max_bytes: int=2*1024**3
+            ):
+        """
+        Input:
+            file_key (iterable of dict) - records with "doc_id" and "file_name" (and optionally "position")
+            json_path (str) - directory of the crime_query_results_*.json files
+            max_bytes (int) - cap on the on-disk size of cached archive files
+        """
+        self.json_path = json_path
+        self.max_bytes = max_bytes
+        self.index = {
+            k['doc_id']: (k['file_name'], k.get('position'))
+            for k in file_key
+            }
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file_key(cls, path: str, **kwargs) -> "ArticleStore":
+        """
+        Builds the store from doc_file_key.json (or a saved index from save_index).
+        """
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "ArticleStore":
+        """
+        Builds the store from a csv with doc_id and file_name columns (ie filtered_article_index_030923.csv).
+        """
+        with open(path, newline="") as f:
+            return cls(list(csv.DictReader(f)), **kwargs)
+
+    def save_index(self, path: str):
+        """
+        Saves the index, including any positions found so far, in the same format as doc_file_key.json.
+        """
+        with open(path, "w") as f:
+            json.dump(
+                [
+                    {"doc_id": doc_id, "file_name": file_name, "position": position}
+                    for doc_id, (file_name, position) in self.index.items()
+                ], f
+            )
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def file_name(self, doc_id: str) -> str:
+        try:
+            return self.index[doc_id][0]
+        except KeyError:
+            raise KeyError(f"{doc_id} is not in the article index")
+
+    def load_file(self, file_name: str) -> list:
+        """
+        Returns the parsed contents of an archive file, from the cache if possible.
+
+        Parsing a file also records the position of every doc in it.
+        """
+        if file_name in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(file_name)
+            return self.cache[file_name][0]
+
+        self.misses += 1
+        path = os.path.join(self.json_path, file_name)
+        with open(path) as f:
+            data = json.load(f)
+
+        for position, result in enumerate(data):
+            doc_id = result_doc_id(result)
+            if doc_id in self.index and self.index[doc_id][0] == file_name:
+                self.index[doc_id] = (file_name, position)
+
+        size = os.path.getsize(path)
+        self.cache[file_name] = (data, size)
+        self.cache_bytes += size
+        self.evict()
+        return data
+
+    def evict(self):
+        """
+        Drops least recently used files until the cache is under max_bytes. Always keeps the newest file.
+        """
+        while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+            _, (_, size) = self.cache.popitem(last=False)
+            self.cache_bytes -= size
+
+    def clear(self):
+        self.cache.clear()
+        self.cache_bytes = 0
+
+    def find(self, doc_id: str, data: list) -> dict:
+        """
+        Gets doc_id out of the parsed contents of its file, using the indexed position when there is one.
+        """
+        position = self.index[doc_id][1]
+        if position is not None and position < len(data) and doc_id in data[position]['ResultId']:
+            return data[position]
+        return next(d for d in data if doc_id in d['ResultId'])
+
+    def load_doc(self, doc_id: str) -> dict:
+        """
+        Input:
+            doc_id (str) - lexis document ID
+
+        Output:
+            data (dict) - lexis document query result
+        """
+        data = self.load_file(self.file_name(doc_id))
+        return self.find(doc_id, data)
+
+    def load_docs(self, doc_ids: Iterable[str]) -> Iterator[Tuple[str, dict]]:
+        """
+        Bulk version of load_doc. Groups doc_ids by file, so each archive file is read once.
+
+        Results come out grouped by file (files in the order they first appear in doc_ids, docs in their original order within each file), not in the order of doc_ids.
+
+        Input:
+            doc_ids (iterable of str) - lexis document IDs
+
+        Output:
+            (doc_id, data) tuples
+        """
+        by_file = OrderedDict()
+        for doc_id in doc_ids:
+            by_file.setdefault(self.file_name(doc_id), []).append(doc_id)
+
+        for file_name, file_doc_ids in by_file.items():
+            data = self.load_file(file_name)
+            for doc_id in file_doc_ids:
+                yield doc_id, self.find(doc_id, data)
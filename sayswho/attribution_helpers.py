@@ -1,58 +1,103 @@
 from .constants import min_entity_diff, min_speaker_diff, Boundaries, QuoteEntMatch, QuoteClusterMatch
 from .quote_helpers import DQTriple
 from spacy.tokens import Span, SpanGroup, Token, Doc
-from typing import Union, Literal, Tuple, Iterable
+from typing import List, Union, Literal, Tuple, Iterable, Iterator
+from spacy.language import Language
+from spacy.vocab import Vocab
 import statistics
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 import numpy as np
 
 
-def get_cluster_people_scores(cluster: SpanGroup, scorer: Literal['prat', 'cos']='prat') -> Tuple[list, float]:
+def get_cluster_people_scores(
+        cluster: SpanGroup, 
+        scorer: Literal['prat', 'cos']='prat',
+        workers: int=1
+        ) -> Tuple[list, float]:
     """
     Calculates average similarity between any two PERSONS in the cluster.
     These scores are used to exclude "odd man out" cluster members.
 
+    Partial ratios are computed in one rapidfuzz cdist call over the unique span texts, so repeated mentions ("Rosenberg", "Rosenberg", ...) are only scored once.
+
     TODO: tweak cutoff value, or at least make it flexible
 
     Input:
         cluster (SpanGroup) - coref cluster
         scorer (str) - what score to use to determine similarity. can be 'prat' (partial ratio) or 'cos' (cosine similarity).
+        workers (int) - number of threads for cdist (-1 for all cores)
 
     Output:
         list(tuple) - index, span, average score for each span in the cluster
         cutoff (float) - minimum score for keeping cluster member (mean - 2stdev)
     """
-    if scorer=='prat':
-        score_func = lambda s1, s2: fuzz.partial_ratio(s1.text, s2.text)
-    elif scorer=='cos':
-        score_func = lambda s1, s2: s1.similarity(s2) 
-    
     # filter out non-persons
     cluster_ = [span for span in cluster if person_check(span)]
       
-    all_scores = []
-    for n, span in enumerate(cluster_):
-        scores = [score_func(span, span_) for span_ in cluster_]
-        if scores:
+    if scorer=='prat':
+        score_matrix = text_score_matrix(
+            [span.text for span in cluster_], [span.text for span in cluster_], workers=workers
+            )
+        all_scores = [
+            (n, span, sum(score_matrix[n].tolist())/len(cluster_))
+            for n, span in enumerate(cluster_)
+            ]
+    elif scorer=='cos':
+        all_scores = []
+        for n, span in enumerate(cluster_):
+            scores = [span.similarity(span_) for span_ in cluster_]
             all_scores.append((n, span, sum(scores)/len(scores))) 
+
     if len(all_scores) > 1:
         cutoff = statistics.mean([c[-1] for c in all_scores]) - 2*statistics.stdev([c[-1] for c in all_scores])
         return sorted(all_scores, key=lambda k: k[-1]), cutoff
     else:
         return [], None
+
+def text_score_matrix(
+        texts1: list, 
+        texts2: list, 
+        score_cutoff: float=None, 
+        workers: int=1
+        ) -> np.ndarray:
+    """
+    fuzz.partial_ratio for every pair of texts1 x texts2, scoring each unique pair of texts once with rapidfuzz cdist.
+
+    Input:
+        texts1, texts2 (list of str) - texts to compare
+        score_cutoff (float) - scores below this come back as 0
+        workers (int) - number of threads for cdist (-1 for all cores)
+
+    Output:
+        np.ndarray - float64 scores, shape (len(texts1), len(texts2))
+    """
+    if not texts1 or not texts2:
+        return np.zeros((len(texts1), len(texts2)))
+    unique1, inverse1 = np.unique(texts1, return_inverse=True)
+    unique2, inverse2 = np.unique(texts2, return_inverse=True)
+    scores = process.cdist(
+        unique1.tolist(), 
+        unique2.tolist(), 
+        scorer=fuzz.partial_ratio, 
+        score_cutoff=score_cutoff, 
+        dtype=np.float64, 
+        workers=workers
+        )
+    return scores[np.ix_(inverse1.ravel(), inverse2.ravel())]
     
-def prune_cluster_people(cluster: SpanGroup, scorer='prat') -> list:
+def prune_cluster_people(cluster: SpanGroup, scorer='prat', workers: int=1) -> list:
     """
     Removes outlier PERSONS from a cluster, based on provided score.
     TODO: SpanGroup instead of list?
 
     Input:
         cluster (SpanGroup) - a coref cluster
+        workers (int) - number of threads for scoring (see get_cluster_people_scores)
 
     Output:
         list - coref cluster with outlier PERSONS removed
     """
-    scores, cutoff = get_cluster_people_scores(cluster, scorer=scorer)
+    scores, cutoff = get_cluster_people_scores(cluster, scorer=scorer, workers=workers)
     filtered = [c[1] for c in scores if c[-1] < cutoff]
     return [c for c in cluster if c not in filtered]
 
@@ -68,6 +113,122 @@ def clone_cluster(cluster: SpanGroup, destination_doc: Doc):
         spans=([destination_doc[span.start:span.end] for span in cluster])
     )
 
+def copy_tokenization(doc: Doc, vocab: Vocab) -> Doc:
+    """
+    Makes a fresh, unannotated Doc with the same tokens as doc, in a different vocab.
+
+    Lets the NER model share the base tokenization (so token indexes line up) without re-running a tokenizer.
+    """
+    return Doc(
+        vocab,
+        words=[tok.text for tok in doc],
+        spaces=[bool(tok.whitespace_) for tok in doc]
+    )
+
+def pipe_components(nlp: Language, docs: Iterable[Doc], batch_size: int=None) -> Iterator[Doc]:
+    """
+    Runs the enabled components of nlp over docs that are already tokenized. Like nlp.pipe, minus the tokenizer.
+
+    Used by "shared doc" mode, so the coref components annotate the base doc in place.
+
+    Input:
+        nlp (Language) - spacy pipeline
+        docs (iterable of Doc) - tokenized docs
+        batch_size (int) - batch size for components that support pipe (defaults to nlp.batch_size)
+
+    Output:
+        iterator of annotated docs
+    """
+    batch_size = batch_size or nlp.batch_size
+    for _, proc in nlp.pipeline:
+        if hasattr(proc, "pipe"):
+            docs = proc.pipe(docs, batch_size=batch_size)
+        else:
+            docs = map(proc, docs)
+    return docs
+
+def coref_windows(doc: Doc, max_tokens: int, overlap: int=1) -> List[Tuple[int, int]]:
+    """
+    Splits a tokenized article into overlapping, paragraph-aligned windows for chunked coreference.
+
+    Paragraphs are the runs of tokens between the "\n" tokens that full_parse joins them with. Windows take whole paragraphs until the next one would go over max_tokens, and each window after the first starts overlap paragraphs before the end of the previous one, so clusters can be linked through the mentions they share. A paragraph longer than max_tokens gets a window to itself.
+
+    Input:
+        doc (Doc) - tokenized article
+        max_tokens (int) - token budget of a window
+        overlap (int) - number of paragraphs shared by consecutive windows
+
+    Output:
+        list of (start_char, end_char) of each window
+    """
+    breaks = [tok.i for tok in doc if tok.text.startswith("\n")]
+    paras = [
+        (start, end)
+        for start, end in zip([0] + [b + 1 for b in breaks], breaks + [len(doc)])
+        if end > start
+        ]
+    if not paras:
+        return [(0, len(doc.text))]
+
+    windows = []
+    first = 0
+    while True:
+        last = first
+        while last + 1 < len(paras) and paras[last + 1][1] - paras[first][0] <= max_tokens:
+            last += 1
+        windows.append((doc[paras[first][0]].idx, doc[paras[last][1] - 1].idx + len(doc[paras[last][1] - 1])))
+        if last + 1 == len(paras):
+            return windows
+        first = max(first + 1, last + 1 - overlap)
+
+def window_clusters(window_doc: Doc, offset: int, prefix: str="coref_clusters") -> List[List[Tuple[int, int]]]:
+    """
+    Coref clusters of a window, as lists of (start_char, end_char) in the full article (offset is where the window starts).
+    """
+    return [
+        [(offset + span.start_char, offset + span.end_char) for span in cluster]
+        for k, cluster in window_doc.spans.items()
+        if k.startswith(prefix)
+        ]
+
+def merge_clusters(clusters: Iterable[List[Tuple[int, int]]]) -> List[List[Tuple[int, int]]]:
+    """
+    Merges the clusters of overlapping windows: clusters that share a mention (same character offsets) are the same entity, and so is anything linked to them through other shared mentions (union-find).
+
+    Output:
+        merged clusters, each a sorted list of unique mentions, ordered by their first mention
+    """
+    clusters = list(clusters)
+    parent = list(range(len(clusters)))
+
+    def find(n: int) -> int:
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    owner = {}
+    for n, cluster in enumerate(clusters):
+        for mention in cluster:
+            if mention in owner:
+                parent[find(n)] = find(owner[mention])
+            else:
+                owner[mention] = n
+
+    merged = {}
+    for n, cluster in enumerate(clusters):
+        merged.setdefault(find(n), set()).update(cluster)
+    return sorted((sorted(mentions) for mentions in merged.values()), key=lambda c: c[0])
+
+def set_clusters(doc: Doc, clusters: List[List[Tuple[int, int]]], prefix: str="coref_clusters") -> Doc:
+    """
+    Writes merged clusters onto doc as SpanGroups, keyed like the coref model's output (coref_clusters_1, coref_clusters_2...).
+    """
+    for n, cluster in enumerate(clusters):
+        spans = [doc.char_span(start, end, alignment_mode="expand") for start, end in cluster]
+        doc.spans[f"{prefix}_{n+1}"] = [span for span in spans if span is not None]
+    return doc
+
 def filter_duplicate_ents(ents) -> tuple:
     """
     Removes duplicate entities by text.
@@ -146,6 +307,69 @@ def span_contains(
     else:
         return False
 
+def get_boundary_array(ts: Iterable[Union[Span, Token, DQTriple]]) -> np.ndarray:
+    """
+    Start and end characters of every item in ts, as an (n, 2) array. Computed once per document so span_contains can be done for all pairs at once (see containment_matrix).
+
+    Input:
+        ts - spacy spans, tokens or quote triples (quotes use the boundaries of the speaker, same as get_boundaries)
+
+    Output:
+        np.ndarray - shape (len(ts), 2), columns are start and end
+    """
+    return np.array([tuple(get_boundaries(t)) for t in ts], dtype=np.int64).reshape(-1, 2)
+
+def containment_matrix(b1: np.ndarray, b2: np.ndarray) -> np.ndarray:
+    """
+    Broadcast version of span_contains: m[i, j] is whether item i of b1 contains item j of b2 or v/v.
+
+    Input:
+        b1, b2 (np.ndarray) - boundary arrays from get_boundary_array
+
+    Output:
+        np.ndarray - boolean matrix, shape (len(b1), len(b2))
+    """
+    s1, e1 = b1[:, :1], b1[:, 1:]
+    s2, e2 = b2[:, 0], b2[:, 1]
+    return ((s1 <= s2) & (e1 >= e2)) | ((s2 <= s1) & (e2 >= e1))
+
+def containment_pairs(b1: np.ndarray, b2: np.ndarray) -> list:
+    """
+    All (i, j) where item i of b1 contains item j of b2 or v/v, in the same order as looping over b1 then b2 with span_contains.
+    """
+    return [tuple(p) for p in np.argwhere(containment_matrix(b1, b2)).tolist()]
+
+def make_relation(pairs: Iterable[tuple]) -> dict:
+    """
+    Adjacency-list version of a pair list: {i: {j, ...}}. Relations between quotes, clusters, persons and ents are almost all empty, so this is much smaller than a dense matrix.
+    """
+    relation = {}
+    for i, j in pairs:
+        relation.setdefault(i, set()).add(j)
+    return relation
+
+def compose_relations(r1: dict, r2: dict) -> dict:
+    """
+    Joins two relations on their shared index (i -> j in r1 and j -> k in r2 gives i -> k). Equivalent to the nonzero entries of a boolean matrix product.
+    """
+    composed = {}
+    for i, js in r1.items():
+        ks = set()
+        for j in js:
+            ks.update(r2.get(j, ()))
+        if ks:
+            composed[i] = ks
+    return composed
+
+def transpose_relation(relation: dict) -> dict:
+    return make_relation((j, i) for i, js in relation.items() for j in js)
+
+def relation_pairs(relation: dict) -> list:
+    """
+    Pairs of a relation, sorted by i then j (same order as np.nonzero on the matrix).
+    """
+    return sorted((i, j) for i, js in relation.items() for j in js)
+
 def format_cluster(cluster):
     return list(set([c.text for c in cluster if c[0].pos_ != "PRON"]))
 
@@ -238,6 +462,18 @@ def compare_quote_to_cluster_member(
             return True
     return False
 
+def compare_spans_matrix(spans1: list, spans2: list) -> np.ndarray:
+    """
+    Broadcast version of compare_spans, for every pair of spans1 x spans2.
+
+    Output:
+        np.ndarray - boolean matrix, shape (len(spans1), len(spans2))
+    """
+    b1 = np.array([(s.start, s.end) for s in spans1], dtype=np.int64).reshape(-1, 2)
+    b2 = np.array([(s.start, s.end) for s in spans2], dtype=np.int64).reshape(-1, 2)
+    diffs = np.abs(b1[:, None, :] - b2[None, :, :])
+    return (diffs < min_entity_diff).all(axis=-1)
+
 def compare_spans(
         s1: Span, 
         s2: Span,
@@ -0,0 +1,121 @@
+"""
+Length-bucketed, token-budget batching for the coref transformer.
+
+nlp.pipe batches a fixed number of docs, and the transformer pads every doc in a batch up to the longest one, so one long transcript in a batch of short briefs makes the whole batch cost as much as eight transcripts. TokenBudgetBatcher reads a window of texts ahead, groups them by length bucket, sizes each batch by padded tokens instead of doc count, and hands the docs back in their original order.
+
+    batcher = TokenBudgetBatcher(max_tokens=4096)
+    docs = list(batcher.pipe(coref_nlp, texts))
+    print(batcher.report())
+"""
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List
+from spacy.language import Language
+from spacy.tokens import Doc
+
+def length_bucket(n_tokens: int) -> int:
+    """
+    Bucket of a doc length: powers of two, so docs batched together are never more than 2x apart.
+    """
+    return max(n_tokens, 1).bit_length()
+
+def token_budget_batches(lengths: List[int], max_tokens: int) -> List[List[int]]:
+    """
+    Groups docs into batches that fit a padded token budget.
+
+    Docs are grouped by length_bucket and sorted by length within each, then cut into batches where (number of docs) x (longest doc) stays under max_tokens. A doc longer than max_tokens is a batch by itself.
+
+    Input:
+        lengths (list of int) - token count of each doc
+        max_tokens (int) - padded token budget of a batch
+
+    Output:
+        batches, as lists of positions in lengths
+    """
+    buckets = {}
+    for n, length in enumerate(lengths):
+        buckets.setdefault(length_bucket(length), []).append(n)
+
+    batches = []
+    for bucket in sorted(buckets):
+        batch = []
+        for n in sorted(buckets[bucket], key=lambda n: lengths[n]):
+            # sorted, so the doc being added is the longest in the batch
+            if batch and (len(batch) + 1) * lengths[n] > max_tokens:
+                batches.append(batch)
+                batch = []
+            batch.append(n)
+        if batch:
+            batches.append(batch)
+    return batches
+
+class TokenBudgetBatcher:
+    """
+    Runs texts through a pipeline in token-budget batches (see token_budget_batches), keeping their order.
+
+    Texts are tokenized up front (the docs are passed on to the pipeline, so nothing is tokenized twice), read window texts at a time, and batched within each window. Batches are run one at a time with nlp.pipe, in a single process.
+
+    Keeps running totals for the stats: tokens, padded tokens (what the batches cost with padding) and seconds spent in the pipeline.
+    """
+    def __init__(self, max_tokens: int=4096, window: int=64):
+        """
+        Input:
+            max_tokens (int) - padded token budget of a batch
+            window (int) - number of texts read ahead and batched together. Larger windows pad less but hold more docs in memory.
+        """
+        self.max_tokens = max_tokens
+        self.window = window
+        self.docs = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.seconds = 0.0
+
+    def pipe(self, nlp: Language, texts: Iterable[str]) -> Iterator[Doc]:
+        """
+        Input:
+            nlp (Language) - pipeline to run (ie coref_nlp)
+            texts (iterable of str) - texts to parse
+
+        Output:
+            parsed docs, in the same order as texts
+        """
+        texts = iter(texts)
+        while True:
+            docs = [nlp.make_doc(t) for t in islice(texts, self.window)]
+            if not docs:
+                return
+            lengths = [len(doc) for doc in docs]
+            parsed = [None] * len(docs)
+            for batch in token_budget_batches(lengths, self.max_tokens):
+                start = time.perf_counter()
+                for n, doc in zip(batch, nlp.pipe([docs[n] for n in batch], batch_size=len(batch))):
+                    parsed[n] = doc
+                self.seconds += time.perf_counter() - start
+                self.batches += 1
+                self.tokens += sum(lengths[n] for n in batch)
+                self.padded_tokens += len(batch) * max(lengths[n] for n in batch)
+            self.docs += len(docs)
+            yield from parsed
+
+    @property
+    def padding_efficiency(self) -> float:
+        """
+        Share of the batched tokens that are real tokens rather than padding (1.0 is no padding at all).
+        """
+        return self.tokens / self.padded_tokens if self.padded_tokens else 1.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def report(self) -> dict:
+        return {
+            "docs": self.docs,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "padded_tokens": self.padded_tokens,
+            "seconds": self.seconds,
+            "tokens_per_second": self.tokens_per_second,
+            "padding_efficiency": self.padding_efficiency
+        }
@@ -0,0 +1,480 @@
+"""
+Command line entry point.
+
+    sayswho run good_articles_subset.csv --workers 4 --out-dir good_results_output
+
+Replaces the scripto.py loop: doc_ids come from a csv or a text file, are fanned out to worker processes (each worker loads the models once), and every finished doc is appended to a progress manifest, so re-running the same command picks up where a crashed run stopped. Failures go to a quarantine file with the stage they failed in and the traceback.
+
+The workers are supervised (see governor.py): docs that hang or take a worker down with them are quarantined too, instead of stalling or killing the run, and workers are restarted every so often to keep their memory in check.
+"""
+import os
+import csv
+import json
+import argparse
+import time
+import traceback
+import multiprocessing
+import multiprocessing.util
+from typing import Callable, Iterable, Iterator, List, Optional, Set
+from tqdm import tqdm
+
+class StageError(Exception):
+    """
+    Wraps an exception raised while processing a doc, recording which stage it came from.
+    """
+    def __init__(self, stage: str, exc: BaseException):
+        self.stage = stage
+        self.exc = exc
+        super().__init__(stage, repr(exc))
+
+def read_doc_ids(path: str, column: str="doc_id") -> List[str]:
+    """
+    Reads doc_ids from a csv (from the column named column) or from a text file with one doc_id per line. Duplicates are dropped, order is kept.
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            doc_ids = [row[column] for row in csv.DictReader(f)]
+        else:
+            doc_ids = [line.strip() for line in f]
+    return list(dict.fromkeys(d for d in doc_ids if d))
+
+def read_manifest(path: str) -> Iterator[dict]:
+    """
+    Yields the records in a manifest (or quarantine) file. A partial last line, from a crash mid-write, is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def completed_doc_ids(manifest_path: str, retry_errors: bool=False) -> Set[str]:
+    """
+    doc_ids that already have a record in the manifest. Quarantined docs count as completed unless retry_errors is True.
+    """
+    return {
+        r['doc_id'] for r in read_manifest(manifest_path)
+        if r.get('status') == "done" or not retry_errors
+    }
+
+class JsonlWriter:
+    """
+    Appends one json record per line, fsynced after every write so records survive a crash.
+
+    If the file ends in a partial line (a crash mid-write), a newline is added first so the next record starts clean.
+    """
+    def __init__(self, path: str):
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        partial = False
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b"\n"
+        self.f = open(path, "a")
+        if partial:
+            self.f.write("\n")
+
+    def write(self, record: dict):
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# per-process state, set up once by init_worker
+_attributor = None
+_renderer = None
+
+def init_worker(attributor_kwargs: dict, render_kwargs: Optional[dict]):
+    """
+    Pool initializer. Loads the models once per worker process.
+
+    Input:
+        attributor_kwargs (dict) - passed to Attributor
+        render_kwargs (dict) - passed to Renderer, or None to skip rendering. If there's an archive, every worker writes its own (named after the worker's pid).
+    """
+    global _attributor, _renderer
+    from .sayswho import Attributor
+    from .rendering_helpers import Renderer
+
+    _attributor = Attributor(**attributor_kwargs)
+    _attributor.load_models()
+    if render_kwargs is not None:
+        if render_kwargs.get("archive"):
+            render_kwargs = {**render_kwargs, "archive": f"{render_kwargs['archive']}_{os.getpid()}.zip"}
+        _renderer = Renderer(**render_kwargs)
+        # the archive is only valid once closed, so close it when the worker exits
+        multiprocessing.util.Finalize(_renderer, _renderer.close, exitpriority=10)
+
+def process_doc(doc_id: str) -> dict:
+    """
+    Runs one doc through load -> parse -> attribute -> render in the worker's Attributor.
+
+    Output:
+        record (dict) - manifest record for the doc
+
+    Raises StageError (with the stage and traceback) on any failure, so the parent process can quarantine the doc.
+    """
+    from .sayswho import evaluate
+    from .article_helpers import load_doc, fast_parse
+    from .governor import check_doc_size
+
+    profiler = _attributor.profiler
+    if profiler is not None:
+        # one profile per doc is sent back in the record, so the worker doesn't need to keep them
+        profiler.docs.clear()
+        profiler.start_doc(doc_id)
+
+    stage = "load"
+    try:
+        with _attributor.stage("load"):
+            data = load_doc(doc_id)
+        stage = "parse"
+        with _attributor.stage("html"):
+            t, metadata = fast_parse(data, "\n")
+        check_doc_size(len(t))
+        stage = "attribute"
+        start = time.perf_counter()
+        _attributor.parse_text(t)
+        _attributor.get_matches()
+        score = evaluate(_attributor)
+        seconds = time.perf_counter() - start
+        if _renderer is not None:
+            stage = "render"
+            with _attributor.stage("render"):
+                _renderer.render_one(_attributor, metadata)
+    except Exception as e:
+        raise StageError(stage, e)
+    record = {"doc_id": doc_id, "status": "done", "score": score._asdict()}
+    if _attributor.prescreen:
+        record["prescreened"] = _attributor.prescreened
+        record["seconds"] = seconds
+    if profiler is not None:
+        record["profile"] = profiler.current.as_dict()
+    return record
+
+def _call(process: Callable, doc_id: str):
+    """
+    Runs process on doc_id and returns (doc_id, record, error) instead of raising, so one bad doc doesn't stop the pool. error is a quarantine record (plain data, so it pickles back from the worker).
+    """
+    try:
+        return doc_id, process(doc_id), None
+    except Exception as e:
+        stage, exc = (e.stage, e.exc) if isinstance(e, StageError) else ("unknown", e)
+        return doc_id, None, {
+            "doc_id": doc_id,
+            "stage": stage,
+            "exception": type(exc).__name__,
+            "message": str(exc),
+            "traceback": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+        }
+
+class _Caller:
+    """
+    Picklable partial of _call, for imap_unordered.
+    """
+    def __init__(self, process: Callable):
+        self.process = process
+
+    def __call__(self, doc_id: str):
+        return _call(self.process, doc_id)
+
+def run_batch(
+        doc_ids: Iterable[str],
+        manifest_path: str,
+        quarantine_path: str,
+        workers: int=1,
+        process: Callable=process_doc,
+        initializer: Callable=None,
+        initargs: tuple=(),
+        chunksize: int=1,
+        retry_errors: bool=False,
+        progress: bool=True,
+        governor: dict=None
+        ) -> dict:
+    """
+    Processes every doc_id not already in the manifest.
+
+    Records are written by this (parent) process only, as results come back, so the manifest and quarantine never see interleaved writes.
+
+    Input:
+        doc_ids (iterable of str) - docs to process
+        manifest_path (str) - progress manifest (jsonl), appended to and used to resume
+        quarantine_path (str) - failures (jsonl) with doc_id, stage, exception and traceback
+        workers (int) - size of the process pool; 1 runs in this process
+        process (callable) - doc_id -> manifest record
+        initializer, initargs - per-worker setup (see init_worker)
+        chunksize (int) - doc_ids handed to a worker at a time
+        retry_errors (bool) - if True, re-run quarantined docs
+        progress (bool) - show a tqdm bar
+        governor (dict) - if given, run the docs in supervised workers instead of a Pool, with these Governor settings (watchdog timeouts, worker restarts, memory limits; see governor.py). Timed out and crashed docs are quarantined like any other failure.
+
+    Output:
+        counts (dict) - number of docs done, failed and skipped (plus the Governor's stats under "governor")
+    """
+    doc_ids = list(doc_ids)
+    completed = completed_doc_ids(manifest_path, retry_errors)
+    todo = [d for d in doc_ids if d not in completed]
+    counts = {"done": 0, "error": 0, "skipped": len(doc_ids) - len(todo)}
+    if not todo:
+        return counts
+
+    caller = _Caller(process)
+    if governor is not None:
+        from .governor import Governor
+        pool = None
+        supervisor = Governor(caller, workers, initializer, initargs, **governor)
+        results = supervisor.imap(todo)
+    elif workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=initializer, initargs=initargs)
+        results = pool.imap_unordered(caller, todo, chunksize=chunksize)
+    else:
+        pool = None
+        if initializer is not None:
+            initializer(*initargs)
+        results = map(caller, todo)
+
+    completed_ok = False
+    try:
+        with JsonlWriter(manifest_path) as manifest, JsonlWriter(quarantine_path) as quarantine:
+            for doc_id, record, error in tqdm(results, total=len(todo), disable=not progress):
+                if error is None:
+                    manifest.write(record)
+                    counts["done"] += 1
+                else:
+                    quarantine.write(error)
+                    manifest.write({"doc_id": doc_id, "status": "error", "stage": error["stage"]})
+                    counts["error"] += 1
+        completed_ok = True
+    finally:
+        if governor is not None:
+            results.close()
+            counts["governor"] = supervisor.stats
+        if pool is not None:
+            # a clean close lets the workers run their exit handlers (ie finishing archives)
+            if completed_ok:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+    return counts
+
+def order_by_file(doc_ids: List[str]) -> List[str]:
+    """
+    Groups doc_ids by archive file (keeping first-seen file order), so consecutive docs sent to a worker hit its archive cache. doc_ids missing from the index are left at the end; they'll be quarantined at the load stage.
+    """
+    from .article_helpers import get_store
+
+    try:
+        store = get_store()
+    except (FileNotFoundError, OSError):
+        return doc_ids
+    files = {}
+    for doc_id in doc_ids:
+        file_name = store.index[doc_id][0] if doc_id in store else None
+        files.setdefault(file_name, []).append(doc_id)
+    missing = files.pop(None, [])
+    return [d for file_doc_ids in files.values() for d in file_doc_ids] + missing
+
+def model_kwargs(args: argparse.Namespace) -> dict:
+    """
+    Attributor kwargs from the model arguments (see add_model_arguments).
+    """
+    kwargs = {
+        "coref_nlp": args.coref_nlp,
+        "base_nlp": args.base_nlp,
+        "shared_doc": args.shared_doc,
+        "cache": args.cache,
+        "coref_chunk_tokens": args.coref_chunk_tokens,
+        "coref_overlap": args.coref_overlap
+    }
+    if args.prescreen:
+        kwargs["prescreen"] = True
+    if args.ner_nlp is not None:
+        kwargs["ner_nlp"] = args.ner_nlp or None
+    return kwargs
+
+def run(args: argparse.Namespace):
+    from .constants import color_key
+
+    doc_ids = read_doc_ids(args.doc_ids, args.column)
+    if args.limit:
+        doc_ids = doc_ids[:args.limit]
+    if args.workers > 1:
+        doc_ids = order_by_file(doc_ids)
+
+    attributor_kwargs = model_kwargs(args)
+    if args.profile:
+        from .profiling import Profiler
+        attributor_kwargs["profile"] = Profiler(memory=not args.no_profile_memory)
+    render_kwargs = None if args.no_render else {"out_dir": args.out_dir, "color_key": color_key, "archive": args.archive}
+
+    governor = None if args.no_governor else {
+        "doc_timeout": args.doc_timeout,
+        "max_docs_per_worker": args.max_docs_per_worker,
+        "max_worker_rss": args.max_worker_rss_mb * 1024**2 if args.max_worker_rss_mb else None,
+        "memory_budget": args.memory_budget_mb * 1024**2 if args.memory_budget_mb else None,
+        "large_doc_chars": args.large_doc_chars,
+        "large_doc_timeout": args.large_doc_timeout
+    }
+
+    manifest_path = args.manifest or os.path.join(args.out_dir, "manifest.jsonl")
+    quarantine_path = args.quarantine or os.path.join(args.out_dir, "quarantine.jsonl")
+    counts = run_batch(
+        doc_ids,
+        manifest_path,
+        quarantine_path,
+        workers=args.workers,
+        initializer=init_worker,
+        initargs=(attributor_kwargs, render_kwargs),
+        chunksize=args.chunksize,
+        retry_errors=args.retry_errors,
+        governor=governor
+    )
+    print(
+        f"{counts['done']} done, {counts['error']} quarantined ({quarantine_path}), "
+        f"{counts['skipped']} already in {manifest_path}"
+    )
+    if "governor" in counts:
+        stats = counts["governor"]
+        print(
+            f"{stats['timeouts']} timed out, {stats['crashes']} crashed a worker, {stats['rerouted']} sent to the large lane, "
+            f"{stats['restarts']} worker restarts"
+        )
+    if args.prescreen:
+        summary = prescreen_summary(manifest_path)
+        saved = summary["estimated_seconds_saved"]
+        print(
+            f"pre-screen skipped {summary['skipped']} of {summary['docs']} docs ({summary['skip_rate']:.0%})"
+            + (f", saving about {saved:.0f}s of attribution" if saved is not None else "")
+        )
+    if args.profile:
+        report(argparse.Namespace(manifest=manifest_path, json=args.profile_json, slowest=10))
+
+def prescreen_summary(manifest_path: str) -> dict:
+    """
+    Skip rate of the pre-screen over the done records of a manifest (from runs with --prescreen), and the attribution time it roughly saved: skipped docs times the mean time of the docs that were parsed, minus the time the skipped docs did take.
+    """
+    records = [r for r in read_manifest(manifest_path) if r.get("status") == "done" and "prescreened" in r]
+    skipped = [r["seconds"] for r in records if r["prescreened"]]
+    parsed = [r["seconds"] for r in records if not r["prescreened"]]
+    return {
+        "docs": len(records),
+        "skipped": len(skipped),
+        "skip_rate": len(skipped) / len(records) if records else 0.0,
+        "estimated_seconds_saved": (
+            len(skipped) * sum(parsed) / len(parsed) - sum(skipped) if parsed else None
+        )
+    }
+
+def report(args: argparse.Namespace):
+    """
+    Aggregates the profiles in a manifest (from runs with --profile) into per-stage percentiles.
+    """
+    from .profiling import Profiler
+
+    profiler = Profiler.from_records(r["profile"] for r in read_manifest(args.manifest) if "profile" in r)
+    if not profiler.docs:
+        print(f"no profiles in {args.manifest} (run with --profile)")
+        return
+    print(profiler.format_report(n_slowest=args.slowest))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(profiler.report(), f, indent=2)
+
+def serve(args: argparse.Namespace):
+    from .service import serve
+
+    attributor_kwargs = model_kwargs(args)
+    attributor_kwargs["coref_batch_tokens"] = args.coref_batch_tokens
+    serve(
+        attributor_kwargs,
+        workers=args.workers,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000,
+        batch_size=args.batch_size,
+        host=args.host,
+        port=args.port,
+        socket_path=args.socket,
+        request_timeout=args.request_timeout,
+        quiet=args.quiet
+    )
+
+def add_model_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--coref-nlp", default="en_coreference_web_trf")
+    parser.add_argument("--base-nlp", default="en_core_web_lg")
+    parser.add_argument("--ner-nlp", help="law enforcement NER model (pass '' to turn NER off)")
+    parser.add_argument("--shared-doc", action="store_true")
+    parser.add_argument("--cache", help="DocCache directory")
+    parser.add_argument("--coref-chunk-tokens", type=int, help="run coref in paragraph-aligned windows of this many tokens on longer articles")
+    parser.add_argument("--coref-overlap", type=int, default=1, help="paragraphs shared by consecutive coref windows")
+    parser.add_argument("--prescreen", action="store_true", help="skip the models for articles that can't have an attributable quote (they get an empty result and no highlights)")
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sayswho", description="Quote attribution for lexis articles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="attribute quotes for a list of doc_ids, resuming from the manifest")
+    run_parser.add_argument("doc_ids", help="csv with a doc_id column, or a text file with one doc_id per line")
+    run_parser.add_argument("--column", default="doc_id", help="doc_id column, if doc_ids is a csv")
+    run_parser.add_argument("--out-dir", default="good_results_output", help="where rendered html (and by default the manifest and quarantine) go")
+    run_parser.add_argument("--manifest", help="progress manifest (default: OUT_DIR/manifest.jsonl)")
+    run_parser.add_argument("--quarantine", help="failed docs (default: OUT_DIR/quarantine.jsonl)")
+    run_parser.add_argument("--workers", type=int, default=1, help="worker processes. Each one loads its own copy of all three models (coref, spacy and NER), ie a few GB of RAM per worker, so size this to your memory rather than your cores")
+    run_parser.add_argument("--chunksize", type=int, default=4, help="doc_ids handed to a worker at a time (only with --no-governor)")
+    run_parser.add_argument("--no-governor", action="store_true", help="use a plain process pool, without timeouts, restarts or memory limits")
+    run_parser.add_argument("--doc-timeout", type=float, default=900, help="seconds before a doc's worker is killed and the doc quarantined")
+    run_parser.add_argument("--max-docs-per-worker", type=int, default=1000, help="restart workers after this many docs")
+    run_parser.add_argument("--max-worker-rss-mb", type=int, help="restart a worker when its RSS goes over this")
+    run_parser.add_argument("--memory-budget-mb", type=int, help="run fewer docs at once while the workers' total RSS is over this")
+    run_parser.add_argument("--large-doc-chars", type=int, help="run articles longer than this (and articles that crash a worker) in a separate single-worker lane")
+    run_parser.add_argument("--large-doc-timeout", type=float, help="--doc-timeout for the large lane")
+    run_parser.add_argument("--limit", type=int, help="only process the first LIMIT doc_ids")
+    run_parser.add_argument("--retry-errors", action="store_true", help="re-run docs that were quarantined")
+    run_parser.add_argument("--no-render", action="store_true", help="only score docs, don't write html")
+    run_parser.add_argument("--archive", help="write html into zip archives in OUT_DIR (ARCHIVE_<pid>.zip, one per worker) instead of loose files")
+    add_model_arguments(run_parser)
+    run_parser.add_argument("--profile", action="store_true", help="record per-stage timings and size counters in the manifest, and print a report at the end")
+    run_parser.add_argument("--no-profile-memory", action="store_true", help="don't track peak memory (tracemalloc slows things down)")
+    run_parser.add_argument("--profile-json", help="also write the aggregated report here")
+    run_parser.set_defaults(func=run)
+
+    report_parser = subparsers.add_parser("report", help="per-stage percentiles from the profiles in a manifest")
+    report_parser.add_argument("manifest")
+    report_parser.add_argument("--json", help="also write the aggregated report here")
+    report_parser.add_argument("--slowest", type=int, default=10, help="number of slowest docs to list")
+    report_parser.set_defaults(func=report)
+
+    serve_parser = subparsers.add_parser("serve", help="keep the models warm and serve attributions over HTTP (see service.py)")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8321)
+    serve_parser.add_argument("--socket", help="listen on this Unix socket instead of host:port")
+    serve_parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own copy of the models")
+    serve_parser.add_argument("--max-batch", type=int, default=8, help="most articles coalesced into one batch")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=20, help="how long a batch waits for more articles after the first one")
+    serve_parser.add_argument("--batch-size", type=int, default=8, help="nlp.pipe batch size inside a worker")
+    serve_parser.add_argument("--coref-batch-tokens", type=int, help="batch coref by a padded token budget (see batching.py)")
+    serve_parser.add_argument("--request-timeout", type=float, default=600)
+    serve_parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    add_model_arguments(serve_parser)
+    serve_parser.set_defaults(func=serve)
+    return parser
+
+def main(argv: List[str]=None):
+    args = get_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
 from spacy.symbols import (aux, auxpass, csubj, dobj, neg, nsubj)
+import os
 import json
 from collections import namedtuple
 from spacy.tokens import Span
 
 # TODO: adjust this for remote functionality
 json_path = "../CJJ/query_work_files/query_results_2_2_23/"
-file_key = json.load(open('./sayswho/doc_file_key.json'))
+file_key_path = os.path.join(os.path.dirname(__file__), "doc_file_key.json")
 ner_nlp = "./output/model-last/"
 
+def __getattr__(name: str):
+    """
+    Loads file_key on first access, so importing constants doesn't touch the disk.
+    """
+    if name == "file_key":
+        with open(file_key_path) as f:
+            globals()["file_key"] = json.load(f)
+        return globals()["file_key"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 QuoteClusterMatch: tuple[int, int] = namedtuple(
     "QuoteClusterMatch", 
     ["quote_index", "cluster_index"], 
@@ -64,6 +75,11 @@ min_speaker_diff = 5
 min_entity_diff = 2
 min_quote_length = 3
 
+"""
+Constants for fuzzy matching (rapidfuzz partial_ratio, 0-100)
+"""
+cluster_ent_fuzz_cutoff = 95
+
 """
 Constants for textacy quote identification
 """
@@ -0,0 +1,174 @@
+"""
+Persistent, content-addressed cache of parsed Docs.
+
+Re-running the corpus to tune thresholds or matching rules doesn't change the article text, so there's no reason to pay for coref and the base parse again. Entries are keyed by a hash of the text plus the names and versions of the models that parsed it, so changing a model invalidates its entries automatically.
+"""
+import os
+import hashlib
+import importlib.metadata
+import shutil
+import srsly
+import spacy
+from spacy.tokens import Doc, DocBin
+from spacy.vocab import Vocab
+from typing import Iterable, Optional, Tuple
+
+def model_version(name: str) -> str:
+    """
+    Identifies a model without loading it: package name and version for installed models, or path, version and meta.json mtime for models on disk (since retraining in place doesn't always bump the version).
+    """
+    if not name:
+        return str(name)
+    meta_path = os.path.join(name, "meta.json")
+    if os.path.exists(meta_path):
+        meta = srsly.read_json(meta_path)
+        return f"{os.path.abspath(name)}-{meta.get('version')}-{os.path.getmtime(meta_path)}"
+    try:
+        return f"{name}-{importlib.metadata.version(name)}"
+    except importlib.metadata.PackageNotFoundError:
+        return str(name)
+
+def model_fingerprint(model_names: Iterable[str], *extra) -> str:
+    """
+    Hash of the versions of all models (plus anything else that changes the parse, like shared_doc mode).
+    """
+    versions = [model_version(name) for name in model_names] + [str(e) for e in extra]
+    return hashlib.sha256("|".join(versions).encode("utf-8")).hexdigest()[:16]
+
+class DocCache:
+    """
+    Stores (coref_doc, doc, ner_doc) per text as a DocBin on disk.
+
+    Layout is <path>/<fingerprint>/<shard>/<key>.spacy, where shard is the first two characters of key. Every model fingerprint gets its own directory, so stale entries can be dropped in one go (see invalidate).
+
+    Total size is capped at max_bytes; the least recently used entries (by mtime, which is bumped on every hit) are evicted first, down to low_water x max_bytes so the next few puts don't trigger another scan.
+
+    Several processes (ie batch workers) can share one cache directory: total_bytes only counts what this process has seen, so eviction re-reads the sizes from disk, and entries another process removed in the meantime are skipped.
+    """
+    def __init__(self, path: str, max_bytes: int=5*1024**3, low_water: float=0.9):
+        """
+        Input:
+            path (str) - cache directory (created if needed)
+            max_bytes (int) - cap on the total size of cached entries
+            low_water (float) - share of max_bytes that eviction brings the cache down to
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self._vocab = None
+        os.makedirs(path, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self.entries())
+
+    @property
+    def vocab(self) -> Vocab:
+        """
+        Fallback vocab for deserializing docs when no model is loaded. Blank English, so lexical attributes like is_quote still work.
+        """
+        if self._vocab is None:
+            self._vocab = spacy.blank("en").vocab
+        return self._vocab
+
+    def entries(self) -> Iterable[Tuple[str, int, float]]:
+        """
+        Yields (file path, size, mtime) for every cached entry, across all fingerprints.
+        """
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                if f.endswith(".spacy"):
+                    file_path = os.path.join(root, f)
+                    try:
+                        stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        # evicted by another process
+                        continue
+                    yield file_path, stat.st_size, stat.st_mtime
+
+    def key(self, text: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}|{text}".encode("utf-8")).hexdigest()
+
+    def file_path(self, text: str, fingerprint: str) -> str:
+        key = self.key(text, fingerprint)
+        return os.path.join(self.path, fingerprint, key[:2], f"{key}.spacy")
+
+    def get(self, text: str, fingerprint: str, vocab: Vocab=None) -> Optional[Tuple[Doc, Doc, Optional[Doc]]]:
+        """
+        Input:
+            text (str) - article text
+            fingerprint (str) - model fingerprint (see model_fingerprint)
+            vocab (Vocab) - vocab to deserialize into (defaults to a blank English vocab)
+
+        Output:
+            (coref_doc, doc, ner_doc), or None on a miss
+        """
+        file_path = self.file_path(text, fingerprint)
+        try:
+            with open(file_path, "rb") as f:
+                entry = srsly.msgpack_loads(f.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(file_path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        docs = list(DocBin().from_bytes(entry["docs"]).get_docs(vocab or self.vocab))
+        if entry["shared"]:
+            docs = [docs[0]] + docs
+        return tuple(docs) if entry["ner"] else (docs[0], docs[1], None)
+
+    def put(self, text: str, fingerprint: str, coref_doc: Doc, doc: Doc, ner_doc: Doc=None):
+        """
+        Stores the parsed docs of text, then evicts old entries if the cache is over max_bytes.
+
+        Writes go to a temp file first, so a crash never leaves a half-written entry.
+        """
+        shared = coref_doc is doc
+        doc_bin = DocBin(store_user_data=False)
+        for d in ([] if shared else [coref_doc]) + [doc] + ([ner_doc] if ner_doc is not None else []):
+            doc_bin.add(d)
+        data = srsly.msgpack_dumps({"shared": shared, "ner": ner_doc is not None, "docs": doc_bin.to_bytes()})
+
+        file_path = self.file_path(text, fingerprint)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        try:
+            self.total_bytes -= os.path.getsize(file_path)
+        except FileNotFoundError:
+            pass
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        self.total_bytes += len(data)
+        self.evict()
+
+    def evict(self):
+        """
+        Once the cache is over max_bytes, removes least recently used entries until it is under low_water x max_bytes.
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+        entries = sorted(self.entries(), key=lambda e: e[-1])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        if self.total_bytes <= self.max_bytes:
+            return
+        for file_path, size, _ in entries:
+            if self.total_bytes <= self.low_water * self.max_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def invalidate(self, fingerprint: str=None):
+        """
+        Drops cached entries. With a fingerprint, drops everything *except* that fingerprint's entries (ie everything parsed by older models). Without one, clears the whole cache.
+        """
+        for name in os.listdir(self.path):
+            if name != fingerprint and os.path.isdir(os.path.join(self.path, name)):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        self.total_bytes = sum(size for _, size, _ in self.entries())
@@ -0,0 +1,320 @@
+"""
+Supervised worker processes for the batch runner.
+
+multiprocessing.Pool can't stop a task that hangs, and if a worker is killed (ie by the OOM killer) the task it had is lost and imap waits forever. Governor runs its own workers, each with one doc in flight at a time, and watches them:
+
+    - a doc that runs past doc_timeout gets its worker killed, and is quarantined with stage "timeout"
+    - a worker that dies takes only its current doc with it (quarantined with stage "crash"), and is replaced
+    - workers are restarted after max_docs_per_worker docs, or as soon as their RSS goes over max_worker_rss, to hand fragmented memory back to the OS
+    - if the workers' total RSS goes over memory_budget, fewer docs are run at once until it comes back down
+    - with large_doc_chars, docs longer than that (and docs that crashed a worker) are re-run in a separate lane with a single worker, so at most one huge article is being parsed at a time
+
+RSS comes from /proc, so memory governance only does anything on Linux.
+"""
+import sys
+import time
+import signal
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional
+
+class OversizedDoc(Exception):
+    """
+    Raised by check_doc_size in a worker of the regular lane, so the doc is sent to the large lane instead.
+    """
+    def __init__(self, n_chars: int):
+        self.n_chars = n_chars
+        super().__init__(f"{n_chars} characters is over the regular lane's limit")
+
+# per-process limit, set by the worker loop of the lane the process is in
+_max_doc_chars = None
+
+def check_doc_size(n_chars: int):
+    """
+    Raises OversizedDoc if this process is a regular lane worker and the doc is over its size limit. Does nothing outside a Governor.
+    """
+    if _max_doc_chars is not None and n_chars > _max_doc_chars:
+        raise OversizedDoc(n_chars)
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """
+    Resident set size of a process, from /proc/<pid>/status (None if it can't be read).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+def _exit_on_sigterm(signum, frame):
+    # unwinds normally, so exit handlers (ie closing a renderer's archive) still run
+    sys.exit(128 + signum)
+
+def _worker_main(conn, task: Callable, initializer: Callable, initargs: tuple, max_doc_chars: Optional[int]):
+    """
+    Worker loop: runs the initializer, says it's ready, then receives doc_ids and sends back task(doc_id), until it gets None.
+    """
+    global _max_doc_chars
+    _max_doc_chars = max_doc_chars
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    if initializer is not None:
+        initializer(*initargs)
+    conn.send("ready")
+    while True:
+        try:
+            doc_id = conn.recv()
+        except EOFError:
+            return
+        if doc_id is None:
+            return
+        conn.send(task(doc_id))
+
+class _Worker:
+    """
+    A worker process, the parent's end of its pipe and the doc it is working on.
+    """
+    def __init__(self, lane: str, task: Callable, initializer: Callable, initargs: tuple, max_doc_chars: Optional[int]):
+        self.lane = lane
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_conn, task, initializer, initargs, max_doc_chars),
+            daemon=True
+            )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.doc_id = None
+        self.started = None
+        self.n_docs = 0
+        self.retire = False
+
+    @property
+    def busy(self) -> bool:
+        return self.doc_id is not None
+
+    def check_ready(self) -> bool:
+        """
+        Whether the worker is done with its initializer (ie loading the models). Docs are only sent to ready workers, so model loading never counts against doc_timeout.
+        """
+        if not self.ready and self.conn.poll():
+            try:
+                self.ready = self.conn.recv() == "ready"
+            except (EOFError, OSError):
+                pass
+        return self.ready
+
+    def send(self, doc_id: str):
+        self.doc_id = doc_id
+        self.started = time.monotonic()
+        self.conn.send(doc_id)
+
+    def rss(self) -> Optional[int]:
+        return rss_bytes(self.process.pid)
+
+    def stop(self, grace: float=10.0):
+        """
+        Asks the worker to exit (so it can clean up), then terminates and finally kills it if it doesn't.
+        """
+        if self.process.is_alive() and not self.busy:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(grace)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(grace)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class Governor:
+    """
+    Runs task over doc_ids in supervised worker processes (see the module docstring).
+
+    Results come back as task returns them, ie (doc_id, record, error) from cli._Caller; docs that time out or crash a worker come back as (doc_id, None, error) with stage "timeout" or "crash".
+    """
+    def __init__(
+            self,
+            task: Callable,
+            workers: int=1,
+            initializer: Callable=None,
+            initargs: tuple=(),
+            doc_timeout: float=None,
+            max_docs_per_worker: int=None,
+            max_worker_rss: int=None,
+            memory_budget: int=None,
+            large_doc_chars: int=None,
+            large_doc_timeout: float=None,
+            poll_interval: float=0.5
+            ):
+        """
+        Input:
+            task (callable) - doc_id -> (doc_id, record, error); has to be picklable
+            workers (int) - number of workers in the regular lane
+            initializer, initargs - per-worker setup (see cli.init_worker), run again in every restarted worker
+            doc_timeout (float) - seconds a doc may run before its worker is killed (None for no limit)
+            max_docs_per_worker (int) - restart a worker after this many docs
+            max_worker_rss (int) - restart a worker after a doc that leaves it with more RSS than this (bytes)
+            memory_budget (int) - cap on the total RSS of the workers (bytes); over it, docs are run fewer at a time
+            large_doc_chars (int) - docs longer than this go to the single-worker large lane (check_doc_size has to be called by task)
+            large_doc_timeout (float) - doc_timeout for the large lane (defaults to doc_timeout)
+            poll_interval (float) - seconds between watchdog checks
+        """
+        self.task = task
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.doc_timeout = doc_timeout
+        self.max_docs_per_worker = max_docs_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.memory_budget = memory_budget
+        self.large_doc_chars = large_doc_chars
+        self.large_doc_timeout = large_doc_timeout if large_doc_timeout is not None else doc_timeout
+        self.poll_interval = poll_interval
+        self.active_limit = workers
+        self.stats = {"timeouts": 0, "crashes": 0, "restarts": 0, "rerouted": 0, "throttled": 0, "peak_rss": 0}
+
+    def spawn(self, lane: str) -> _Worker:
+        return _Worker(
+            lane, self.task, self.initializer, self.initargs,
+            self.large_doc_chars if lane == "regular" else None
+            )
+
+    def timeout(self, worker: _Worker) -> Optional[float]:
+        return self.large_doc_timeout if worker.lane == "large" else self.doc_timeout
+
+    def error(self, doc_id: str, stage: str, message: str) -> tuple:
+        return doc_id, None, {"doc_id": doc_id, "stage": stage, "exception": stage.title(), "message": message, "traceback": ""}
+
+    def imap(self, doc_ids: Iterable[str]) -> Iterator[tuple]:
+        """
+        Runs task over doc_ids, yielding results as they finish (not in order).
+        """
+        queue = deque(doc_ids)
+        large_queue = deque()
+        regular = [self.spawn("regular") for _ in range(min(self.workers, len(queue)))]
+        large = []
+        crashed = set()
+        try:
+            while queue or large_queue or any(w.busy for w in regular + large):
+                if large_queue and not large:
+                    large.append(self.spawn("large"))
+                for worker in regular + large:
+                    if not worker.check_ready() and not worker.process.is_alive():
+                        raise RuntimeError(f"worker exited with code {worker.process.exitcode} before it was ready")
+                self.dispatch(regular, queue)
+                self.dispatch(large, large_queue)
+
+                # wake up for finished docs, workers that just became ready and workers that died
+                busy = [w for w in regular + large if w.busy]
+                starting = [w for w in regular + large if not w.ready]
+                wait(
+                    [w.conn for w in busy + starting] + [w.process.sentinel for w in busy + starting],
+                    timeout=self.poll_interval
+                    )
+
+                for worker in busy:
+                    result = None
+                    if worker.conn.poll():
+                        try:
+                            result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            pass
+                    if result is not None:
+                        doc_id, _, error = result
+                        worker.doc_id = None
+                        worker.n_docs += 1
+                        if error is not None and error.get("exception") == "OversizedDoc" and worker.lane == "regular":
+                            self.stats["rerouted"] += 1
+                            large_queue.append(doc_id)
+                        else:
+                            yield result
+                        if self.max_docs_per_worker and worker.n_docs >= self.max_docs_per_worker:
+                            worker.retire = True
+                        elif self.max_worker_rss and (worker.rss() or 0) > self.max_worker_rss:
+                            worker.retire = True
+                    elif not worker.process.is_alive():
+                        doc_id = worker.doc_id
+                        worker.doc_id = None
+                        worker.retire = True
+                        self.stats["crashes"] += 1
+                        if self.large_doc_chars and worker.lane == "regular" and doc_id not in crashed:
+                            # probably ran out of memory; try once more on its own
+                            crashed.add(doc_id)
+                            self.stats["rerouted"] += 1
+                            large_queue.append(doc_id)
+                        else:
+                            yield self.error(doc_id, "crash", f"worker exited with code {worker.process.exitcode}")
+                    elif self.timeout(worker) and time.monotonic() - worker.started > self.timeout(worker):
+                        doc_id = worker.doc_id
+                        self.stats["timeouts"] += 1
+                        worker.process.terminate()
+                        worker.doc_id = None
+                        worker.retire = True
+                        yield self.error(doc_id, "timeout", f"still running after {self.timeout(worker):g}s")
+
+                self.govern_memory(regular + large)
+                regular = self.replace_retired(regular, "regular", bool(queue))
+                large = self.replace_retired(large, "large", bool(large_queue))
+        finally:
+            for worker in regular + large:
+                worker.stop()
+
+    def dispatch(self, workers: List[_Worker], queue: deque):
+        """
+        Hands the next docs in queue to idle workers, keeping the number of busy regular workers within active_limit.
+        """
+        for worker in workers:
+            if not queue:
+                return
+            if worker.lane == "regular" and sum(w.busy for w in workers) >= self.active_limit:
+                return
+            if worker.ready and not worker.busy and not worker.retire and worker.process.is_alive():
+                worker.send(queue.popleft())
+
+    def govern_memory(self, workers: List[_Worker]):
+        """
+        Adjusts active_limit to the workers' total RSS: one fewer worker while over memory_budget (the fattest idle worker over the limit is stopped by replace_retired), one more once there's room for another worker's worth under 90% of it.
+
+        Workers hold their own copy of the models, so memory only comes back by running fewer of them; restarting one just reloads the models.
+        """
+        if not self.memory_budget:
+            return
+        rss = {w: w.rss() or 0 for w in workers}
+        total = sum(rss.values())
+        self.stats["peak_rss"] = max(self.stats["peak_rss"], total)
+        if total > self.memory_budget:
+            if self.active_limit > 1:
+                self.active_limit -= 1
+                self.stats["throttled"] += 1
+        elif self.active_limit < self.workers and total + total / max(len(workers), 1) < 0.9 * self.memory_budget:
+            self.active_limit += 1
+
+    def replace_retired(self, workers: List[_Worker], lane: str, needed: bool) -> List[_Worker]:
+        """
+        Stops retired (or dead) idle workers, and idle workers over the lane's limit (active_limit for the regular lane, 1 for the large one). Then, if there's still work, starts fresh workers up to the limit.
+        """
+        limit = self.active_limit if lane == "regular" else 1
+        kept = []
+        for worker in workers:
+            if worker.busy or (not worker.retire and worker.process.is_alive()):
+                kept.append(worker)
+            else:
+                worker.stop()
+        # fattest first
+        for worker in sorted([w for w in kept if not w.busy], key=lambda w: w.rss() or 0, reverse=True):
+            if len(kept) <= limit:
+                break
+            worker.stop()
+            kept.remove(worker)
+        while needed and len(kept) < limit:
+            self.stats["restarts"] += 1
+            kept.append(self.spawn(lane))
+        return kept
@@ -0,0 +1,232 @@
+"""
+Opt-in per-stage, per-document instrumentation.
+
+    a = Attributor(profile=True)
+    for doc_id, t in texts:
+        a.attribute(t, label=doc_id)
+    print(a.profiler.format_report())
+
+Every stage (model calls, direct_quotations, macro_ent_finder, make_matches, render_new...) records wall time, CPU time and peak tracemalloc bytes, and every doc records size counters (tokens, quotes, clusters, ents, candidate pairs evaluated). The per-doc records are plain dicts, so they can go into the run manifest and be aggregated later (see Profiler.from_records).
+"""
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+import numpy as np
+
+StageTiming: tuple[float, float, int] = namedtuple(
+    "StageTiming",
+    ["wall", "cpu", "peak_bytes"]
+)
+
+class DocProfile:
+    """
+    Stage timings and size counters for one document.
+
+    A stage that runs more than once for the same doc (ie a model called per chunk) is summed, keeping the highest peak.
+    """
+    def __init__(self, label: str=None):
+        self.label = label
+        self.stages = {}
+        self.counters = {}
+
+    def add_stage(self, name: str, timing: StageTiming):
+        if name in self.stages:
+            old = self.stages[name]
+            timing = StageTiming(old.wall + timing.wall, old.cpu + timing.cpu, max(old.peak_bytes, timing.peak_bytes))
+        self.stages[name] = timing
+
+    def count(self, **counts):
+        for k, v in counts.items():
+            self.counters[k] = self.counters.get(k, 0) + v
+
+    @property
+    def wall(self) -> float:
+        """
+        Total wall time of the top level stages.
+        """
+        return sum(timing.wall for name, timing in self.stages.items() if "." not in name)
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "stages": {name: timing._asdict() for name, timing in self.stages.items()},
+            "counters": dict(self.counters)
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DocProfile":
+        profile = cls(d.get("label"))
+        profile.stages = {name: StageTiming(**timing) for name, timing in d["stages"].items()}
+        profile.counters = dict(d["counters"])
+        return profile
+
+class Profiler:
+    """
+    Collects a DocProfile per document.
+
+    Stages can nest; nested stages are recorded as "outer.inner". Peak bytes are the tracemalloc peak during the stage, over what was allocated when it started. Tracking memory slows Python-heavy stages down noticeably, so it can be turned off.
+    """
+    def __init__(self, memory: bool=True):
+        """
+        Input:
+            memory (bool) - record peak tracemalloc bytes (starts tracemalloc if it isn't running)
+        """
+        self.memory = memory
+        self.docs: List[DocProfile] = []
+        self.current: Optional[DocProfile] = None
+        self._stack = []
+        self._started_tracemalloc = False
+
+    def start_doc(self, label: str=None) -> DocProfile:
+        """
+        Starts a new DocProfile; stages and counts from now on go to it.
+        """
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self.current = DocProfile(label if label is not None else str(len(self.docs)))
+        self.docs.append(self.current)
+        return self.current
+
+    def stop(self):
+        """
+        Stops tracemalloc, if this profiler started it.
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times the body of the with block as stage name of the current doc.
+        """
+        if self.current is None:
+            self.start_doc()
+        doc = self.current
+        full_name = ".".join([s[0] for s in self._stack] + [name])
+        tracing = self.memory and tracemalloc.is_tracing()
+
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # the enclosing stage's peak so far has to be kept before resetting it
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        entry = [name, current if tracing else 0, current if tracing else 0]
+        self._stack.append(entry)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            peak_bytes = 0
+            if tracing:
+                peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - entry[2]
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+            doc.add_stage(full_name, StageTiming(wall, cpu, peak_bytes))
+
+    def count(self, **counts):
+        """
+        Adds to the size counters of the current doc.
+        """
+        if self.current is None:
+            self.start_doc()
+        self.current.count(**counts)
+
+    def records(self) -> List[dict]:
+        return [doc.as_dict() for doc in self.docs]
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "Profiler":
+        """
+        Rebuilds a profiler from DocProfile dicts (ie the "profile" field of manifest records), for reporting.
+        """
+        profiler = cls(memory=False)
+        profiler.docs = [DocProfile.from_dict(r) for r in records]
+        return profiler
+
+    def report(self, percentiles: Iterable[float]=(50, 90, 99)) -> dict:
+        """
+        Aggregates the per-doc profiles.
+
+        Output:
+            {
+                "docs": number of docs,
+                "stages": {stage: {"n", "total_wall", "wall": {"p50", ..., "max"}, "cpu": {...}, "peak_bytes": {...}}},
+                "counters": {counter: {"total", "p50", ..., "max"}}
+            }
+        """
+        percentiles = list(percentiles)
+
+        def summarize(values: list) -> dict:
+            values = np.asarray(values, dtype=float)
+            summary = {f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+            summary["max"] = float(values.max())
+            return summary
+
+        stages = {}
+        for doc in self.docs:
+            for name, timing in doc.stages.items():
+                stages.setdefault(name, []).append(timing)
+        counters = {}
+        for doc in self.docs:
+            for name, v in doc.counters.items():
+                counters.setdefault(name, []).append(v)
+
+        return {
+            "docs": len(self.docs),
+            "stages": {
+                name: {
+                    "n": len(timings),
+                    "total_wall": float(sum(t.wall for t in timings)),
+                    **{field: summarize([getattr(t, field) for t in timings]) for field in StageTiming._fields}
+                }
+                for name, timings in stages.items()
+            },
+            "counters": {
+                name: {"total": float(sum(values)), **summarize(values)}
+                for name, values in counters.items()
+            }
+        }
+
+    def slowest(self, n: int=10, stage: str=None) -> List[DocProfile]:
+        """
+        The n docs with the most wall time (in stage, or overall), for spotting pathological articles.
+        """
+        if stage is None:
+            key = lambda doc: doc.wall
+        else:
+            key = lambda doc: doc.stages[stage].wall if stage in doc.stages else 0
+        return sorted(self.docs, key=key, reverse=True)[:n]
+
+    def format_report(self, n_slowest: int=5) -> str:
+        """
+        The report as a text table: wall/cpu percentiles in ms and peak memory in MB per stage, then counters and the slowest docs.
+        """
+        report = self.report()
+        total_wall = sum(s["total_wall"] for name, s in report["stages"].items() if "." not in name) or 1
+        lines = [
+            f"{report['docs']} docs",
+            f"{'stage':<28}{'n':>7}{'share':>7}{'wall p50':>10}{'p90':>9}{'p99':>9}{'max':>9}{'cpu p50':>9}{'peak MB p90':>12}"
+        ]
+        for name, s in sorted(report["stages"].items(), key=lambda i: -i[1]["total_wall"]):
+            wall, cpu, peak = s["wall"], s["cpu"], s["peak_bytes"]
+            lines.append(
+                f"{name:<28}{s['n']:>7}{s['total_wall']/total_wall:>7.0%}"
+                f"{wall['p50']*1e3:>10.1f}{wall['p90']*1e3:>9.1f}{wall['p99']*1e3:>9.1f}{wall['max']*1e3:>9.1f}"
+                f"{cpu['p50']*1e3:>9.1f}{peak['p90']/1e6:>12.1f}"
+            )
+        lines.append(f"{'counter':<28}{'total':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+        for name, c in sorted(report["counters"].items()):
+            lines.append(f"{name:<28}{c['total']:>10.0f}{c['p50']:>9.0f}{c['p90']:>9.0f}{c['p99']:>9.0f}{c['max']:>9.0f}")
+        if n_slowest:
+            lines.append("slowest docs:")
+            for doc in self.slowest(n_slowest):
+                lines.append(f"  {doc.label:<30}{doc.wall*1e3:>10.1f} ms  tokens={doc.counters.get('tokens', '?')}")
+        return "\n".join(lines)
@@ -1,11 +1,14 @@
 from collections import namedtuple
+from bisect import bisect_left, bisect_right
+import numpy as np
 import regex as re
-from itertools import zip_longest
+from spacy.attrs import POS, LEMMA
+from spacy.strings import hash_string
 from spacy.tokens import Doc, Span, Token
-from typing import Iterable, Union, List, Literal
+from typing import Iterable, Union, List, Literal, Tuple
 from .constants import (
-    _reporting_verbs, _VERB_MODIFIER_DEPS, QUOTATION_MARK_PAIRS, 
-    all_quotes, brack_regex, double_quotes, double_quotes_nospace_regex,
+    _reporting_verbs, _ACTIVE_SUBJ_DEPS, _VERB_MODIFIER_DEPS, QUOTATION_MARK_PAIRS, 
+    all_quotes, brack_regex, double_quotes,
     )
 from spacy.symbols import VERB, PUNCT
 
@@ -19,6 +22,37 @@ def filter_cue_candidates(tok):
         tok.lemma_ in _reporting_verbs
     ])
 
+_irregular_forms = {
+    "say": ["said"],
+    "tell": ["told"],
+    "think": ["thought"],
+    "write": ["wrote", "written"],
+}
+
+def verb_forms(lemma: str) -> set:
+    """
+    Inflected forms of an English verb (-s, -ed, -ing, with the usual spelling changes, plus a few irregulars). Over-generates on purpose: it only has to contain every real form.
+    """
+    forms = {lemma, lemma + "s", lemma + "ed", lemma + "ing", lemma + lemma[-1] + "ed", lemma + lemma[-1] + "ing"}
+    if lemma.endswith("e"):
+        forms |= {lemma + "d", lemma[:-1] + "ing"}
+    if lemma.endswith(("s", "sh", "ch", "x", "z")):
+        forms.add(lemma + "es")
+    if lemma.endswith("y") and lemma[-2:-1] not in "aeiou":
+        forms |= {lemma[:-1] + "ies", lemma[:-1] + "ied"}
+    return forms | set(_irregular_forms.get(lemma, []))
+
+_reporting_verb_forms = None
+
+def reporting_verb_forms() -> set:
+    """
+    Surface forms (lowercase) of every verb in _reporting_verbs, so cue candidates can be spotted without a lemmatizer.
+    """
+    global _reporting_verb_forms
+    if _reporting_verb_forms is None:
+        _reporting_verb_forms = set().union(*[verb_forms(lemma) for lemma in _reporting_verbs])
+    return _reporting_verb_forms
+
 def filter_speaker_candidates(ch, i, j):
     return all([
             ch.pos!=PUNCT,
@@ -26,22 +60,56 @@ def filter_speaker_candidates(ch, i, j):
         ])
 
 def filter_quote_tokens(tok: Token, qtok_idx_pairs: List[tuple]) -> bool:
-    return any(i <= tok.i <= j for i, j in qtok_idx_pairs)
+    """
+    Whether tok is inside (or on the marks of) any quote pair.
+
+    Bisect lookup, so qtok_idx_pairs has to be sorted and non-overlapping, which get_qtok_idx_pairs guarantees.
+    """
+    k = bisect_right(qtok_idx_pairs, (tok.i, float("inf")))
+    return k > 0 and tok.i <= qtok_idx_pairs[k-1][1]
+
+def quote_ord(t: str) -> int:
+    """
+    Ordinal of a quote token, or None for multi-character tokens (ie "\n\n"), which can't pair.
+    """
+    return ord(t) if len(t) == 1 else None
+
+_closing_marks = {}
+for _open, _close in QUOTATION_MARK_PAIRS:
+    _closing_marks.setdefault(_open, []).append(_close)
 
 def get_qtok_idx_pairs(doc: Union[Doc, Span]) -> List[tuple]:
-    qtoks = [tok for tok in doc if tok.is_quote or (re.match(r"(\n)+", tok.text))]
-    qtok_idx_pairs = [(-1,-1)]
+    """
+    Pairs up opening and closing quotation marks (and linebreaks, which close dangling quotes).
+
+    An opening mark has no trailing whitespace and comes after the previous pair closed. It pairs with the first later quote token that makes a pair in QUOTATION_MARK_PAIRS.
+
+    Finding that closing mark is a bisect into the positions of each possible closing character, so this is one pass over the quote tokens instead of a rescan per opening mark.
+
+    Output:
+        list of (opening token index, closing token index), sorted and non-overlapping
+    """
+    qtoks = [tok for tok in doc if tok.is_quote or tok.text.startswith("\n")]
+    qords = [quote_ord(q.text) for q in qtoks]
+    positions = {}
+    for n, o in enumerate(qords):
+        positions.setdefault(o, []).append(n)
+
+    qtok_idx_pairs = []
+    last_close = -1
     for n, q in enumerate(qtoks):
-        if (
-            not bool(q.whitespace_)
-            and q.i not in [q_[1] for q_ in qtok_idx_pairs] 
-            and q.i > qtok_idx_pairs[-1][1]
-            ):
-            for q_ in qtoks[n+1:]:
-                if (ord(q.text), ord(q_.text)) in QUOTATION_MARK_PAIRS:
-                    qtok_idx_pairs.append((q.i, q_.i))
-                    break  
-    return qtok_idx_pairs[1:]
+        if q.whitespace_ or q.i <= last_close:
+            continue
+        close = None
+        for o in _closing_marks.get(qords[n], []):
+            o_positions = positions.get(o, [])
+            k = bisect_right(o_positions, n)
+            if k < len(o_positions) and (close is None or o_positions[k] < close):
+                close = o_positions[k]
+        if close is not None:
+            last_close = qtoks[close].i
+            qtok_idx_pairs.append((q.i, last_close))
+    return qtok_idx_pairs
 
 def expand_noun(tok: Token) -> list[Token]:
     """Expand a noun token to include all associated conjunct and compound nouns."""
@@ -61,43 +129,132 @@ def expand_verb(tok: Token) -> list[Token]:
     ]
     return [tok] + verb_modifiers
 
-def get_sent_idxs(span):
-    indexes = [
-        n for n, s in enumerate(span.doc.sents) 
-        if (s.start <= span.start <= s.end) 
-        or (s.start <= span.end <= s.end)
-        ]
-    return indexes[0], indexes[-1]
+class DocIndex:
+    """
+    Sentence and linebreak positions of a doc, computed once and shared by the window lookups of every quote in it.
 
-def line_break_window(span):
+    Sentences partition the doc and linebreaks are sorted, so every lookup is a bisect instead of a pass over doc.sents or the tokens.
+    """
+    def __init__(self, doc: Doc):
+        self.sents = list(doc.sents)
+        self.sent_starts = [s.start for s in self.sents]
+        self.sent_ends = [s.end for s in self.sents]
+        self.linebreaks = [0] + [tok.i for tok in doc if tok.text.startswith("\n")] + [doc[-1].i]
+
+    def sents_touching(self, i: int) -> List[int]:
+        """
+        Indexes of the sentences with start <= i <= end (so a sentence boundary touches two sentences).
+        """
+        n = bisect_right(self.sent_starts, i) - 1
+        idxs = []
+        while n >= 0 and self.sent_ends[n] >= i:
+            idxs.append(n)
+            n -= 1
+        return idxs
+
+    def sent_strictly_containing(self, i: int) -> int:
+        """
+        Index of the sentence with start < i < end, or None.
+        """
+        n = bisect_right(self.sent_starts, i) - 1
+        if n >= 0 and self.sent_starts[n] < i < self.sent_ends[n]:
+            return n
+        return None
+
+    def last_linebreak(self, i: int) -> int:
+        """
+        Largest linebreak position <= i.
+        """
+        return self.linebreaks[bisect_right(self.linebreaks, i) - 1]
+
+class CueIndex:
+    """
+    Reporting verbs of a doc that can be a cue, with their eligible speakers, computed once and shared by every quote in it.
+
+    A cue candidate is a VERB whose lemma is in _reporting_verbs, outside every quote pair. Only candidates with at least one non-punctuation child in _ACTIVE_SUBJ_DEPS are kept, since the others can never yield a speaker. Positions are sorted, so the candidates in a window are a bisect per sentence.
+    """
+    _reporting_verb_hashes = np.array(sorted(hash_string(v) for v in _reporting_verbs), dtype="uint64")
+
+    def __init__(self, doc: Doc, qtok_idx_pairs: List[tuple]):
+        attrs = doc.to_array([POS, LEMMA])
+        is_cue = (attrs[:, 0] == VERB) & np.isin(attrs[:, 1], self._reporting_verb_hashes)
+        self.positions = []
+        self.subjects = {}
+        for p in np.flatnonzero(is_cue).tolist():
+            tok = doc[p]
+            if filter_quote_tokens(tok, qtok_idx_pairs):
+                continue
+            subjects = [child.i for child in tok.children if child.pos != PUNCT and child.dep in _ACTIVE_SUBJ_DEPS]
+            if subjects:
+                self.positions.append(p)
+                self.subjects[p] = subjects
+
+    def candidates(self, window_sents: List[Span], i: int, j: int) -> List[int]:
+        """
+        Positions of the cue candidates in window_sents, nearest to the quote doc[i:j] first (ties go to the earlier token).
+
+        Candidates can't be inside the quote, so the ones before i and after j are each already in distance order and just get merged.
+        """
+        before, after = [], []
+        for sent in window_sents:
+            lo = bisect_left(self.positions, sent.start)
+            hi = bisect_left(self.positions, sent.end)
+            for p in self.positions[lo:hi]:
+                (before if p < i else after).append(p)
+        before.reverse()
+        merged = []
+        b = a = 0
+        while b < len(before) and a < len(after):
+            if i - before[b] <= after[a] - j:
+                merged.append(before[b])
+                b += 1
+            else:
+                merged.append(after[a])
+                a += 1
+        return merged + before[b:] + after[a:]
+
+    def speaker(self, p: int, i: int, j: int) -> int:
+        """
+        Position of the first eligible speaker of the cue at p that isn't inside the quote doc[i:j], or None.
+        """
+        return next((c for c in self.subjects[p] if c >= j or c <= i), None)
+
+def get_sent_idxs(span, index: DocIndex=None):
+    index = index or DocIndex(span.doc)
+    indexes = index.sents_touching(span.start) + index.sents_touching(span.end)
+    if not indexes:
+        raise IndexError("span is not in any sentence")
+    return min(indexes), max(indexes)
+
+def line_break_window(span, index: DocIndex=None):
     """
     Finds the boundaries of the paragraph containing doc[i:j].
     """
-    lb_tok_idxs = [0] + [tok.i for tok in span.doc if re.match(r"\n", tok.text)] + [span.doc[-1].i]
-    for i_, j_ in zip_longest(lb_tok_idxs, lb_tok_idxs[1:]):
-        if i_ <= span.start and j_ >= span.end:
-            return (i_, j_)
+    index = index or DocIndex(span.doc)
+    lb_tok_idxs = index.linebreaks
+    n = bisect_left(lb_tok_idxs, span.end, 1) - 1
+    if n + 1 < len(lb_tok_idxs) and lb_tok_idxs[n] <= span.start:
+        return (lb_tok_idxs[n], lb_tok_idxs[n+1])
     else:
         return (None, None)
     
-def windower(span, method: Literal["overlap", "linebreaks"]=None):
+def windower(span, method: Literal["overlap", "linebreaks"]=None, index: DocIndex=None):
+    """
+    Sentences around span to look for a cue and speaker in.
+
+    Pass a DocIndex when windowing many spans of the same doc, so the sentences and linebreaks are only found once.
+    """
+    index = index or DocIndex(span.doc)
     if method == "overlap":
-        return [
-                sent for sent in span.doc.sents
-                if (sent.start < span.start < sent.end)
-                or (sent.start < span.end < sent.end)
-            ]
+        idxs = [index.sent_strictly_containing(i) for i in (span.start, span.end)]
+        return [index.sents[n] for n in sorted(set(idxs) - {None})]
     else:
-        i_sent, j_sent = get_sent_idxs(span)
-        sents = list(span.doc.sents)[i_sent-1:j_sent+2] if i_sent > 0 else list(span.doc.sents)[:j_sent+2]
+        i_sent, j_sent = get_sent_idxs(span, index)
+        sents = index.sents[i_sent-1:j_sent+2] if i_sent > 0 else index.sents[:j_sent+2]
         if method == "linebreaks":
-            linebreaks = [0] + [tok.i for tok in span.doc if re.match(r"\n", tok.text)] + [span.doc[-1].i]
-            linebreak_limits = [
-                lb for lb in linebreaks
-                if sents[0].start < lb <= span.end + 1
-                ]
-            if linebreak_limits:
-                return [s for s in sents if s.end <= max(linebreak_limits)]
+            linebreak_limit = index.last_linebreak(span.end + 1)
+            if linebreak_limit > sents[0].start:
+                return [s for s in sents if s.end <= linebreak_limit]
         return sents  
 
 def old_windower(span, lb_boundaries=False) -> Iterable:
@@ -120,6 +277,46 @@ def old_windower(span, lb_boundaries=False) -> Iterable:
                 )
             ]
             
+_double_quotes_regex = re.compile(brack_regex.format(double_quotes))
+_nonspace_regex = re.compile(r"\S")
+
+def fix_glued_quotes(p: str) -> Tuple[str, int]:
+    """
+    Puts a space on one side of every double quote that has non-space characters on both sides ("glued"), so quotes can be paired.
+
+    A glued quote gets its space on the outside: after it if it closes an odd number of quotes so far (' "' -> '" '), before it otherwise. One pass over the quote marks, tracking quote parity as it goes.
+
+    Output:
+        p (str) - fixed text
+        n_quotes (int) - number of double quotes in the fixed text
+    """
+    pieces = []
+    last = 0
+    n_quotes = 0
+    # position and new character of the last replacement, since the lookbehind sees the fixed text
+    replaced_at, replaced_char = None, None
+    for match in _double_quotes_regex.finditer(p):
+        k = match.start()
+        if k == 0:
+            prev = None
+        elif k - 1 == replaced_at:
+            prev = replaced_char
+        else:
+            prev = p[k-1]
+        if (
+            prev is not None 
+            and _nonspace_regex.match(prev) 
+            and k + 1 < len(p) 
+            and _nonspace_regex.match(p[k+1])
+            ):
+            replacer = '" ' if n_quotes % 2 != 0 else ' "'
+            pieces += [p[last:k], replacer]
+            last = k + 1
+            replaced_at, replaced_char = k, replacer[-1]
+        n_quotes += 1
+    pieces.append(p[last:])
+    return "".join(pieces), n_quotes
+
 def para_quote_fixer(p, exp: bool=False):
     if not p:
         return
@@ -127,17 +324,13 @@ def para_quote_fixer(p, exp: bool=False):
     p = p.replace("\'\'", "\"")
     p = re.sub(r"(.{3,8}s\')(\s)", r"\1x\2", p)
 
-    while re.search(double_quotes_nospace_regex, p):
-        match = re.search(double_quotes_nospace_regex, p)
-        if len(re.findall(brack_regex.format(double_quotes), p[:match.start()])) % 2 != 0:
-            replacer = '" '
-        else:
-            replacer = ' "'
-        p = p[:match.start()] + replacer + p[match.end():]
+    p, n_quotes = fix_glued_quotes(p)
+    # quotes in p[1:]
+    n_quotes -= p[0] in double_quotes
     if (
         not (p[0] == "'" and p[-1] == "'") 
         and p[0] in all_quotes 
-        and len(re.findall(brack_regex.format(double_quotes), p[1:])) % 2 == 0
+        and n_quotes % 2 == 0
         ):
         p += '"'
     return p
@@ -1,76 +1,69 @@
 from .quote_helpers import (
-    old_windower, windower, expand_noun, expand_verb, DQTriple
+    old_windower, windower, expand_noun, expand_verb, DQTriple,
+    get_qtok_idx_pairs, filter_quote_tokens, DocIndex, CueIndex, reporting_verb_forms
     )
-from .constants import _ACTIVE_SUBJ_DEPS, _reporting_verbs, min_quote_length, QUOTATION_MARK_PAIRS
-from spacy.tokens import Doc, Token
-from spacy.symbols import VERB, PUNCT
+from .constants import min_quote_length
+from spacy.tokens import Doc, Span
 from operator import attrgetter
-import regex as re
+
+def skip_content(content: Span) -> bool:
+    """
+    Quote contents that are too short, or that are all title case (ie names, headlines), aren't treated as quotes.
+    """
+    return (
+        len(content.text.split()) <= min_quote_length
+        or all (
+            tok.is_title
+            for tok in content
+            if not (tok.is_punct or tok.is_stop)           
+            )
+        )
+
+def has_attributable_quotes(doc: Doc) -> bool:
+    """
+    Cheap pre-screen for direct_quotations, which only needs a tokenized doc (no tagger or parser).
+
+    Checks the conditions direct_quotations can check without POS or dependencies: a quote pair whose content passes skip_content, and a token outside the quotes that could be a reporting verb cue (by surface form, see reporting_verb_forms). If this is False, direct_quotations can't find anything in the parsed doc either.
+    """
+    qtok_idx_pairs = get_qtok_idx_pairs(doc)
+    if not any(not skip_content(doc[i:j]) for i, j in qtok_idx_pairs):
+        return False
+    forms = reporting_verb_forms()
+    return any(
+        tok.lower_ in forms and not filter_quote_tokens(tok, qtok_idx_pairs)
+        for tok in doc
+        )
 
 def direct_quotations(doc: Doc, exp: bool=False):
-    qtoks = [tok for tok in doc if tok.is_quote or (re.match(r"(\n)+", tok.text))]
-    qtok_idx_pairs = [(-1,-1)]
-    for n, q in enumerate(qtoks):
-        if (
-            not bool(q.whitespace_)
-            and q.i not in [q_[1] for q_ in qtok_idx_pairs] 
-            and q.i > qtok_idx_pairs[-1][1]
-            ):
-            for q_ in qtoks[n+1:]:
-                if (ord(q.text), ord(q_.text)) in QUOTATION_MARK_PAIRS:
-                    qtok_idx_pairs.append((q.i, q_.i))
-                    break  
-    qtok_idx_pairs = qtok_idx_pairs[1:]
+    """
+    Finds (speaker, cue, content) triples for the quotes in doc.
 
-    def filter_quote_tokens(tok: Token) -> bool:
-        return any(i <= tok.i <= j for i, j in qtok_idx_pairs)
+    For each quote, the cue is the nearest reporting verb with an active subject outside the quote, looked for first in the sentences the quote overlaps and then in its paragraph. The verbs and their subjects come from a CueIndex, so each window is a range lookup instead of a rescan of its tokens.
+    """
+    qtok_idx_pairs = get_qtok_idx_pairs(doc)
+    if not qtok_idx_pairs:
+        return
+    cues = CueIndex(doc, qtok_idx_pairs)
+    if not cues.positions:
+        return
+    index = DocIndex(doc)
 
     for i, j in qtok_idx_pairs:
         content = doc[i:j]
-        if (
-            len(content.text.split()) <= min_quote_length
-            or all (
-                tok.is_title
-                for tok in content
-                if not (tok.is_punct or tok.is_stop)           
-                )
-            ):
+        if skip_content(content):
             continue
-        cue = None
-        speaker = None
-
-        windy = [windower(content, "overlap"), windower(content, "linebreaks")]
-        for window_sents in windy:
-            cue_candidates = [
-                    tok
-                    for sent in window_sents
-                    for tok in sent
-                    if tok.pos == VERB
-                    and tok.lemma_ in _reporting_verbs
-                    and not filter_quote_tokens(tok)
-                ]
-            cue_candidates = sorted(
-                cue_candidates,
-                key=lambda cc: min(abs(cc.i - i), abs(cc.i - j))
-            )
-            
-            for cue_cand in cue_candidates:
-                if cue is not None:
+        for method in ("overlap", "linebreaks"):
+            found = None
+            for p in cues.candidates(windower(content, method, index), i, j):
+                speaker = cues.speaker(p, i, j)
+                if speaker is not None:
+                    found = p, speaker
                     break
-                speaker_cands = [
-                    speaker_cand for speaker_cand in cue_cand.children
-                    if speaker_cand.pos != PUNCT
-                    and ((speaker_cand.i >= j)
-                    or (speaker_cand.i <= i))
-                ]
-                for speaker_cand in speaker_cands:
-                    if speaker_cand.dep in _ACTIVE_SUBJ_DEPS:
-                        cue = expand_verb(cue_cand)
-                        speaker = expand_noun(speaker_cand)
-                        break
-                if content and cue and speaker:
-                    yield DQTriple(
-                        speaker=sorted(speaker, key=attrgetter("i")),
-                        cue=sorted(cue, key=attrgetter("i")),
-                        content=doc[i:j+1],
-                    )
\ No newline at end of file
+            if found is not None:
+                cue, speaker = expand_verb(doc[found[0]]), expand_noun(doc[found[1]])
+                yield DQTriple(
+                    speaker=sorted(speaker, key=attrgetter("i")),
+                    cue=sorted(cue, key=attrgetter("i")),
+                    content=doc[i:j+1],
+                )
+                break
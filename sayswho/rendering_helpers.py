@@ -1,13 +1,22 @@
 
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from .article_helpers import extract_soup, get_metadata, full_parse
-from .sayswho import Attributor, evaluate
-from jinja2 import Environment, FileSystemLoader
 from spacy.tokens import Doc, Span
-from spacy import displacy
+from spacy.attrs import IDX, LENGTH
 from .quote_helpers import DQTriple
-from typing import Iterable
+from typing import Iterable, Iterator, TextIO, TYPE_CHECKING
+import numpy as np
 import regex as re
 
+# jinja2, displacy and the Attributor stack are imported where they're used, so importing this module stays cheap
+if TYPE_CHECKING:
+    from .sayswho import Attributor
+
 def render_data(
         data: dict, 
         quotes: Iterable=None, 
@@ -36,45 +45,188 @@ def render_data(
 
     return metadata
 
-def render_new(a: Attributor, metadata: dict, color_key: dict, save_file: bool=False):
-    metadata['bodytext'] = render_attr_with_highlights(a, color_key)
-    metadata['quotes'] = yield_quotes(a)
-    metadata['score'] = {k:getattr(evaluate(a),k) for k in ['n_quotes', 'n_ent_quotes', 'n_ents_quoted']}
-    rendered = Environment(
-        loader=FileSystemLoader("./")
-    ).get_template('article_template.html').render(metadata)
-    
+def render_new(a: "Attributor", metadata: dict, color_key: dict, save_file: bool=False, out_dir: str="."):
+    """
+    Renders one article into article_template.html and writes it to out_dir, as (doc_id).html if save_file, else temp.html.
+
+    Goes through a Renderer, so the template is only compiled once per process. For batches, use Renderer.render_many.
+    """
+    renderer = Renderer(color_key, out_dir=out_dir)
+    metadata.update(renderer.context(a, metadata))
     file_name = f"{metadata['doc_id']}.html" if save_file else "temp.html"
+    atomic_write(os.path.join(out_dir, file_name), renderer.template.render(metadata))
+    return
 
-    with open(file_name, "w+") as f:
-        try:
-            f.write(rendered)
-        except UnicodeDecodeError:
-            rendered = re.sub("\u2014", "-", rendered)
+@lru_cache(maxsize=None)
+def get_template(template_dir: str=".", template_name: str="article_template.html"):
+    """
+    Loads and compiles the jinja2 template once per process.
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    return Environment(loader=FileSystemLoader(template_dir)).get_template(template_name)
+
+def atomic_write(path: str, rendered: str):
+    """
+    Writes rendered to a temp file next to path, then renames it into place, so readers never see a half-written file.
+
+    If the platform encoding can't handle em dashes, they are swapped for hyphens (like the old render_new did).
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
             f.write(rendered)
-    return
+    except UnicodeError:
+        with open(tmp_path, "w") as f:
+            f.write(re.sub("\u2014", "-", rendered))
+    os.replace(tmp_path, path)
+
+class Renderer:
+    """
+    Renders attributed articles into article_template.html.
+
+    The template is compiled once, and render_many renders batches in a thread pool. Output goes either to loose (doc_id).html files, written atomically, or into a single zip archive.
+
+        with Renderer(color_key, out_dir="good_results_output", archive="html.zip") as renderer:
+            for path in renderer.render_many(zip(a.attribute_many(texts), metadatas)):
+                ...
+    """
+    def __init__(
+            self,
+            color_key: dict,
+            out_dir: str=".",
+            archive: str=None,
+            template_dir: str=".",
+            template_name: str="article_template.html"
+            ):
+        """
+        Input:
+            color_key (dict) - css colors by label, for the highlights
+            out_dir (str) - where html files (or the archive) go
+            archive (str) - name of a zip file in out_dir to put every article in, instead of loose files. Opened in append mode, so re-runs add to it. The zip is only complete once the renderer is closed.
+            template_dir, template_name - the jinja2 template
+        """
+        self.color_key = color_key
+        self.out_dir = out_dir
+        self.template = get_template(template_dir, template_name)
+        self.archive = None
+        if archive is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            self.archive = zipfile.ZipFile(os.path.join(out_dir, archive), "a", compression=zipfile.ZIP_DEFLATED)
+
+    def context(self, a: "Attributor", metadata: dict) -> dict:
+        """
+        Template variables for one article: metadata plus the highlighted body, quotes and score.
+        """
+        from .sayswho import evaluate
+
+        score = evaluate(a)
+        return {
+            **metadata,
+            'bodytext': render_attr_with_highlights(a, self.color_key),
+            'quotes': list(yield_quotes(a)),
+            'score': {k:getattr(score, k) for k in ['n_quotes', 'n_ent_quotes', 'n_ents_quoted']}
+        }
+
+    def render(self, a: "Attributor", metadata: dict) -> str:
+        return self.template.render(self.context(a, metadata))
+
+    def write(self, file_name: str, rendered: str) -> str:
+        """
+        Writes one rendered article (to the archive, if there is one). Not thread safe; render_many only calls it from the calling thread.
+
+        Output:
+            path of the file, or its name in the archive
+        """
+        if self.archive is not None:
+            self.archive.writestr(file_name, rendered)
+            return file_name
+        path = os.path.join(self.out_dir, file_name)
+        atomic_write(path, rendered)
+        return path
+
+    def render_one(self, a: "Attributor", metadata: dict) -> str:
+        return self.write(f"{metadata['doc_id']}.html", self.render(a, metadata))
+
+    def render_many(self, items: Iterable[tuple], workers: int=4) -> Iterator[str]:
+        """
+        Renders (Attributor, metadata) pairs in a thread pool, writing each one as it's done. Lazy, like attribute_many: nothing is rendered until the output is iterated.
+
+        Each Attributor has to hold its own docs (ie the copies from attribute_many, not the same instance re-used).
+
+        Output:
+            paths (or archive names), in the same order as items
+        """
+        render_item = lambda item: (f"{item[1]['doc_id']}.html", self.render(*item))
+        with ThreadPoolExecutor(workers) as pool:
+            # only a few articles in flight at a time, so items can be a lazy stream
+            pending = deque()
+            for item in items:
+                pending.append(pool.submit(render_item, item))
+                if len(pending) > 2 * workers:
+                    yield self.write(*pending.popleft().result())
+            while pending:
+                yield self.write(*pending.popleft().result())
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def index_matches(matches: Iterable, field: str) -> dict:
+    """
+    Groups matches (QuoteClusterMatch, QuoteEntMatch...) by one of their fields, ie quote_index, keeping their original order within each group.
+    """
+    index = {}
+    for m in matches:
+        index.setdefault(getattr(m, field), []).append(m)
+    return index
+
+def cluster_text(cluster) -> str:
+    """
+    Display string of a cluster: its distinct non-pronoun mentions.
+    """
+    return ', '.join(
+        set([c.text for c in cluster if c[0].pos_ !="PRON"])
+    )
 
 def yield_quotes(a):
+    """
+    One dict per quote/cluster match, for the quote sidebar of article_template.html, with the first ent matched to the quote (if any).
+
+    Matches are looked up in indexes keyed by quote_index, and each cluster's display string is only built once, so this is linear in the number of matches.
+    """
+    cluster_matches = index_matches(a.quote_matches, "quote_index")
+    first_ent_matches = {}
+    for em in a.ent_matches:
+        first_ent_matches.setdefault(em.quote_index, em)
+    cluster_texts = {}
+
     for quote_index, quote in enumerate(a.quotes):
-        for m in (qm for qm in a.quote_matches if qm.quote_index==quote_index):
-            base_dict = render_quote(quote)
+        if quote_index not in cluster_matches:
+            continue
+        quote_dict = render_quote(quote)
+        for m in cluster_matches[quote_index]:
+            base_dict = dict(quote_dict)
             base_dict['cluster_index'] = m.cluster_index
-            base_dict['cluster'] = ', '.join(
-                set([c.text for c in a.clusters[m.cluster_index] if c[0].pos_ !="PRON"])
-            )
-            try:
-                ent = next(em for em in a.ent_matches if em.quote_index==m.quote_index)
+            if m.cluster_index not in cluster_texts:
+                cluster_texts[m.cluster_index] = cluster_text(a.clusters[m.cluster_index])
+            base_dict['cluster'] = cluster_texts[m.cluster_index]
+            ent = first_ent_matches.get(m.quote_index)
+            if ent is not None:
                 base_dict['ent_index'] = ent.ent_index
                 base_dict['ent'] = a.ents[ent.ent_index].text
-            except StopIteration:
-                pass
             yield base_dict
 
 def render_quote_match(a, quote_match):
     quote = render_quote(a.quotes[quote_match.quote_index])
-    quote['cluster'] = ', '.join(
-        set([c.text for c in a.clusters[quote_match.cluster_index] if c[0].pos_ !="PRON"])
-    )
+    quote['cluster'] = cluster_text(a.clusters[quote_match.cluster_index])
     return quote
 
 def render_quote(quote):
@@ -83,32 +235,87 @@ def render_quote(quote):
             "cue": "".join([t.text_with_ws for t in quote.cue]),
     }
 
-def get_ent_quote_indexes(a: Attributor) -> list:
+def get_ent_quote_indexes(a: "Attributor") -> list:
     ent_idxs = [((e.start, e.end), e.label_, n) for n, e in enumerate(a.ents)]
     quote_idxs = [((q.content.start, q.content.end), "QUOTE", n) for n, q in enumerate(a.quotes)]
     indexes = sorted(ent_idxs+quote_idxs, key=lambda i: i[0])
     return indexes
 
-def render_attr_with_highlights(a: Attributor, color_key: dict) -> str:
-    indexes = get_ent_quote_indexes(a)
-    text_bucket = ["<p>"]
-    for token in a.doc:
-        coded = False
-        if token.text == "\n":
-            token_text = "</p><p>"
+def get_annotation_events(a: "Attributor", color_key: dict) -> list:
+    """
+    Open and close tags of every ent and quote, as (token index, html code) events sorted by token.
+
+    Same as the original token-by-token rendering: a range (start, end) opens at token start and closes at token end (ie before the first token after it), and events on the same token keep the order of get_ent_quote_indexes.
+    """
+    events = []
+    for (start, end), label, n in get_ent_quote_indexes(a):
+        events.append((start, generate_code(n, label, True, color_key)))
+        if end != start:
+            events.append((end, generate_code(n, label, False, color_key)))
+    return sorted(events, key=lambda e: e[0])
+
+def get_event_map(a: "Attributor", color_key: dict) -> list:
+    """
+    Everything render_attr_with_highlights has to do something about, keyed by character offset: tokens with open/close events and "\n" tokens (which become paragraph breaks).
+
+    Output:
+        sorted list of (start char, end char, is_linebreak, html codes) -- one per token that needs more than copying its text, where end char includes the token's trailing whitespace
+    """
+    doc = a.doc
+    text = doc.text
+    offsets = doc.to_array([IDX, LENGTH]).reshape(-1, 2)
+    starts = offsets[:, 0]
+    ends = np.append(starts[1:], len(text))
+
+    by_token = {}
+    for token_index, code in get_annotation_events(a, color_key):
+        # ranges that end at the end of the doc never get closed
+        if token_index < len(doc):
+            by_token.setdefault(token_index, []).append(code)
+
+    # "\n" tokens (but not "\n\n" or "\n ")
+    newline_chars = np.array([m.start() for m in re.finditer("\n", text)], dtype=np.int64)
+    candidates = np.searchsorted(starts, newline_chars, side="right") - 1
+    is_newline_token = (starts[candidates] == newline_chars) & (offsets[candidates, 1] == 1)
+    newline_tokens = set(candidates[is_newline_token].tolist())
+
+    return [
+        (int(starts[k]), int(ends[k]), k in newline_tokens, by_token.get(k, []))
+        for k in sorted(newline_tokens | set(by_token))
+        ]
+
+def iter_attr_with_highlights(a: "Attributor", color_key: dict) -> Iterator[str]:
+    """
+    Yields the highlighted body html in chunks: the text between events is sliced straight out of doc.text, so it's linear in the length of the doc.
+    """
+    text = a.doc.text
+    yield "<p>"
+    pos = 0
+    for start, end, is_linebreak, codes in get_event_map(a, color_key):
+        yield text[pos:start]
+        token_text = "</p><p>" if is_linebreak else text[start:end]
+        if codes:
+            # one copy of the token per event, like the token-by-token version
+            for code in codes:
+                yield code + token_text
         else:
-            token_text = token.text_with_ws
-        for index_match in (i_ for i_ in indexes if token.i in i_[0]):
-            coded = True
-            match_indexes, label, n = index_match
-            start = not match_indexes.index(token.i)
-            html_code = generate_code(n, label, start, color_key)
-            text_bucket.append(html_code + token_text)
-        if not coded:
-            text_bucket.append(token_text)
-
-    text_bucket.append("</p>")
-    return "".join(text_bucket)
+            yield token_text
+        pos = end
+    yield text[pos:]
+    yield "</p>"
+
+def render_attr_with_highlights(a: "Attributor", color_key: dict) -> str:
+    """
+    Body html with ents and quotes highlighted and paragraphs split on "\n" tokens. Built from an event map instead of checking every token against every range.
+    """
+    return "".join(iter_attr_with_highlights(a, color_key))
+
+def write_attr_with_highlights(a: "Attributor", color_key: dict, f: TextIO):
+    """
+    Streaming version of render_attr_with_highlights, writing straight to the file handle f.
+    """
+    for chunk in iter_attr_with_highlights(a, color_key):
+        f.write(chunk)
 
 def generate_code(
     n: int, label: str, start: bool=True, color_key: dict={}
@@ -125,12 +332,14 @@ def generate_code(
         else:
             return "</span>"
         
-def double_viz(a: Attributor):
+def double_viz(a: "Attributor"):
     """
     Displacy visualization of all quotes and law enforcement entities.
 
     TODO: Doesn't recognize line breaks, and that is a problem.
     """
+    from spacy import displacy
+
     a.doc.spans['custom'] = [
         Span(a.doc, e.start, e.end, "LAW ENFORCEMENT") for e in a.ner_doc.ents
     ] + [
@@ -0,0 +1,169 @@
+"""
+Compact, serializable attribution results.
+
+An Attributor keeps coref_doc (with its transformer tensors), doc and ner_doc alive, and its quotes, clusters and ents are spaCy objects pointing into them. AttributionResult keeps only what the results are made of -- the text, character offsets and labels -- so it's small, pickles fast, round-trips through JSON and can be shipped between processes.
+"""
+import json
+from collections import namedtuple
+from typing import Iterable, List, Optional, Union
+from spacy.tokens import Span, Token
+from .constants import QuoteEntMatch, QuoteClusterMatch
+
+TextSpan: tuple[int, int, str, str] = namedtuple(
+    "TextSpan",
+    ["start", "end", "text", "label"],
+    defaults=("",)
+)
+
+QuoteSpans: tuple[tuple, tuple, TextSpan] = namedtuple(
+    "QuoteSpans",
+    ["speaker", "cue", "content"]
+)
+
+def text_span(t: Union[Span, Token], label: str="") -> TextSpan:
+    """
+    Character offsets and text of a span or token.
+    """
+    if isinstance(t, Token):
+        return TextSpan(t.idx, t.idx + len(t), t.text, label)
+    return TextSpan(t.start_char, t.end_char, t.text, label)
+
+class AttributionResult:
+    """
+    Quotes, clusters, ents and matches of one article, as plain data.
+
+    Quotes keep the same shape as DQTriple (speaker and cue are tuples of tokens, content is a span), clusters are still keyed by cluster index and the match lists are the same namedtuples, so evaluate and anything else that only reads those works on a result like it does on an Attributor. Cluster members are labelled with the POS of their first token, so pronouns can still be told apart.
+    """
+    __slots__ = ["text", "label", "quotes", "clusters", "persons", "ents", "ent_matches", "quote_matches"]
+
+    def __init__(
+            self,
+            text: str,
+            quotes: List[QuoteSpans],
+            clusters: dict,
+            persons: List[TextSpan],
+            ents: Optional[List[TextSpan]],
+            ent_matches: List[QuoteEntMatch],
+            quote_matches: List[QuoteClusterMatch],
+            label: str=None
+            ):
+        """
+        Input:
+            text (str) - text of the doc the offsets refer to
+            quotes (list of QuoteSpans) - speaker, cue and content of each quote
+            clusters (dict) - cluster index -> tuple of TextSpans
+            persons (list of TextSpan) - PERSON ents
+            ents (list of TextSpan) - NER ents (None if not NER)
+            ent_matches, quote_matches - same as on the Attributor
+            label (str) - name of the doc, ie doc_id
+        """
+        self.text = text
+        self.label = label
+        self.quotes = quotes
+        self.clusters = clusters
+        self.persons = persons
+        self.ents = ents
+        self.ent_matches = ent_matches
+        self.quote_matches = quote_matches
+
+    @classmethod
+    def from_attributor(cls, a, label: str=None) -> "AttributionResult":
+        """
+        Copies the results out of an Attributor that has run attribute (or load_docs and get_matches).
+        """
+        return cls(
+            text=a.doc.text,
+            quotes=[
+                QuoteSpans(
+                    tuple(text_span(t) for t in q.speaker),
+                    tuple(text_span(t) for t in q.cue),
+                    text_span(q.content)
+                    )
+                for q in a.quotes
+                ],
+            clusters={
+                n: tuple(text_span(span, span[0].pos_) for span in cluster)
+                for n, cluster in a.clusters.items()
+                },
+            persons=[text_span(e, e.label_) for e in a.persons],
+            ents=[text_span(e, e.label_) for e in a.ents] if a.ner else None,
+            ent_matches=list(a.ent_matches),
+            quote_matches=list(a.quote_matches),
+            label=label
+        )
+
+    @property
+    def ner(self) -> bool:
+        return self.ents is not None
+
+    @property
+    def reduce_ent_matches(self) -> list:
+        return sorted(
+            list(set([(m.quote_index, m.ent_index) for m in self.ent_matches])),
+            key=lambda m: m[0]
+            )
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __setstate__(self, state: tuple):
+        for k, v in zip(self.__slots__, state):
+            setattr(self, k, v)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AttributionResult) and self.__getstate__() == other.__getstate__()
+
+    def __repr__(self) -> str:
+        return (
+            f"AttributionResult(label={self.label!r}, quotes={len(self.quotes)}, clusters={len(self.clusters)}, "
+            f"ents={len(self.ents) if self.ner else None}, ent_matches={len(self.ent_matches)})"
+        )
+
+    def to_dict(self) -> dict:
+        """
+        JSON-friendly version. Spans are [start, end, text, label] lists and matches are lists of their fields.
+        """
+        return {
+            "label": self.label,
+            "text": self.text,
+            "quotes": [[list(map(list, q.speaker)), list(map(list, q.cue)), list(q.content)] for q in self.quotes],
+            "clusters": [[n, list(map(list, cluster))] for n, cluster in self.clusters.items()],
+            "persons": list(map(list, self.persons)),
+            "ents": list(map(list, self.ents)) if self.ner else None,
+            "ent_matches": list(map(list, self.ent_matches)),
+            "quote_matches": list(map(list, self.quote_matches))
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AttributionResult":
+        spans = lambda ss: tuple(TextSpan(*s) for s in ss)
+        return cls(
+            text=d["text"],
+            quotes=[QuoteSpans(spans(speaker), spans(cue), TextSpan(*content)) for speaker, cue, content in d["quotes"]],
+            clusters={n: spans(cluster) for n, cluster in d["clusters"]},
+            persons=list(spans(d["persons"])),
+            ents=list(spans(d["ents"])) if d["ents"] is not None else None,
+            ent_matches=[QuoteEntMatch(*m) for m in d["ent_matches"]],
+            quote_matches=[QuoteClusterMatch(*m) for m in d["quote_matches"]],
+            label=d["label"]
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, s: str) -> "AttributionResult":
+        return cls.from_dict(json.loads(s))
+
+def results_to_jsonl(results: Iterable[AttributionResult], path: str):
+    """
+    Writes results one JSON object per line.
+    """
+    with open(path, "w") as f:
+        for result in results:
+            f.write(result.to_json() + "\n")
+
+def results_from_jsonl(path: str) -> Iterable[AttributionResult]:
+    with open(path) as f:
+        for line in f:
+            yield AttributionResult.from_json(line)
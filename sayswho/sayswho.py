@@ -2,24 +2,48 @@
 Rewritten with less overhead.
 """
 import spacy
-from typing import Union, Iterable
-from rapidfuzz import fuzz
+import copy
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice, repeat, tee
+from typing import Optional, Union, Iterable, Iterator
 import numpy as np
+from spacy.tokens import Doc
+from spacy.language import Language
 from .attribution_helpers import (
-    span_contains, 
-    compare_spans, 
+    get_boundary_array,
+    containment_pairs,
+    compare_spans_matrix,
+    text_score_matrix,
+    make_relation,
+    compose_relations,
+    transpose_relation,
+    relation_pairs,
     format_cluster, 
     compare_quote_to_cluster_member,
     pronoun_check,
     filter_duplicate_ents,
     prune_cluster_people,
     clone_cluster,
+    copy_tokenization,
+    pipe_components,
+    coref_windows,
+    window_clusters,
+    merge_clusters,
+    set_clusters,
     get_manual_speaker_cluster
     )
-from .quotes import direct_quotations
-from .quote_class import Quoter
+from .doc_cache import DocCache, model_fingerprint
+from .profiling import Profiler
+from .result import AttributionResult
+from .batching import TokenBudgetBatcher
+from .quotes import direct_quotations, has_attributable_quotes
 from .quote_helpers import DQTriple
-from .constants import ent_like_words, ner_nlp, ent_like_words, QuoteEntMatch, QuoteClusterMatch, EvalResults
+from .constants import (
+    ent_like_words, ner_nlp, cluster_ent_fuzz_cutoff, QuoteEntMatch, QuoteClusterMatch, EvalResults
+    )
 
 class Attributor:
     """
@@ -32,15 +56,148 @@ class Attributor:
             base_nlp: str="en_core_web_lg",
             ner_nlp: str=ner_nlp,
             prune: bool=True,
-            exp: bool=False
+            exp: bool=False,
+            shared_doc: bool=False,
+            lazy: bool=True,
+            parallel_load: bool=False,
+            cache: Union[DocCache, str]=None,
+            fuzz_cutoff: float=cluster_ent_fuzz_cutoff,
+            fuzz_workers: int=1,
+            profile: Union[bool, Profiler]=False,
+            lean: bool=False,
+            prescreen: bool=False,
+            coref_chunk_tokens: int=None,
+            coref_overlap: int=1,
+            coref_batch_tokens: int=None
             ):
-        self.coref_nlp = spacy.load(coref_nlp)
-        self.base_nlp = spacy.load(base_nlp)
-        if ner_nlp:
-            self.ner_nlp = spacy.load(ner_nlp)
-            self.ner_nlp.add_pipe("sentencizer")
+        """
+        Input:
+            coref_nlp, base_nlp, ner_nlp (str) - names or paths of the spacy models to load
+            prune (bool) - whether to remove outlier PERSONS from coref clusters
+            exp (bool) - experimental flag, passed to direct_quotations
+            shared_doc (bool) - tokenize and parse each text once, then run the coref components on the base doc (see parse_shared)
+            lazy (bool) - load each model the first time it is used, instead of right away
+            parallel_load (bool) - if not lazy, load the models in parallel threads (see load_models)
+            cache (DocCache or str) - cache of parsed docs (or a directory to keep one in). Cache hits skip every model call.
+            fuzz_cutoff (float) - cluster members match an ent if their partial ratio is above this
+            fuzz_workers (int) - number of threads for batched fuzzy matching (-1 for all cores)
+            profile (bool or Profiler) - record per-stage timings, memory and size counters for every doc (see profiling.py)
+            lean (bool) - after each doc, keep only an AttributionResult (self.result) and drop the docs, quotes and clusters
+            prescreen (bool) - tokenize each text with a blank pipeline first, and skip the models entirely if it can't have an attributable quote (see screen)
+            coref_chunk_tokens (int) - run coref in paragraph-aligned windows of at most this many tokens on longer articles, and merge the clusters (see parse_coref). None runs coref on the whole article.
+            coref_overlap (int) - number of paragraphs consecutive coref windows share
+            coref_batch_tokens (int) - in attribute_many, batch texts for coref_nlp by length and a padded token budget of this size instead of batch_size docs (see batching.py). None uses plain nlp.pipe batches.
+        """
+        if coref_chunk_tokens and shared_doc:
+            raise ValueError("chunked coref (coref_chunk_tokens) doesn't work with shared_doc")
+        self.model_names = {
+            "coref_nlp": coref_nlp,
+            "base_nlp": base_nlp,
+            "ner_nlp": ner_nlp
+        }
+        self.models = {}
+        self._fingerprints = {}
         self.prune = prune
         self.exp = exp
+        self.shared_doc = shared_doc
+        self.fuzz_cutoff = fuzz_cutoff
+        self.fuzz_workers = fuzz_workers
+        self.cache = DocCache(cache) if isinstance(cache, str) else cache
+        self.profiler = Profiler() if profile is True else (profile or None)
+        self.lean = lean
+        self.result = None
+        self.prescreen = prescreen
+        self.prescreened = False
+        self._prescreen_nlp = None
+        self.parse_stats = {"screened": 0, "skipped": 0, "screen_seconds": 0.0, "parsed": 0, "parse_seconds": 0.0}
+        self.coref_chunk_tokens = coref_chunk_tokens
+        self.coref_overlap = coref_overlap
+        self.coref_batcher = TokenBudgetBatcher(coref_batch_tokens) if coref_batch_tokens else None
+        if not lazy:
+            self.load_models(parallel=parallel_load)
+
+    def stage(self, name: str):
+        """
+        Context manager timing a stage of the current doc, if profiling. Otherwise does nothing.
+        """
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def count(self, **counts):
+        if self.profiler is not None:
+            self.profiler.count(**counts)
+
+    def load_model(self, key: str) -> Language:
+        """
+        Returns the model for key ("coref_nlp", "base_nlp" or "ner_nlp"), loading it if it hasn't been loaded yet.
+        """
+        if key not in self.models:
+            nlp = spacy.load(self.model_names[key])
+            if key == "ner_nlp":
+                nlp.add_pipe("sentencizer")
+            self.models[key] = nlp
+        return self.models[key]
+
+    def load_models(self, parallel: bool=False):
+        """
+        Loads every model that hasn't been loaded yet.
+
+        Input:
+            parallel (bool) - load the models in separate threads (most of the work is file IO and torch/numpy deserialization, which release the GIL)
+        """
+        keys = [k for k in ["coref_nlp", "base_nlp", "ner_nlp"] if k not in self.models and self.model_names[k]]
+        if parallel and len(keys) > 1:
+            with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+                list(executor.map(self.load_model, keys))
+        else:
+            for k in keys:
+                self.load_model(k)
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Cache key component identifying the models (and parse mode) that produced a set of docs.
+        """
+        # chunked coref changes the clusters, so it gets its own entries (unchunked ones keep their old key)
+        mode = (self.shared_doc,) + ((self.coref_chunk_tokens, self.coref_overlap) if self.coref_chunk_tokens else ())
+        if mode not in self._fingerprints:
+            self._fingerprints[mode] = model_fingerprint(
+                [self.model_names[k] for k in ["coref_nlp", "base_nlp", "ner_nlp"]],
+                *mode
+                )
+        return self._fingerprints[mode]
+
+    @property
+    def cache_vocab(self):
+        """
+        Vocab to deserialize cached docs into: base_nlp's if it's loaded, otherwise the cache's own (so a hit doesn't force a model load).
+        """
+        return self.models["base_nlp"].vocab if "base_nlp" in self.models else None
+
+    @property
+    def coref_nlp(self) -> Language:
+        return self.load_model("coref_nlp")
+
+    @coref_nlp.setter
+    def coref_nlp(self, nlp: Language):
+        self.models["coref_nlp"] = nlp
+
+    @property
+    def base_nlp(self) -> Language:
+        return self.load_model("base_nlp")
+
+    @base_nlp.setter
+    def base_nlp(self, nlp: Language):
+        self.models["base_nlp"] = nlp
+
+    @property
+    def ner_nlp(self) -> Language:
+        return self.load_model("ner_nlp")
+
+    @ner_nlp.setter
+    def ner_nlp(self, nlp: Language):
+        self.models["ner_nlp"] = nlp
 
     @property
     def ner(self):
@@ -50,7 +207,7 @@ class Attributor:
         Output:
             bool
         """
-        return 'ner_nlp' in self.__dict__
+        return bool(self.model_names.get("ner_nlp")) or "ner_nlp" in self.models
     
     @property
     def ents(self):
@@ -86,7 +243,7 @@ class Attributor:
         else:
             expando(match)        
         
-    def attribute(self, t: str):
+    def attribute(self, t: str, label: str=None):
         """
         Top level function. Parses text, matches quotes to clusters and gets ent matches.
 
@@ -94,9 +251,194 @@ class Attributor:
 
         Input:
             t (str) - text file to be analyzed and attributed
+            label (str) - name of the doc (ie doc_id), for the profiler and the result
         """
+        if self.profiler is not None:
+            self.profiler.start_doc(label)
         self.parse_text(t)
         self.get_matches()
+        if self.lean:
+            self.result = self.to_result(label)
+            self.drop_docs()
+
+    def attribute_many(
+            self,
+            texts: Iterable[str],
+            batch_size: int=8,
+            n_process: int=1
+            ) -> Iterator[Union["Attributor", AttributionResult]]:
+        """
+        Batched version of attribute. Streams texts through coref_nlp, base_nlp and ner_nlp with nlp.pipe, then matches quotes to clusters and gets ent matches for each article.
+
+        Each result is a shallow copy of the Attributor holding the docs, quotes, clusters and matches of one article, so it can go straight into evaluate, render_new etc. The models themselves are shared, not copied.
+
+        If lean, yields an AttributionResult per text instead, and no docs are kept.
+
+        If profiling, docs are labelled by their position in texts. Model time is recorded as a "pipe" stage: the time spent waiting on the batched pipeline for each doc, so it's amortized rather than exact.
+
+        Input:
+            texts (iterable of str) - formatted texts of articles
+            batch_size (int) - number of texts per nlp.pipe batch
+            n_process (int) - number of processes per nlp.pipe
+
+        Output:
+            Attributor (or AttributionResult, if lean) - one per text, in the same order as texts
+        """
+        parsed = self.parse_many(texts, batch_size, n_process)
+        while True:
+            if self.profiler is not None:
+                self.profiler.start_doc()
+            with self.stage("pipe"):
+                docs = next(parsed, None)
+            if docs is None:
+                if self.profiler is not None:
+                    self.profiler.docs.pop()
+                    self.profiler.current = None
+                return
+            self.load_docs(*docs)
+            self.get_matches()
+            if self.lean:
+                self.result = self.to_result()
+                self.drop_docs()
+                yield self.result
+            else:
+                yield copy.copy(self)
+
+    def parse_many(
+            self,
+            texts: Iterable[str],
+            batch_size: int=8,
+            n_process: int=1
+            ) -> Iterator[tuple]:
+        """
+        Batched version of parse_docs.
+
+        Without a cache, texts are streamed straight through nlp.pipe. With a cache, texts are read in chunks; hits come from the cache and only the misses of each chunk are piped through the models.
+
+        Output:
+            (coref_doc, doc, ner_doc) tuples, in the same order as texts
+        """
+        if self.cache is None and not self.prescreen:
+            yield from self.pipe_docs(texts, batch_size, n_process)
+            return
+
+        texts = iter(texts)
+        chunk_size = batch_size * max(n_process, 1) * 4
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                return
+            parsed, skipped = [], []
+            for t in chunk:
+                parsed.append(self.screen_or_cache(t))
+                skipped.append(self.prescreened)
+            misses = [t for t, docs in zip(chunk, parsed) if docs is None]
+            piped = self.pipe_docs(misses, batch_size, n_process)
+            for t, docs, prescreened in zip(chunk, parsed, skipped):
+                self.prescreened = prescreened
+                if docs is None:
+                    start = time.perf_counter()
+                    docs = next(piped)
+                    self.parse_stats["parsed"] += 1
+                    self.parse_stats["parse_seconds"] += time.perf_counter() - start
+                    if self.cache is not None:
+                        self.cache.put(t, self.fingerprint, *docs)
+                yield docs
+
+    @property
+    def prescreen_nlp(self) -> Language:
+        """
+        Blank English pipeline for screen: the tokenizer, plus a sentencizer so skipped docs still have sentence boundaries.
+        """
+        if self._prescreen_nlp is None:
+            self._prescreen_nlp = spacy.blank("en")
+            self._prescreen_nlp.add_pipe("sentencizer")
+        return self._prescreen_nlp
+
+    def screen(self, t: str) -> Optional[tuple]:
+        """
+        Pre-screen: tokenizes t without any models and checks whether direct_quotations could find a quote in it (see has_attributable_quotes).
+
+        Output:
+            None if t has to be parsed, otherwise (doc, doc, ner_doc) made from the tokenized doc -- no quotes, clusters or ents, so the rest of the pipeline returns an empty result for it
+        """
+        start = time.perf_counter()
+        with self.stage("prescreen"):
+            doc = self.prescreen_nlp.make_doc(t)
+            keep = has_attributable_quotes(doc)
+            if not keep:
+                doc = self.prescreen_nlp.get_pipe("sentencizer")(doc)
+        self.parse_stats["screened"] += 1
+        self.parse_stats["screen_seconds"] += time.perf_counter() - start
+        self.prescreened = not keep
+        if keep:
+            return None
+        self.parse_stats["skipped"] += 1
+        self.count(prescreen_skipped=1)
+        return doc, doc, doc if self.ner else None
+
+    def screen_or_cache(self, t: str) -> Optional[tuple]:
+        """
+        Parsed docs for t without running the models (from the pre-screen or the cache), or None.
+        """
+        if self.prescreen:
+            docs = self.screen(t)
+            if docs is not None:
+                return docs
+        if self.cache is not None:
+            return self.cache.get(t, self.fingerprint, self.cache_vocab)
+        return None
+
+    def prescreen_report(self) -> dict:
+        """
+        How many texts the pre-screen skipped, and roughly how much model time that saved (skipped texts times the average parse time of the texts that did get parsed, minus the time spent screening).
+        """
+        stats = self.parse_stats
+        average_parse = stats["parse_seconds"] / stats["parsed"] if stats["parsed"] else None
+        return {
+            **stats,
+            "skip_rate": stats["skipped"] / stats["screened"] if stats["screened"] else 0.0,
+            "estimated_seconds_saved": (
+                stats["skipped"] * average_parse - stats["screen_seconds"] if average_parse is not None else None
+            )
+        }
+
+    def pipe_docs(
+            self,
+            texts: Iterable[str],
+            batch_size: int=8,
+            n_process: int=1
+            ) -> Iterator[tuple]:
+        """
+        Streams texts through the models with nlp.pipe.
+
+        Output:
+            (coref_doc, doc, ner_doc) tuples, in the same order as texts (ner_doc is None if not NER)
+        """
+        if self.shared_doc:
+            docs = pipe_components(
+                self.coref_nlp,
+                self.base_nlp.pipe(texts, batch_size=batch_size, n_process=n_process),
+                batch_size=batch_size
+                )
+            docs = tee(docs, 3 if self.ner else 2)
+            coref_docs = docs[0]
+            if self.ner:
+                ner_docs = pipe_components(
+                    self.ner_nlp,
+                    (copy_tokenization(doc, self.ner_nlp.vocab) for doc in docs[2]),
+                    batch_size=batch_size
+                    )
+            docs = docs[1]
+        else:
+            texts = tee(texts, 3 if self.ner else 2)
+            coref_docs = self.pipe_coref(texts[0], batch_size=batch_size, n_process=n_process)
+            docs = self.base_nlp.pipe(texts[1], batch_size=batch_size, n_process=n_process)
+            if self.ner:
+                ner_docs = self.ner_nlp.pipe(texts[2], batch_size=batch_size, n_process=n_process)
+        if not self.ner:
+            ner_docs = repeat(None)
+        return zip(coref_docs, docs, ner_docs)
 
     def parse_text(self, t: str):
         """ 
@@ -113,37 +455,210 @@ class Attributor:
             self.persons - list of PERSON entities
             self.ner_doc - spacy doc with NER matches
         """
+        self.load_docs(*self.parse_docs(t))
+        return
+
+    def parse_docs(self, t: str) -> tuple:
+        """
+        Runs the models on t, or fetches the parsed docs from the cache (if there is one). If prescreen, texts that can't have attributable quotes skip both (see screen).
+
+        Input:
+            t (str) - formatted text of an article
+
+        Output:
+            coref_doc, doc, ner_doc - ner_doc is None if not NER
+        """
+        if self.prescreen:
+            docs = self.screen(t)
+            if docs is not None:
+                return docs
+
+        if self.cache is not None:
+            with self.stage("cache_get"):
+                docs = self.cache.get(t, self.fingerprint, self.cache_vocab)
+            if docs is not None:
+                self.count(cache_hits=1)
+                return docs
+
         # instantiate spacy doc
-        self.coref_doc = self.coref_nlp(t)
-        self.doc = self.base_nlp(t)
+        start = time.perf_counter()
+        if self.shared_doc:
+            docs = self.parse_shared(t)
+        else:
+            with self.stage("coref"):
+                coref_doc = self.parse_coref(t)
+            with self.stage("base"):
+                doc = self.base_nlp(t)
+            with self.stage("ner"):
+                ner_doc = self.ner_nlp(t) if self.ner else None
+            docs = (coref_doc, doc, ner_doc)
+        self.parse_stats["parsed"] += 1
+        self.parse_stats["parse_seconds"] += time.perf_counter() - start
+        if self.cache is not None:
+            with self.stage("cache_put"):
+                self.cache.put(t, self.fingerprint, *docs)
+        return docs
+
+    def parse_coref(self, t: str) -> Doc:
+        """
+        Runs coref_nlp on t. If coref_chunk_tokens is set and t is longer than that, coref runs on overlapping paragraph-aligned windows instead (see coref_windows), one at a time, so its cost and memory are bounded by the window size rather than the article length. The clusters of the windows are merged through the mentions they share in the overlaps and put on a doc tokenized like the whole article.
+
+        Coreference across windows that don't overlap is only caught if it is chained through the overlaps, so long articles can end up with a few more, smaller clusters than a whole-article run.
+
+        Input:
+            t (str) - formatted text of an article
+
+        Output:
+            coref_doc (Doc) - doc with coref_clusters_* span groups
+        """
+        if not self.coref_chunk_tokens:
+            return self.coref_nlp(t)
+        doc = self.coref_nlp.make_doc(t)
+        if len(doc) <= self.coref_chunk_tokens:
+            return self.coref_nlp(doc)
+        windows = coref_windows(doc, self.coref_chunk_tokens, self.coref_overlap)
+        clusters = []
+        for start, end in windows:
+            clusters.extend(window_clusters(self.coref_nlp(t[start:end]), start))
+        self.count(coref_windows=len(windows))
+        return set_clusters(doc, merge_clusters(clusters))
+
+    def pipe_coref(self, texts: Iterable[str], batch_size: int=8, n_process: int=1) -> Iterator[Doc]:
+        """
+        Batched version of parse_coref. Every text is split into its windows (short texts are one window), all windows are streamed through coref_nlp.pipe, and each text's clusters are merged once its last window comes back.
+        """
+        if not self.coref_chunk_tokens:
+            yield from self.pipe_coref_batches(texts, batch_size, n_process)
+            return
+
+        pending = deque()
+        def window_texts():
+            for t in texts:
+                doc = self.coref_nlp.make_doc(t)
+                windows = coref_windows(doc, self.coref_chunk_tokens, self.coref_overlap) if len(doc) > self.coref_chunk_tokens else [(0, len(t))]
+                pending.append((doc, windows))
+                for start, end in windows:
+                    yield t[start:end]
+
+        window_docs = self.pipe_coref_batches(window_texts(), batch_size, n_process)
+        for first in window_docs:
+            doc, windows = pending.popleft()
+            if len(windows) == 1:
+                yield first
+                continue
+            clusters = window_clusters(first, windows[0][0])
+            for start, _ in windows[1:]:
+                clusters.extend(window_clusters(next(window_docs), start))
+            yield set_clusters(doc, merge_clusters(clusters))
+
+    def pipe_coref_batches(self, texts: Iterable[str], batch_size: int=8, n_process: int=1) -> Iterator[Doc]:
+        """
+        Streams texts through coref_nlp, in token-budget batches if there's a coref_batcher (which runs in this process, so it's skipped when n_process > 1).
+        """
+        if self.coref_batcher is None or n_process > 1:
+            return self.coref_nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        return self.coref_batcher.pipe(self.coref_nlp, texts)
+
+    def coref_batch_report(self) -> Optional[dict]:
+        """
+        Tokens per second and padding efficiency of the coref batches so far (see TokenBudgetBatcher.report), or None without a coref_batcher.
+        """
+        return self.coref_batcher.report() if self.coref_batcher is not None else None
+
+    def parse_shared(self, t: str) -> tuple:
+        """
+        "Shared doc" parsing. Tokenizes and parses t once with base_nlp, then runs the coref components on that same doc, so the coref clusters land on the base doc and don't need cloning.
+
+        The NER model gets its own doc (because its ents would overwrite the base PERSONS), but it is built from the base tokenization instead of being re-tokenized.
+
+        Input:
+            t (str) - formatted text of an article
+
+        Output:
+            coref_doc, doc, ner_doc - coref_doc is doc; ner_doc is None if not NER
+        """
+        with self.stage("base"):
+            doc = self.base_nlp(t)
+        with self.stage("coref"):
+            doc = next(pipe_components(self.coref_nlp, [doc]))
+        ner_doc = None
+        if self.ner:
+            with self.stage("ner"):
+                ner_doc = next(pipe_components(self.ner_nlp, [copy_tokenization(doc, self.ner_nlp.vocab)]))
+        return doc, doc, ner_doc
+
+    def load_docs(self, coref_doc: Doc, doc: Doc, ner_doc: Doc=None):
+        """
+        Extracts quotes, clusters and PERSONS from already-parsed docs. Shared by parse_text and attribute_many.
+
+        Input:
+            coref_doc (Doc) - doc parsed by coref_nlp
+            doc (Doc) - doc parsed by base_nlp
+            ner_doc (Doc) - doc parsed by ner_nlp (or None, if not NER)
+        """
+        self.coref_doc = coref_doc
+        self.doc = doc
 
         # extract quotations
-        self.quotes = [q for q in direct_quotations(self.doc, self.exp)]
-
-        # extract coref clusters and clone to doc
-        self.clusters = {
-            int(k.split("_")[-1])-1: clone_cluster(cluster, self.doc) 
-            for k, cluster in self.coref_doc.spans.items() 
-            if k.startswith("coref")
-            }
-        if self.prune:
-            self.clusters = {n:prune_cluster_people(cluster) for n, cluster in self.clusters.items()}
+        with self.stage("direct_quotations"):
+            self.quotes = [q for q in direct_quotations(self.doc, self.exp)]
+
+        # extract coref clusters and clone to doc (unless they are already on it)
+        with self.stage("clusters"):
+            self.clusters = {
+                int(k.split("_")[-1])-1: cluster if self.coref_doc is self.doc else clone_cluster(cluster, self.doc)
+                for k, cluster in self.coref_doc.spans.items() 
+                if k.startswith("coref")
+                }
+            if self.prune:
+                self.clusters = {
+                    n:prune_cluster_people(cluster, workers=self.fuzz_workers) for n, cluster in self.clusters.items()
+                    }
         
         self.persons = [e for e in self.doc.ents if e.label_=="PERSON"]
 
         if self.ner:
-            self.ner_doc = self.ner_nlp(t)
+            self.ner_doc = ner_doc
             self.ner_doc.ents = filter_duplicate_ents(self.ner_doc.ents)
+
+        self.count(
+            tokens=len(self.doc),
+            quotes=len(self.quotes),
+            clusters=len(self.clusters),
+            cluster_spans=sum(len(cluster) for cluster in self.clusters.values()),
+            persons=len(self.persons),
+            ents=len(self.ner_doc.ents) if self.ner else 0
+        )
         return
     
+    def to_result(self, label: str=None) -> AttributionResult:
+        """
+        Copies the quotes, clusters, ents and matches of the current doc into a compact AttributionResult.
+        """
+        return AttributionResult.from_attributor(self, label)
+
+    def drop_docs(self):
+        """
+        Lets go of the parsed docs and everything pointing into them (quotes, clusters, persons), so the memory can be freed before the next doc.
+        """
+        for k in ["coref_doc", "doc", "ner_doc", "quotes", "clusters", "persons"]:
+            self.__dict__.pop(k, None)
+
     def get_matches(self):
         """
         Makes all "pair" lists, then runs quick_ent_analyzer to get ent_matches.
 
         This exists because I wanted a step between macro_ent_finder and the results for easier testing.
         """
-        pairs_dicto = self.macro_ent_finder()
-        self.make_matches(pairs_dicto)
+        with self.stage("macro_ent_finder"):
+            pairs_dicto = self.macro_ent_finder()
+        with self.stage("make_matches"):
+            self.make_matches(pairs_dicto)
+        self.count(
+            pairs_found=sum(len(v) for v in pairs_dicto.values()),
+            ent_matches=len(self.ent_matches),
+            quote_matches=len(self.quote_matches)
+        )
         
     def get_manual_quote_ent_pairs(self) -> list:
         return [
@@ -167,79 +682,85 @@ class Attributor:
         Messy but lite ent finder. Easier than keeping track of all the ways to match ent and cluster.
 
         TODO: Ensure pronouns aren't being skipped!
-        TODO: Make ratio threshold a variable
         """
         pairs_dicto = {p:[] for p in [
             'quotes_persons', 'quotes_ents', 'quotes_clusters', 
             'clusters_ents', 'clusters_persons', 'persons_ents'
             ]}
 
+        # start/end characters of everything, so containment is checked for all pairs at once
+        ents = list(self.ents) if self.ner else []
+        cluster_spans = [
+            (cluster_index, span)
+            for cluster_index, cluster in self.clusters.items()
+            for span in cluster
+            if not pronoun_check(span)
+            ]
+        quote_bounds = get_boundary_array(self.quotes)
+        person_bounds = get_boundary_array(self.persons)
+        ent_bounds = get_boundary_array(ents)
+        span_bounds = get_boundary_array([span for _, span in cluster_spans])
+
+        pairs_dicto['quotes_ents'] = containment_pairs(quote_bounds, ent_bounds)
+        pairs_dicto['quotes_persons'] = containment_pairs(quote_bounds, person_bounds)
+        pairs_dicto['clusters_persons'] = [
+            (cluster_spans[span_index][0], person_index)
+            for span_index, person_index in containment_pairs(span_bounds, person_bounds)
+            ]
+        pairs_dicto['persons_ents'] = containment_pairs(person_bounds, ent_bounds)
+
         for quote_index, quote in enumerate(self.quotes):
-            if self.ner:
-                pairs_dicto['quotes_ents'] += [
-                        (quote_index, ent_index)
-                        for ent_index, ent in enumerate(self.ents)
-                        if span_contains(quote, ent)
-                        ]
-            pairs_dicto['quotes_persons'] += [
-                    (quote_index, person_index)
-                    for person_index, person in enumerate(self.persons)
-                    if span_contains(quote, person)
-                    ]
             pairs_dicto['quotes_clusters'] += [
                     (quote_index, cluster_index) 
                     for cluster_index, cluster in self.clusters.items()
                     for span in cluster
                     if compare_quote_to_cluster_member(quote, span)
                     ]
-                        
-        for cluster_index, cluster in self.clusters.items():
-            for span in cluster:
-                if not pronoun_check(span):
-                    if self.ner:
-                        pairs_dicto['clusters_ents'] += [
-                            (cluster_index, ent_index)
-                            for ent_index, ent in enumerate(self.ents)
-                            if compare_spans(span, ent) 
-                            or fuzz.partial_ratio(span.text, ent.text) > 95
-                            ]
-                    pairs_dicto['clusters_persons'] += [
-                        (cluster_index, person_index)
-                        for person_index, person in enumerate(self.persons)
-                        if span_contains(person, span)
-                        ]
-        pairs_dicto['persons_ents'] += [
-            (person_index, ent_index)
-            for person_index, p in enumerate(self.persons)
-            for ent_index, ent in enumerate(self.ents)
-            if span_contains(p, ent)
+
+        cluster_ent_matrix = compare_spans_matrix(
+            [span for _, span in cluster_spans], ents
+            ) | (
+            text_score_matrix(
+                [span.text for _, span in cluster_spans],
+                [ent.text for ent in ents],
+                score_cutoff=self.fuzz_cutoff,
+                workers=self.fuzz_workers
+            ) > self.fuzz_cutoff
+            )
+        pairs_dicto['clusters_ents'] = [
+            (cluster_spans[span_index][0], ent_index)
+            for span_index, ent_index in np.argwhere(cluster_ent_matrix).tolist()
             ]
         
         pairs_dicto['quotes_clusters'] += self.get_manual_quote_cluster_pairs(pairs_dicto['quotes_clusters'])
+
+        n_quotes, n_persons, n_ents, n_spans = len(self.quotes), len(self.persons), len(ents), len(cluster_spans)
+        self.count(candidate_pairs=(
+            n_quotes * (n_ents + n_persons + sum(len(cluster) for cluster in self.clusters.values()))
+            + n_spans * (n_persons + n_ents)
+            + n_persons * n_ents
+        ))
         return pairs_dicto
     
-    def make_matrix(self, key, pairs):
-        x, y = key.split("_")
-        m = np.zeros([len(self.__getattribute__(_)) for _ in [x,y]])
-        for i,j in pairs:
-            m[i,j] = 1
-        return m
-    
     def make_matches(self, pairs_dicto: dict):
-        arrays = {k: self.make_matrix(k, v) for k,v in pairs_dicto.items()}
+        """
+        Turns the pair lists from macro_ent_finder into ent_matches and quote_matches, by joining the relations (quotes -> clusters -> persons -> ents etc).
+
+        Relations are kept as adjacency lists (see make_relation) rather than dense matrices, since almost every quote/ent/person/cluster pair is unrelated.
+        """
+        relations = {k: make_relation(v) for k,v in pairs_dicto.items()}
 
         self.ent_matches = [
-            QuoteEntMatch(quote_index=i, ent_index=j) for i,j in np.concatenate(
-                [
-                    np.transpose(np.nonzero(arrays['quotes_ents'])),
-                    np.transpose(np.nonzero(arrays['quotes_clusters'].dot(arrays['clusters_ents']))),
-                    np.transpose(np.nonzero(arrays['quotes_persons'].dot(arrays['persons_ents']))),
-                    np.transpose(
-                        np.nonzero(
-                            arrays['quotes_clusters'].dot(arrays['clusters_persons'].dot(arrays['persons_ents']))
-                        )
+            QuoteEntMatch(quote_index=i, ent_index=j) for i,j in chain(
+                relation_pairs(relations['quotes_ents']),
+                relation_pairs(compose_relations(relations['quotes_clusters'], relations['clusters_ents'])),
+                relation_pairs(compose_relations(relations['quotes_persons'], relations['persons_ents'])),
+                relation_pairs(
+                    compose_relations(
+                        relations['quotes_clusters'], 
+                        compose_relations(relations['clusters_persons'], relations['persons_ents'])
                     )
-                ]
+                )
             )]
         
         self.ent_matches = sorted(
@@ -249,9 +770,11 @@ class Attributor:
 
         self.quote_matches = sorted(
             list(set([
-            QuoteClusterMatch(i, j) for i,j in np.concatenate(
-                (np.transpose(np.nonzero(arrays['quotes_persons'].dot(arrays['clusters_persons'].T))),
-                 np.transpose(np.nonzero(arrays['quotes_clusters'])))
+            QuoteClusterMatch(i, j) for i,j in chain(
+                relation_pairs(
+                    compose_relations(relations['quotes_persons'], transpose_relation(relations['clusters_persons']))
+                ),
+                relation_pairs(relations['quotes_clusters'])
             )])), key=lambda m: m.quote_index
         )
 
@@ -0,0 +1,353 @@
+"""
+Long-lived attribution service.
+
+    sayswho serve --port 8321 --workers 2
+    curl -s localhost:8321/attribute -d '{"doc_ids": ["5V1B-..."]}'
+
+Every script or notebook that makes its own Attributor waits for three models to load. The service loads them once per worker process and keeps them warm. Requests from any number of clients go into one queue. Each worker takes whatever has arrived within max_wait of the first queued item (up to max_batch items) and runs it through attribute_many as one nlp.pipe batch, so concurrent requests share model calls instead of queueing behind each other one by one.
+
+POST /attribute takes json with "texts" and/or "doc_ids" (or a single "text" / "doc_id") and returns {"results": [...]}, one AttributionResult.to_dict() (or {"error": ...}) per item, in order. GET /health returns the batching stats. The service listens on TCP, or on a Unix socket with --socket.
+"""
+import os
+import json
+import time
+import queue
+import threading
+import traceback
+import multiprocessing
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+def attribute_items(a, items: List[Tuple[str, str]], batch_size: int=8) -> List[dict]:
+    """
+    Attributes a batch of ("text", text) and ("doc_id", doc_id) items with a lean Attributor.
+
+    doc_ids are loaded and parsed first; a doc_id that fails to load gets an error without holding up the rest. The texts then go through attribute_many together. If the batch fails, its items are re-run one at a time, so one bad article only fails itself.
+
+    Output:
+        one dict per item: AttributionResult.to_dict(), or {"error": {...}}
+    """
+    from .article_helpers import load_doc, fast_parse
+
+    def error(e: Exception) -> dict:
+        return {"error": {"exception": type(e).__name__, "message": str(e)}}
+
+    out = [None] * len(items)
+    texts, labels, positions = [], [], []
+    for n, (kind, value) in enumerate(items):
+        if kind == "doc_id":
+            try:
+                value = fast_parse(load_doc(value), "\n")[0]
+            except Exception as e:
+                out[n] = error(e)
+                continue
+        texts.append(value)
+        labels.append(items[n][1] if kind == "doc_id" else None)
+        positions.append(n)
+
+    try:
+        results = list(a.attribute_many(texts, batch_size=batch_size))
+    except Exception:
+        results = []
+        for t, label in zip(texts, labels):
+            try:
+                a.attribute(t, label)
+                results.append(a.result)
+            except Exception as e:
+                results.append(error(e))
+    for n, label, result in zip(positions, labels, results):
+        if isinstance(result, dict):
+            out[n] = result
+        else:
+            result.label = label
+            out[n] = result.to_dict()
+    return out
+
+def _worker_main(conn, attributor_kwargs: dict, attributor_factory: Optional[Callable], batch_size: int):
+    """
+    Worker process loop: loads the models once, then attributes the batches it's sent until it gets None.
+    """
+    if attributor_factory is not None:
+        a = attributor_factory(**attributor_kwargs)
+    else:
+        from .sayswho import Attributor
+        a = Attributor(**attributor_kwargs)
+        a.load_models()
+    a.lean = True
+    conn.send("ready")
+    while True:
+        try:
+            items = conn.recv()
+        except EOFError:
+            return
+        if items is None:
+            return
+        conn.send(attribute_items(a, items, batch_size))
+
+class AttributorProcess:
+    """
+    A worker process with warm models. Calling it with a batch of items sends them over and returns the results.
+
+    If the process dies mid-batch, the call raises and a fresh process is started for the next one.
+    """
+    def __init__(self, attributor_kwargs: dict=None, attributor_factory: Callable=None, batch_size: int=8):
+        """
+        Input:
+            attributor_kwargs (dict) - passed to Attributor (lean is always on)
+            attributor_factory (callable) - builds the Attributor instead of Attributor(**attributor_kwargs) (ie with models already set); has to be picklable
+            batch_size (int) - nlp.pipe batch size for attribute_many
+        """
+        self.attributor_kwargs = attributor_kwargs or {}
+        self.attributor_factory = attributor_factory
+        self.batch_size = batch_size
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_conn, self.attributor_kwargs, self.attributor_factory, self.batch_size),
+            daemon=True
+            )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self):
+        """
+        Blocks until the models are loaded.
+        """
+        if not self.ready:
+            if self.conn.recv() != "ready":
+                raise RuntimeError("worker didn't start")
+            self.ready = True
+
+    def __call__(self, items: List[Tuple[str, str]]) -> List[dict]:
+        try:
+            self.wait_ready()
+            self.conn.send(items)
+            return self.conn.recv()
+        except (EOFError, OSError):
+            exitcode = self.process.exitcode
+            self.close()
+            self.start()
+            raise RuntimeError(f"worker exited with code {exitcode}")
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+class MicroBatcher:
+    """
+    Coalesces items from concurrent requests into small batches.
+
+    One thread per handler (ie per AttributorProcess) waits for the first item in the queue, keeps collecting until max_batch items or max_wait seconds after that first item, and passes the batch to its handler. Idle handlers pick up the next batch, so work spreads across them.
+    """
+    def __init__(self, handlers: List[Callable], max_batch: int=8, max_wait: float=0.02):
+        """
+        Input:
+            handlers (list of callable) - each takes a list of items and returns a list of results, in order
+            max_batch (int) - most items in a batch
+            max_wait (float) - seconds to wait for more items after the first one (the latency window)
+        """
+        self.handlers = handlers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.stats = {"items": 0, "batches": 0, "errors": 0, "batch_seconds": 0.0}
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._loop, args=(h,), daemon=True) for h in handlers]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def map(self, items: list, timeout: float=None) -> list:
+        """
+        Submits items and waits for all of their results.
+        """
+        futures = [self.submit(item) for item in items]
+        return [f.result(timeout) for f in futures]
+
+    def next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self, handler: Callable):
+        while True:
+            batch = self.next_batch()
+            stop = any(item is None for item, _ in batch)
+            batch = [(item, future) for item, future in batch if item is not None]
+            if not batch:
+                return
+            start = time.monotonic()
+            try:
+                results = handler([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+            with self._lock:
+                self.stats["items"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["batch_seconds"] += time.monotonic() - start
+            if stop:
+                return
+
+    def report(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["mean_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["queued"] = self.queue.qsize()
+        return stats
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put((None, None))
+
+def request_items(body: dict) -> List[Tuple[str, str]]:
+    """
+    Items of an /attribute request: its "text"/"texts" and "doc_id"/"doc_ids", in that order.
+    """
+    items = []
+    for key, kind in [("text", "text"), ("texts", "text"), ("doc_id", "doc_id"), ("doc_ids", "doc_id")]:
+        values = body.get(key)
+        if values is None:
+            continue
+        for value in ([values] if isinstance(values, str) else values):
+            if not isinstance(value, str):
+                raise ValueError(f"{key} has to be a string or a list of strings")
+            items.append((kind, value))
+    if not items:
+        raise ValueError("nothing to attribute: send text, texts, doc_id or doc_ids")
+    return items
+
+class AttributionHandler(BaseHTTPRequestHandler):
+    """
+    POST /attribute and GET /health, answered from the server's MicroBatcher.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.send_json(404, {"error": f"no such path: {self.path}"})
+        self.send_json(200, {"status": "ok", **self.server.batcher.report()})
+
+    def do_POST(self):
+        if self.path != "/attribute":
+            return self.send_json(404, {"error": f"no such path: {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            items = request_items(json.loads(self.rfile.read(length) or b"{}"))
+        except (ValueError, AttributeError) as e:
+            return self.send_json(400, {"error": str(e)})
+        start = time.monotonic()
+        try:
+            results = self.server.batcher.map(items, timeout=self.server.request_timeout)
+        except Exception as e:
+            return self.send_json(500, {"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+        self.send_json(200, {"results": results, "seconds": time.monotonic() - start})
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+def make_server(
+        batcher: MicroBatcher,
+        host: str="127.0.0.1",
+        port: int=8321,
+        socket_path: str=None,
+        request_timeout: float=600,
+        quiet: bool=False
+        ) -> socketserver.BaseServer:
+    """
+    HTTP server answering from batcher, on host:port or on a Unix socket at socket_path.
+    """
+    if socket_path:
+        server = UnixHTTPServer(socket_path, AttributionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AttributionHandler)
+    server.batcher = batcher
+    server.request_timeout = request_timeout
+    server.quiet = quiet
+    return server
+
+def serve(
+        attributor_kwargs: dict,
+        workers: int=1,
+        max_batch: int=8,
+        max_wait: float=0.02,
+        batch_size: int=8,
+        **server_kwargs
+        ):
+    """
+    Starts the worker processes (waiting for their models to load) and serves until interrupted.
+
+    Input:
+        attributor_kwargs (dict) - passed to each worker's Attributor
+        workers (int) - number of worker processes, each with its own copy of the models
+        max_batch, max_wait - see MicroBatcher
+        batch_size (int) - nlp.pipe batch size inside a worker
+        server_kwargs - see make_server
+    """
+    processes = [AttributorProcess(attributor_kwargs, batch_size=batch_size) for _ in range(workers)]
+    for p in processes:
+        p.wait_ready()
+    batcher = MicroBatcher(processes, max_batch=max_batch, max_wait=max_wait)
+    server = make_server(batcher, **server_kwargs)
+    address = server_kwargs.get("socket_path") or "http://{}:{}".format(*server.server_address[:2])
+    print(f"serving attributions on {address} with {workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        for p in processes:
+            p.close()
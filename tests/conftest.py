@@ -0,0 +1,41 @@
+import pytest
+import spacy
+from spacy.tokens import Doc, Span
+from sayswho.sayswho import Attributor
+
+@pytest.fixture
+def attributor():
+    """
+    Attributor loaded with a small hand-annotated article (no models needed): one quote by "Officer John Smith", a coref cluster for Smith and two law enforcement ents.
+    """
+    words = [
+        '"', "We", "found", "the", "weapon", "near", "the", "car", "outside", "the", "bar", ",", '"', "said", "Officer", "John", "Smith", ".", "\n",
+        "The", "State", "Police", "said", "Smith", "was", "there", ".", "\n",
+        "He", "said", "the", "investigation", "is", "still", "ongoing", "."
+        ]
+    spaces = [False, True, True, True, True, True, True, True, True, True, False, False, True, True, True, True, False, False, False,
+        True, True, True, True, True, True, False, False, False,
+        True, True, True, True, True, True, False, False]
+    pos = ["PUNCT", "PRON", "VERB", "DET", "NOUN", "ADP", "DET", "NOUN", "ADP", "DET", "NOUN", "PUNCT", "PUNCT", "VERB", "PROPN", "PROPN", "PROPN", "PUNCT", "SPACE",
+        "DET", "PROPN", "PROPN", "VERB", "PROPN", "AUX", "ADV", "PUNCT", "SPACE",
+        "PRON", "VERB", "DET", "NOUN", "AUX", "ADV", "ADJ", "PUNCT"]
+    deps = ["punct", "nsubj", "ccomp", "det", "dobj", "prep", "det", "pobj", "prep", "det", "pobj", "punct", "punct", "ROOT", "compound", "compound", "nsubj", "punct", "dep",
+        "det", "compound", "nsubj", "ROOT", "nsubj", "ccomp", "advmod", "punct", "dep",
+        "nsubj", "ROOT", "det", "nsubj", "ccomp", "advmod", "acomp", "punct"]
+    heads = [13, 2, 13, 4, 2, 2, 7, 5, 2, 10, 8, 13, 13, 13, 16, 16, 13, 13, 13,
+        21, 21, 22, 22, 24, 22, 24, 22, 22,
+        29, 29, 31, 32, 29, 32, 32, 29]
+    lemmas = [w.lower() for w in words]
+    lemmas[13] = lemmas[22] = lemmas[29] = "say"
+    sent_starts = [w in (0, 19, 28) for w in range(len(words))]
+    vocab = spacy.blank("en").vocab
+    doc = Doc(vocab, words=words, spaces=spaces, pos=pos, lemmas=lemmas, deps=deps, heads=heads, sent_starts=sent_starts)
+    doc.ents = [Span(doc, 15, 17, "PERSON"), Span(doc, 23, 24, "PERSON")]
+    doc.spans["coref_clusters_1"] = [doc[15:17], doc[23:24], doc[28:29]]
+    ner_doc = Doc(vocab, words=words, spaces=spaces)
+    ner_doc.ents = [Span(ner_doc, 14, 17, "LAW ENFORCEMENT"), Span(ner_doc, 20, 22, "LAW ENFORCEMENT")]
+
+    a = Attributor(ner_nlp="ner")
+    a.load_docs(doc, doc, ner_doc)
+    a.get_matches()
+    return a
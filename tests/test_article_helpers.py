@@ -0,0 +1,35 @@
+import pytest
+from sayswho.article_helpers import fast_parse, full_parse, extract_soup, get_metadata
+
+def make_data(bodytexts, headline=("Man arrested", "Police say"), byline="Jane Doe", publication="The Daily &amp; News"):
+    body = "".join(
+        "<bodyText>" + "".join(f"<p>{p}</p>" for p in paras) + "</bodyText>" for paras in bodytexts
+        )
+    hedline = "<nitf:hedline>" + "".join(
+        f"<nitf:hl{n+1}>{h}</nitf:hl{n+1}>" for n, h in enumerate(headline)
+        ) + "</nitf:hedline>" if headline else ""
+    byline = f"<nitf:byline><author><person><nameText>{byline}</nameText></person></author></nitf:byline>" if byline else ""
+    publication = f"<publicationInfo><publicationName>{publication}</publicationName></publicationInfo>" if publication else ""
+    content = (
+        '<entry xmlns="http://www.w3.org/2005/Atom"><id>urn:contentItem:5SGV-F7D1-DYT5-M4YY-00000-00</id>'
+        '<content type="application/xml"><articleDoc xml:lang="en">'
+        '<nitf:body xmlns:nitf="http://iptc.org/std/NITF/2006-10-18/">'
+        f'<nitf:body.head>{hedline}{byline}</nitf:body.head>'
+        f'<nitf:body.content>{body}</nitf:body.content></nitf:body>'
+        f'<metadata><wordCount number="123"/>{publication}<dateText>June 1, 2020 Monday</dateText></metadata>'
+        '</articleDoc></content></entry>'
+        )
+    return {"ResultId": "urn:contentItem:5SGV-F7D1-DYT5-M4YY-00000-00", "Document": {"Content": content}}
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        make_data([['Police said,"We found him."', " The suspect &amp; his <b>lawyer</b> declined to comment. "]]),
+        make_data([["Short."], ["The longer bodytext wins.", "Second paragraph."], ["Also short"]]),
+        make_data([["Same length"], ["Same-length"]], headline=None, byline=None, publication=None),
+        make_data([['"Unclosed quote', "Café «quoted» text<!-- a comment -->."]]),
+    ]
+)
+def test_fast_parse_matches_soup(data):
+    soup = extract_soup(data)
+    assert fast_parse(data, "\n") == (full_parse(data, "\n"), get_metadata(soup))
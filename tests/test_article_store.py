@@ -0,0 +1,56 @@
+import json
+import pytest
+from sayswho.article_store import ArticleStore
+
+def make_result(doc_id, text="text"):
+    return {"ResultId": f"urn:contentItem:{doc_id}", "Document": {"Content": text}}
+
+@pytest.fixture
+def archive(tmp_path):
+    files = {
+        "crime_query_results_1.json": ["AAAA-0000-00000-00", "BBBB-0000-00000-00"],
+        "crime_query_results_2.json": ["CCCC-0000-00000-00", "DDDD-0000-00000-00", "EEEE-0000-00000-00"],
+    }
+    file_key = []
+    for file_name, doc_ids in files.items():
+        json.dump([make_result(d, d.lower()) for d in doc_ids], open(tmp_path / file_name, "w"))
+        file_key += [{"doc_id": d, "file_name": file_name} for d in doc_ids]
+    json.dump(file_key, open(tmp_path / "doc_file_key.json", "w"))
+    return tmp_path
+
+def test_load_doc(archive):
+    store = ArticleStore.from_file_key(archive / "doc_file_key.json", json_path=archive)
+    assert store.load_doc("DDDD-0000-00000-00")["Document"]["Content"] == "dddd-0000-00000-00"
+    assert store.index["DDDD-0000-00000-00"] == ("crime_query_results_2.json", 1)
+    assert store.load_doc("CCCC-0000-00000-00")["Document"]["Content"] == "cccc-0000-00000-00"
+    assert (store.hits, store.misses) == (1, 1)
+
+def test_load_docs_reads_each_file_once(archive):
+    store = ArticleStore.from_file_key(archive / "doc_file_key.json", json_path=archive)
+    doc_ids = ["CCCC-0000-00000-00", "AAAA-0000-00000-00", "EEEE-0000-00000-00", "BBBB-0000-00000-00"]
+    loaded = list(store.load_docs(doc_ids))
+    assert [d for d, _ in loaded] == [
+        "CCCC-0000-00000-00", "EEEE-0000-00000-00", "AAAA-0000-00000-00", "BBBB-0000-00000-00"
+        ]
+    assert all(data["ResultId"].endswith(doc_id) for doc_id, data in loaded)
+    assert store.misses == 2
+
+def test_cache_eviction(archive):
+    store = ArticleStore.from_file_key(archive / "doc_file_key.json", json_path=archive, max_bytes=1)
+    store.load_doc("AAAA-0000-00000-00")
+    store.load_doc("CCCC-0000-00000-00")
+    assert list(store.cache) == ["crime_query_results_2.json"]
+    store.load_doc("AAAA-0000-00000-00")
+    assert store.misses == 3
+
+def test_missing_doc_id(archive):
+    store = ArticleStore.from_file_key(archive / "doc_file_key.json", json_path=archive)
+    with pytest.raises(KeyError):
+        store.load_doc("ZZZZ-0000-00000-00")
+
+def test_from_csv(archive):
+    csv_path = archive / "index.csv"
+    csv_path.write_text("doc_id,file_name\nBBBB-0000-00000-00,crime_query_results_1.json\n")
+    store = ArticleStore.from_csv(csv_path, json_path=archive)
+    assert len(store) == 1
+    assert store.load_doc("BBBB-0000-00000-00")["ResultId"].endswith("BBBB-0000-00000-00")
@@ -0,0 +1,92 @@
+import random
+import numpy as np
+import pytest
+import spacy
+from rapidfuzz import fuzz
+from sayswho.attribution_helpers import (
+    span_contains, get_boundary_array, containment_pairs,
+    compare_spans, compare_spans_matrix, text_score_matrix,
+    make_relation, compose_relations, transpose_relation, relation_pairs,
+    coref_windows, merge_clusters
+    )
+
+@pytest.fixture(scope="module")
+def doc():
+    return spacy.blank("en")("Detective Jeff Rosenberg of the Walrus Police Department said the suspect fled on foot.")
+
+def test_containment_pairs_matches_span_contains(doc):
+    rng = random.Random(0)
+    def random_spans(n):
+        spans = []
+        for _ in range(n):
+            i = rng.randrange(len(doc))
+            spans.append(doc[i:rng.randrange(i, len(doc)) + 1])
+        return spans + [doc[i] for i in rng.sample(range(len(doc)), 3)]
+
+    for _ in range(20):
+        s1, s2 = random_spans(rng.randint(0, 8)), random_spans(rng.randint(0, 8))
+        expected = [(i, j) for i, t1 in enumerate(s1) for j, t2 in enumerate(s2) if span_contains(t1, t2)]
+        assert containment_pairs(get_boundary_array(s1), get_boundary_array(s2)) == expected
+
+def test_empty_boundary_array():
+    assert get_boundary_array([]).shape == (0, 2)
+    assert containment_pairs(get_boundary_array([]), get_boundary_array([])) == []
+
+def test_text_score_matrix():
+    texts1 = ["Jeff Rosenberg", "Rosenberg", "he", "Rosenberg", "Detective Jeff Rosenberg"]
+    texts2 = ["Rosenberg", "the Walrus Police Department", "Jeff"]
+    scores = text_score_matrix(texts1, texts2)
+    assert scores.tolist() == [[fuzz.partial_ratio(t1, t2) for t2 in texts2] for t1 in texts1]
+    cut = text_score_matrix(texts1, texts2, score_cutoff=95)
+    assert ((cut > 95) == (scores > 95)).all()
+    assert text_score_matrix([], texts2).shape == (0, 3)
+
+def test_compare_spans_matrix(doc):
+    spans = [doc[0:3], doc[1:3], doc[0:2], doc[5:9], doc[4:8], doc[3:4]]
+    assert compare_spans_matrix(spans, spans).tolist() == [
+        [compare_spans(s1, s2) for s2 in spans] for s1 in spans
+        ]
+
+def test_compose_relations_matches_matrix_product():
+    rng = random.Random(0)
+    for _ in range(50):
+        n, m, k = rng.randint(1, 6), rng.randint(1, 6), rng.randint(1, 6)
+        p1 = [(rng.randrange(n), rng.randrange(m)) for _ in range(rng.randint(0, 8))]
+        p2 = [(rng.randrange(m), rng.randrange(k)) for _ in range(rng.randint(0, 8))]
+        m1, m2 = np.zeros((n, m)), np.zeros((m, k))
+        for i, j in p1:
+            m1[i, j] = 1
+        for i, j in p2:
+            m2[i, j] = 1
+        composed = compose_relations(make_relation(p1), make_relation(p2))
+        assert relation_pairs(composed) == [tuple(p) for p in np.transpose(np.nonzero(m1.dot(m2))).tolist()]
+        assert relation_pairs(transpose_relation(make_relation(p1))) == sorted(set((j, i) for i, j in p1))
+
+def test_coref_windows():
+    nlp = spacy.blank("en")
+    paras = ["one two three", "four five", "six seven eight nine", "ten"]
+    doc = nlp("\n".join(paras))
+    windows = coref_windows(doc, max_tokens=8, overlap=1)
+    assert [doc.text[start:end] for start, end in windows] == [
+        "one two three\nfour five", "four five\nsix seven eight nine", "six seven eight nine\nten"
+        ]
+    assert [doc.text[start:end] for start, end in coref_windows(doc, max_tokens=8, overlap=0)] == [
+        "one two three\nfour five", "six seven eight nine\nten"
+        ]
+    # a paragraph over the budget gets a window to itself
+    assert [doc.text[start:end] for start, end in coref_windows(doc, max_tokens=2, overlap=1)] == paras
+    assert coref_windows(doc, max_tokens=100) == [(0, len(doc.text))]
+
+def test_merge_clusters():
+    clusters = [
+        [(0, 5), (20, 25)],
+        [(10, 12)],
+        [(20, 25), (40, 45)],
+        [(40, 45), (60, 65), (10, 12)],
+        [(70, 75), (80, 85)],
+    ]
+    assert merge_clusters(clusters) == [
+        [(0, 5), (10, 12), (20, 25), (40, 45), (60, 65)],
+        [(70, 75), (80, 85)]
+    ]
+    assert merge_clusters([]) == []
@@ -0,0 +1,26 @@
+import random
+import spacy
+from sayswho.batching import length_bucket, token_budget_batches, TokenBudgetBatcher
+
+def test_token_budget_batches():
+    rng = random.Random(0)
+    lengths = [rng.choice([rng.randint(1, 60), rng.randint(200, 3000)]) for _ in range(300)]
+    batches = token_budget_batches(lengths, max_tokens=2048)
+    assert sorted(n for batch in batches for n in batch) == list(range(len(lengths)))
+    for batch in batches:
+        longest = max(lengths[n] for n in batch)
+        assert len(batch) == 1 or len(batch) * longest <= 2048
+        assert len({length_bucket(lengths[n]) for n in batch}) == 1
+
+def test_batcher_keeps_order():
+    nlp = spacy.blank("en")
+    rng = random.Random(0)
+    texts = [" ".join(["word"] * rng.choice([3, 5, 400, 900])) + f" {n}" for n in range(50)]
+    batcher = TokenBudgetBatcher(max_tokens=1000, window=16)
+    docs = list(batcher.pipe(nlp, texts))
+    assert [doc.text for doc in docs] == texts
+    report = batcher.report()
+    assert report["docs"] == 50
+    assert report["tokens"] == sum(len(doc) for doc in docs)
+    assert 0.9 < report["padding_efficiency"] <= 1.0
+    assert report["tokens_per_second"] > 0
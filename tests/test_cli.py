@@ -0,0 +1,62 @@
+import json
+from sayswho.cli import run_batch, read_doc_ids, read_manifest, prescreen_summary, StageError
+
+def fake_process(doc_id: str) -> dict:
+    if doc_id.startswith("bad"):
+        raise StageError("parse", ValueError(f"can't parse {doc_id}"))
+    if doc_id.startswith("worse"):
+        raise KeyError(doc_id)
+    return {"doc_id": doc_id, "status": "done", "score": {"n_quotes": len(doc_id)}}
+
+def test_read_doc_ids(tmp_path):
+    csv_path = tmp_path / "ids.csv"
+    csv_path.write_text("doc_id,file_name\na,f1\nb,f1\na,f2\n")
+    txt_path = tmp_path / "ids.txt"
+    txt_path.write_text("a\n\nb\nc\n")
+    assert read_doc_ids(str(csv_path)) == ["a", "b"]
+    assert read_doc_ids(str(txt_path)) == ["a", "b", "c"]
+
+def test_run_batch_quarantines_and_resumes(tmp_path):
+    manifest = str(tmp_path / "out" / "manifest.jsonl")
+    quarantine = str(tmp_path / "out" / "quarantine.jsonl")
+    doc_ids = ["a", "bad1", "bb", "worse1", "ccc"]
+
+    counts = run_batch(doc_ids[:3], manifest, quarantine, process=fake_process, progress=False)
+    assert counts == {"done": 2, "error": 1, "skipped": 0}
+
+    # crash mid-write leaves a partial line, which is ignored and doesn't corrupt the next record
+    with open(manifest, "a") as f:
+        f.write('{"doc_id": "cc')
+
+    counts = run_batch(doc_ids, manifest, quarantine, process=fake_process, progress=False)
+    assert counts == {"done": 1, "error": 1, "skipped": 3}
+
+    records = list(read_manifest(manifest))
+    assert sorted(r['doc_id'] for r in records) == sorted(doc_ids)
+    assert {r['doc_id'] for r in records if r['status'] == "done"} == {"a", "bb", "ccc"}
+
+    errors = {r['doc_id']: r for r in read_manifest(quarantine)}
+    assert errors["bad1"]["stage"] == "parse"
+    assert errors["bad1"]["exception"] == "ValueError"
+    assert "can't parse bad1" in errors["bad1"]["traceback"]
+    assert errors["worse1"]["stage"] == "unknown"
+
+    counts = run_batch(doc_ids, manifest, quarantine, process=fake_process, progress=False, retry_errors=True)
+    assert counts == {"done": 0, "error": 2, "skipped": 3}
+
+def test_run_batch_pool(tmp_path):
+    manifest = str(tmp_path / "manifest.jsonl")
+    quarantine = str(tmp_path / "quarantine.jsonl")
+    doc_ids = [f"doc{n}" for n in range(20)] + ["bad"]
+    counts = run_batch(doc_ids, manifest, quarantine, workers=2, process=fake_process, chunksize=3, progress=False)
+    assert counts == {"done": 20, "error": 1, "skipped": 0}
+    assert {r['doc_id'] for r in read_manifest(manifest)} == set(doc_ids)
+    assert [r['doc_id'] for r in read_manifest(quarantine)] == ["bad"]
+
+def test_prescreen_summary(tmp_path):
+    manifest = str(tmp_path / "manifest.jsonl")
+    with open(manifest, "w") as f:
+        for doc_id, prescreened, seconds in [("a", False, 2.0), ("b", False, 4.0), ("c", True, 0.5), ("d", True, 0.5)]:
+            f.write(json.dumps({"doc_id": doc_id, "status": "done", "prescreened": prescreened, "seconds": seconds}) + "\n")
+    summary = prescreen_summary(manifest)
+    assert summary == {"docs": 4, "skipped": 2, "skip_rate": 0.5, "estimated_seconds_saved": 5.0}
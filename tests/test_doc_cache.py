@@ -0,0 +1,89 @@
+import multiprocessing
+import pytest
+import spacy
+from sayswho.doc_cache import DocCache
+
+@pytest.fixture(scope="module")
+def nlp():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+def parse(nlp, text):
+    doc = nlp(text)
+    doc.spans["coref_clusters_1"] = [doc[0:1], doc[-2:-1]]
+    return doc, nlp(text), nlp(text)
+
+def test_round_trip(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    text = 'Burton said, "I love those cats." He left.'
+    assert cache.get(text, "fp") is None
+    cache.put(text, "fp", *parse(nlp, text))
+    coref_doc, doc, ner_doc = cache.get(text, "fp", nlp.vocab)
+    assert doc.text == text
+    assert [s.text for s in coref_doc.spans["coref_clusters_1"]] == ["Burton", "left"]
+    assert [s.text for s in doc.sents] == [s.text for s in nlp(text).sents]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_shared_doc_and_no_ner(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    doc = nlp("Some text.")
+    cache.put(doc.text, "fp", doc, doc, None)
+    coref_doc, doc_, ner_doc = cache.get(doc.text, "fp")
+    assert coref_doc is doc_
+    assert ner_doc is None
+
+def test_fingerprint_and_invalidate(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    text = "Some text."
+    cache.put(text, "old", *parse(nlp, text))
+    assert cache.get(text, "new") is None
+    cache.put(text, "new", *parse(nlp, text))
+    cache.invalidate("new")
+    assert cache.get(text, "old") is None
+    assert cache.get(text, "new") is not None
+
+def test_eviction(nlp, tmp_path):
+    cache = DocCache(str(tmp_path))
+    texts = [f"Text number {n}." for n in range(3)]
+    for t in texts:
+        cache.put(t, "fp", *parse(nlp, t))
+    cache.max_bytes = cache.total_bytes - 1
+    cache.evict()
+    assert len(list(cache.entries())) == 2
+    assert cache.total_bytes == DocCache(str(tmp_path)).total_bytes
+
+def test_eviction_low_water(nlp, tmp_path):
+    cache = DocCache(str(tmp_path), low_water=0.5)
+    for n in range(10):
+        cache.put(f"Text number {n}.", "fp", *parse(nlp, f"Text number {n}."))
+    size = cache.total_bytes // 10
+    cache.max_bytes = cache.total_bytes - 1
+    cache.evict()
+    assert cache.total_bytes <= 0.5 * cache.max_bytes
+    assert len(list(cache.entries())) == cache.total_bytes // size
+
+def fill_shared_cache(path, max_bytes):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    cache = DocCache(path, max_bytes=max_bytes)
+    for n in range(40):
+        text = f"Text number {n % 15} from the corpus."
+        if cache.get(text, "fp") is None:
+            cache.put(text, "fp", *parse(nlp, text))
+
+def test_shared_across_processes(nlp, tmp_path):
+    text = "Text number 0 from the corpus."
+    probe = DocCache(str(tmp_path / "probe"))
+    probe.put(text, "fp", *parse(nlp, text))
+    max_bytes = 5 * probe.total_bytes
+
+    path = str(tmp_path / "shared")
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=fill_shared_cache, args=(path, max_bytes)) for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+    assert [p.exitcode for p in processes] == [0] * 4
+    assert DocCache(path).total_bytes <= max_bytes + probe.total_bytes * len(processes)
@@ -0,0 +1,85 @@
+import os
+import time
+from sayswho.cli import run_batch, read_manifest
+from sayswho.governor import Governor, check_doc_size, rss_bytes
+
+def flaky_process(doc_id: str) -> dict:
+    if doc_id.startswith("slow"):
+        time.sleep(30)
+    if doc_id.startswith("die"):
+        os._exit(9)
+    if doc_id.startswith("big"):
+        check_doc_size(1000)
+    return {"doc_id": doc_id, "status": "done", "pid": os.getpid()}
+
+def flaky_process_caller():
+    from sayswho.cli import _Caller
+    return _Caller(flaky_process)
+
+def test_governor_quarantines_timeouts_and_crashes(tmp_path):
+    manifest = str(tmp_path / "manifest.jsonl")
+    quarantine = str(tmp_path / "quarantine.jsonl")
+    doc_ids = [f"doc{n}" for n in range(12)] + ["slow1", "die1"]
+    start = time.monotonic()
+    counts = run_batch(
+        doc_ids, manifest, quarantine, workers=2, process=flaky_process, progress=False,
+        governor={"doc_timeout": 1, "max_docs_per_worker": 3, "poll_interval": 0.05}
+        )
+    assert time.monotonic() - start < 20
+    assert counts["done"] == 12 and counts["error"] == 2
+    assert counts["governor"]["timeouts"] == 1 and counts["governor"]["crashes"] == 1
+    errors = {r["doc_id"]: r for r in read_manifest(quarantine)}
+    assert errors["slow1"]["stage"] == "timeout"
+    assert errors["die1"]["stage"] == "crash"
+    # workers are restarted every 3 docs
+    pids = {}
+    for r in read_manifest(manifest):
+        if r["status"] == "done":
+            pids[r["pid"]] = pids.get(r["pid"], 0) + 1
+    assert max(pids.values()) <= 3 and len(pids) >= 4
+
+def slow_init(seconds: float):
+    time.sleep(seconds)
+
+def quick_process(doc_id: str) -> dict:
+    time.sleep(0.05)
+    return {"doc_id": doc_id, "status": "done", "pid": os.getpid()}
+
+def test_governor_waits_for_initializer(tmp_path):
+    manifest = str(tmp_path / "manifest.jsonl")
+    quarantine = str(tmp_path / "quarantine.jsonl")
+    # loading the models takes longer than doc_timeout, and restarts load them again
+    counts = run_batch(
+        [f"doc{n}" for n in range(6)], manifest, quarantine, workers=2, process=quick_process,
+        initializer=slow_init, initargs=(1.0,), progress=False,
+        governor={"doc_timeout": 0.5, "max_docs_per_worker": 2, "poll_interval": 0.05}
+        )
+    assert counts["done"] == 6 and counts["error"] == 0
+    assert counts["governor"]["timeouts"] == 0 and counts["governor"]["restarts"] >= 1
+
+def test_governor_memory_budget_stops_workers_without_respawning():
+    # every worker is over a 1 byte budget, so the regular lane should shrink to one worker and stay there
+    governor = Governor(flaky_process_caller(), workers=3, memory_budget=1, poll_interval=0.05)
+    results = list(governor.imap([f"doc{n}" for n in range(20)]))
+    assert len(results) == 20 and all(error is None for _, _, error in results)
+    assert governor.active_limit == 1
+    assert governor.stats["throttled"] == 2
+    assert governor.stats["restarts"] == 0
+    assert len({record["pid"] for _, record, _ in results}) <= 3
+
+def test_governor_routes_large_docs():
+    task = flaky_process_caller()
+    governor = Governor(task, workers=2, large_doc_chars=100, poll_interval=0.05)
+    results = {doc_id: (record, error) for doc_id, record, error in governor.imap(["a", "big1", "b", "big2"])}
+    assert all(results[d][1] is None for d in ["a", "b", "big1", "big2"])
+    # the large lane is a single worker, separate from the regular ones
+    large_pids = {results[d][0]["pid"] for d in ["big1", "big2"]}
+    assert len(large_pids) == 1 and large_pids.isdisjoint({results[d][0]["pid"] for d in ["a", "b"]})
+    # a doc that crashes a worker gets one more try in the large lane before it's quarantined
+    results = {doc_id: (record, error) for doc_id, record, error in governor.imap(["a", "die1"])}
+    assert results["die1"][1]["stage"] == "crash"
+    assert governor.stats["rerouted"] == 3
+
+def test_rss_bytes():
+    assert rss_bytes(os.getpid()) > 0
+    assert check_doc_size(10**9) is None
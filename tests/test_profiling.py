@@ -0,0 +1,48 @@
+import time
+from sayswho.profiling import Profiler
+
+def test_stages_and_counters():
+    profiler = Profiler()
+    try:
+        for n in range(1, 5):
+            profiler.start_doc(f"doc{n}")
+            with profiler.stage("outer"):
+                with profiler.stage("alloc"):
+                    block = bytearray(n * 1_000_000)
+                del block
+                time.sleep(0.001 * n)
+            with profiler.stage("outer"):
+                pass
+            profiler.count(tokens=100 * n, quotes=n)
+            profiler.count(quotes=1)
+    finally:
+        profiler.stop()
+
+    doc = profiler.docs[-1]
+    assert set(doc.stages) == {"outer", "outer.alloc"}
+    assert doc.stages["outer.alloc"].peak_bytes >= 4_000_000
+    # the nested stage's peak counts towards the outer one
+    assert doc.stages["outer"].peak_bytes >= doc.stages["outer.alloc"].peak_bytes
+    assert doc.stages["outer"].wall >= 0.004
+    assert doc.counters == {"tokens": 400, "quotes": 5}
+    # only top level stages count towards a doc's total
+    assert doc.wall == doc.stages["outer"].wall
+
+    report = profiler.report()
+    assert report["docs"] == 4
+    assert report["stages"]["outer"]["n"] == 4
+    assert report["counters"]["tokens"]["total"] == 1000
+    assert report["counters"]["tokens"]["max"] == 400
+    assert report["counters"]["quotes"]["p50"] == 3.5
+    assert profiler.slowest(1)[0].label == "doc4"
+    assert "outer.alloc" in profiler.format_report()
+
+    rebuilt = Profiler.from_records(profiler.records())
+    assert rebuilt.report() == report
+
+def test_memory_off():
+    profiler = Profiler(memory=False)
+    with profiler.stage("a"):
+        block = bytearray(1_000_000)
+    assert profiler.docs[0].stages["a"].peak_bytes == 0
+    assert profiler.docs[0].label == "0"
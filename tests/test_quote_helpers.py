@@ -0,0 +1,280 @@
+import os
+import glob
+import random
+import regex as re
+from typing import List, Union
+import pytest
+import spacy
+from sayswho.quote_helpers import (
+    get_qtok_idx_pairs, filter_quote_tokens, windower, DocIndex,
+    para_quote_fixer, prep_text_for_quote_detection, verb_forms, reporting_verb_forms,
+    expand_noun, expand_verb, DQTriple
+    )
+from spacy.tokens import Doc, Span
+from sayswho.quotes import has_attributable_quotes, direct_quotations, skip_content
+from sayswho.constants import (
+    _ACTIVE_SUBJ_DEPS, _reporting_verbs, QUOTATION_MARK_PAIRS,
+    all_quotes, brack_regex, double_quotes, double_quotes_nospace_regex
+    )
+from spacy.symbols import VERB, PUNCT
+from operator import attrgetter
+
+@pytest.fixture(scope="module")
+def nlp():
+    return spacy.blank("en")
+
+def reference_get_qtok_idx_pairs(doc: Union[Doc, Span]) -> List[tuple]:
+    """
+    The original get_qtok_idx_pairs, which checks every later quote token for each opening mark.
+    """
+    qtoks = [tok for tok in doc if tok.is_quote or (re.match(r"(\n)+", tok.text))]
+    qtok_idx_pairs = [(-1,-1)]
+    for n, q in enumerate(qtoks):
+        if (
+            not bool(q.whitespace_)
+            and q.i not in [q_[1] for q_ in qtok_idx_pairs] 
+            and q.i > qtok_idx_pairs[-1][1]
+            ):
+            for q_ in qtoks[n+1:]:
+                if (ord(q.text), ord(q_.text)) in QUOTATION_MARK_PAIRS:
+                    qtok_idx_pairs.append((q.i, q_.i))
+                    break  
+    return qtok_idx_pairs[1:]
+
+@pytest.mark.parametrize(
+    "text, pairs",
+    [
+        ('Burton said, "I love those cats!"', [(3, 9)]),
+        ('"I love those cats," he said. "Yeah."', [(0, 6), (10, 13)]),
+        ("He told everyone, \"This 'hamburger with extra cheese' is good.\"", [(4, 15)]),
+        ('"Where are the horses\' carrots?" he asked.', [(0, 8)]),
+        ('"No closing mark here\nNext paragraph.', [(0, 5)]),
+        ("Nothing quoted.", []),
+    ]
+)
+def test_get_qtok_idx_pairs(nlp, text, pairs):
+    doc = nlp(text)
+    assert get_qtok_idx_pairs(doc) == pairs
+    assert reference_get_qtok_idx_pairs(doc) == pairs
+
+def test_get_qtok_idx_pairs_matches_reference(nlp):
+    rng = random.Random(0)
+    pieces = ['"', "'", "“", "”", "‘", "’", "«", "»", "\n", "word", "said", ",", "."]
+    for _ in range(300):
+        text = "".join(rng.choice(pieces) + rng.choice(["", " "]) for _ in range(rng.randint(1, 40)))
+        doc = nlp(text)
+        if any(len(tok.text) > 1 and (tok.is_quote or tok.text.startswith("\n")) for tok in doc):
+            continue
+        assert get_qtok_idx_pairs(doc) == reference_get_qtok_idx_pairs(doc), text
+
+def test_filter_quote_tokens(nlp):
+    doc = nlp('He said "one two" and "three four five" then left.')
+    pairs = get_qtok_idx_pairs(doc)
+    for tok in doc:
+        assert filter_quote_tokens(tok, pairs) == any(i <= tok.i <= j for i, j in pairs)
+
+def reference_windower(span, method):
+    """
+    The original windower, which rescans doc.sents and the tokens for every span.
+    """
+    import regex as re
+    if method == "overlap":
+        return [
+            sent for sent in span.doc.sents
+            if (sent.start < span.start < sent.end) or (sent.start < span.end < sent.end)
+        ]
+    indexes = [
+        n for n, s in enumerate(span.doc.sents)
+        if (s.start <= span.start <= s.end) or (s.start <= span.end <= s.end)
+        ]
+    i_sent, j_sent = indexes[0], indexes[-1]
+    sents = list(span.doc.sents)[i_sent-1:j_sent+2] if i_sent > 0 else list(span.doc.sents)[:j_sent+2]
+    linebreaks = [0] + [tok.i for tok in span.doc if re.match(r"\n", tok.text)] + [span.doc[-1].i]
+    linebreak_limits = [lb for lb in linebreaks if sents[0].start < lb <= span.end + 1]
+    if linebreak_limits:
+        return [s for s in sents if s.end <= max(linebreak_limits)]
+    return sents
+
+def test_windower_matches_reference():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    rng = random.Random(0)
+    words = ["He", "said", "the", "police", '"', "left", ".", "\n", "!", "Then"]
+    for _ in range(100):
+        doc = nlp(" ".join(rng.choice(words) for _ in range(rng.randint(5, 60))))
+        index = DocIndex(doc)
+        for _ in range(10):
+            i = rng.randrange(len(doc))
+            j = rng.randrange(i, len(doc))
+            span = doc[i:j+1]
+            for method in ["overlap", "linebreaks"]:
+                assert windower(span, method, index) == reference_windower(span, method)
+
+def reference_para_quote_fixer(p):
+    """
+    The original para_quote_fixer, which re-runs re.search from the start of the paragraph for every glued quote.
+    """
+    if not p:
+        return
+    p = p.strip()
+    p = p.replace("\'\'", "\"")
+    p = re.sub(r"(.{3,8}s\')(\s)", r"\1x\2", p)
+
+    while re.search(double_quotes_nospace_regex, p):
+        match = re.search(double_quotes_nospace_regex, p)
+        if len(re.findall(brack_regex.format(double_quotes), p[:match.start()])) % 2 != 0:
+            replacer = '" '
+        else:
+            replacer = ' "'
+        p = p[:match.start()] + replacer + p[match.end():]
+    if (
+        not (p[0] == "'" and p[-1] == "'") 
+        and p[0] in all_quotes 
+        and len(re.findall(brack_regex.format(double_quotes), p[1:])) % 2 == 0
+        ):
+        p += '"'
+    return p
+
+@pytest.mark.parametrize(
+    "p, fixed",
+    [
+        ('He said,"I love those cats."', 'He said, "I love those cats."'),
+        ('"I love those cats,"he said.', '"I love those cats," he said.'),
+        ('"One,"he said,"two."', '"One," he said, "two."'),
+        ("''Quoted'' text", '"Quoted" text'),
+        ('"Unclosed quote at the start', '"Unclosed quote at the start"'),
+    ]
+)
+def test_para_quote_fixer(p, fixed):
+    assert para_quote_fixer(p) == fixed
+    assert reference_para_quote_fixer(p) == fixed
+
+def test_para_quote_fixer_matches_reference():
+    rng = random.Random(0)
+    chars = list('"“”«»„‹›「」『』‚\'ab s.') + ["xs' "]
+    for _ in range(2000):
+        p = "".join(rng.choice(chars) for _ in range(rng.randint(1, 25)))
+        if p.strip():
+            assert para_quote_fixer(p) == reference_para_quote_fixer(p), p
+
+    files = glob.glob(os.path.join(os.path.dirname(__file__), "quote_parse_test_files", "*.txt"))
+    assert files
+    for f in files:
+        t = open(f).read()
+        assert prep_text_for_quote_detection(t) == "\n".join(
+            [reference_para_quote_fixer(p) for p in t.split("\n") if p]
+            )
+
+@pytest.mark.parametrize(
+    "lemma, forms",
+    [
+        ("say", ["says", "said", "saying"]),
+        ("note", ["notes", "noted", "noting"]),
+        ("deny", ["denies", "denied", "denying"]),
+        ("stress", ["stresses", "stressed"]),
+        ("write", ["wrote", "written", "writes"]),
+        ("read", ["reads", "read", "reading"]),
+    ]
+)
+def test_verb_forms(lemma, forms):
+    assert set(forms) <= verb_forms(lemma)
+    assert set(forms) <= reporting_verb_forms()
+
+@pytest.mark.parametrize(
+    "text, keep",
+    [
+        ('Tusk said, "We found him at the scene near the car."', True),
+        ('"We found him at the scene near the car," Burton insists.', True),
+        ('Nothing quoted here. The police arrested a man on Tuesday.', False),
+        ('The sign read "No Parking Any Time" all day.', False),
+        ('He was "very upset about the whole thing" apparently.', False),
+        ('"He said we found him at the scene near the car."', False),
+        ('Burton said, "Yes."', False),
+    ]
+)
+def test_has_attributable_quotes(nlp, text, keep):
+    assert has_attributable_quotes(nlp(text)) == keep
+
+def random_parsed_doc(vocab, rng: random.Random) -> Doc:
+    """
+    Random sentences with quote marks, reporting verbs and two-level trees: every token hangs off a verb of its sentence, and the verbs off the first one.
+    """
+    words, pos, lemmas, deps, heads, sent_starts = [], [], [], [], [], []
+    for _ in range(rng.randint(1, 12)):
+        start, n = len(words), rng.randint(3, 20)
+        sent = [rng.choice(['"', '"', "said", "told", "ran", "Smith", "he", "the", "car", "found", "gun", ",", "\n", "we"]) for _ in range(n)]
+        verbs = [start + k for k, w in enumerate(sent) if w in ("said", "told", "ran")] or [start]
+        for k, w in enumerate(sent):
+            words.append(w)
+            pos.append("VERB" if start + k in verbs else rng.choice(["PROPN", "PRON", "PUNCT", "NOUN"]))
+            lemmas.append({"said": "say", "told": "tell"}.get(w, w))
+            deps.append("ROOT" if start + k == verbs[0] else rng.choice(["nsubj", "dobj", "punct", "csubj", "aux"]))
+            heads.append(verbs[0] if start + k in verbs else rng.choice(verbs))
+            sent_starts.append(k == 0)
+    spaces = [w not in ('"', "\n") or rng.random() < 0.3 for w in words]
+    return Doc(vocab, words=words, spaces=spaces, pos=pos, lemmas=lemmas, deps=deps, heads=heads, sent_starts=sent_starts)
+
+def reference_direct_quotations(doc: Doc):
+    """
+    The direct_quotations from before CueIndex, which rescans every window's tokens for reporting verbs and sorts them by distance.
+    """
+    qtok_idx_pairs = get_qtok_idx_pairs(doc)
+    index = DocIndex(doc) if qtok_idx_pairs else None
+
+    for i, j in qtok_idx_pairs:
+        content = doc[i:j]
+        if skip_content(content):
+            continue
+        cue = None
+        speaker = None
+
+        windy = [windower(content, "overlap", index), windower(content, "linebreaks", index)]
+        for window_sents in windy:
+            cue_candidates = [
+                    tok
+                    for sent in window_sents
+                    for tok in sent
+                    if tok.pos == VERB
+                    and tok.lemma_ in _reporting_verbs
+                    and not filter_quote_tokens(tok, qtok_idx_pairs)
+                ]
+            cue_candidates = sorted(
+                cue_candidates,
+                key=lambda cc: min(abs(cc.i - i), abs(cc.i - j))
+            )
+            
+            for cue_cand in cue_candidates:
+                if cue is not None:
+                    break
+                speaker_cands = [
+                    speaker_cand for speaker_cand in cue_cand.children
+                    if speaker_cand.pos != PUNCT
+                    and ((speaker_cand.i >= j)
+                    or (speaker_cand.i <= i))
+                ]
+                for speaker_cand in speaker_cands:
+                    if speaker_cand.dep in _ACTIVE_SUBJ_DEPS:
+                        cue = expand_verb(cue_cand)
+                        speaker = expand_noun(speaker_cand)
+                        break
+                if content and cue and speaker:
+                    yield DQTriple(
+                        speaker=sorted(speaker, key=attrgetter("i")),
+                        cue=sorted(cue, key=attrgetter("i")),
+                        content=doc[i:j+1],
+                    )
+
+def test_direct_quotations_matches_reference(attributor):
+    def triples(quotes):
+        return [([t.i for t in q.speaker], [t.i for t in q.cue], (q.content.start, q.content.end)) for q in quotes]
+
+    assert triples(direct_quotations(attributor.doc)) == triples(reference_direct_quotations(attributor.doc)) == [([14, 15, 16], [13], (0, 13))]
+    rng = random.Random(0)
+    vocab = attributor.doc.vocab
+    found = 0
+    for _ in range(300):
+        doc = random_parsed_doc(vocab, rng)
+        quotes = triples(direct_quotations(doc))
+        assert quotes == triples(reference_direct_quotations(doc))
+        found += len(quotes)
+    assert found
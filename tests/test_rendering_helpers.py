@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import zipfile
+import random
+import pytest
+import spacy
+from types import SimpleNamespace
+from spacy.tokens import Span
+from sayswho.rendering_helpers import (
+    render_attr_with_highlights, write_attr_with_highlights, Renderer, render_new,
+    yield_quotes, render_quote, get_ent_quote_indexes, generate_code
+    )
+from sayswho.article_helpers import pair_quote_matches
+from sayswho.constants import color_key, QuoteClusterMatch, QuoteEntMatch
+
+TEXT = (
+    'Police said, "We found him at the scene."\nHe was taken to County Hospital, officials said.\n\n'
+    '"It was a quiet night," Officer John Smith said. \n The Springfield Police Department is investigating.\n'
+    "Anyone with information should call the State Police \n"
+)
+
+@pytest.fixture(scope="module")
+def nlp():
+    return spacy.blank("en")
+
+def random_stub(doc, rng: random.Random, n: int):
+    def random_spans(k, label):
+        spans = []
+        for _ in range(k):
+            start = rng.randrange(len(doc))
+            spans.append(Span(doc, start, rng.randint(start, len(doc)), label))
+        return spans
+    return SimpleNamespace(
+        doc=doc,
+        ents=random_spans(n, "LAW ENFORCEMENT"),
+        quotes=[SimpleNamespace(content=span) for span in random_spans(n, "QUOTE")]
+    )
+
+def reference_render_attr_with_highlights(a, color_key: dict) -> str:
+    """
+    The original render_attr_with_highlights, which checks every token against every ent and quote range.
+    """
+    indexes = get_ent_quote_indexes(a)
+    text_bucket = ["<p>"]
+    for token in a.doc:
+        coded = False
+        if token.text == "\n":
+            token_text = "</p><p>"
+        else:
+            token_text = token.text_with_ws
+        for index_match in (i_ for i_ in indexes if token.i in i_[0]):
+            coded = True
+            match_indexes, label, n = index_match
+            start = not match_indexes.index(token.i)
+            html_code = generate_code(n, label, start, color_key)
+            text_bucket.append(html_code + token_text)
+        if not coded:
+            text_bucket.append(token_text)
+
+    text_bucket.append("</p>")
+    return "".join(text_bucket)
+
+@pytest.mark.parametrize("seed", range(30))
+def test_render_matches_reference(nlp, seed):
+    rng = random.Random(seed)
+    doc = nlp(TEXT)
+    a = random_stub(doc, rng, rng.randint(0, 8))
+    assert render_attr_with_highlights(a, color_key) == reference_render_attr_with_highlights(a, color_key)
+
+def test_render_quirks(nlp):
+    doc = nlp('He said "no comment" to police.\nThe end')
+    a = SimpleNamespace(
+        doc=doc,
+        # ent ends where the quote starts, quote runs to the end of the doc
+        ents=[Span(doc, 0, 2, "LAW ENFORCEMENT")],
+        quotes=[SimpleNamespace(content=doc[2:len(doc)])]
+    )
+    html = render_attr_with_highlights(a, color_key)
+    assert html == reference_render_attr_with_highlights(a, color_key)
+    # the token where the ent closes and the quote opens is written twice
+    assert re.sub("<[^>]+>", "", html) == 'He said ""no comment" to police.The end'
+    assert "</p><p>" in html
+
+    f = io.StringIO()
+    write_attr_with_highlights(a, color_key, f)
+    assert f.getvalue() == html
+
+def test_renderer(attributor, tmp_path):
+    template_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    metadata = {"doc_id": "doc1", "headline": "Man arrested"}
+
+    renderer = Renderer(color_key, out_dir=str(tmp_path), template_dir=template_dir)
+    html = renderer.render(attributor, metadata)
+    assert "Man arrested" in html and 'id="QUOTE"' in html
+
+    paths = list(renderer.render_many([(attributor, {**metadata, "doc_id": f"doc{n}"}) for n in range(10)], workers=3))
+    assert paths == [str(tmp_path / f"doc{n}.html") for n in range(10)]
+    assert open(paths[1]).read() == html
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+    with Renderer(color_key, out_dir=str(tmp_path), archive="html.zip", template_dir=template_dir) as renderer:
+        names = list(renderer.render_many([(attributor, {**metadata, "doc_id": f"doc{n}"}) for n in range(3)]))
+    with zipfile.ZipFile(tmp_path / "html.zip") as z:
+        assert z.namelist() == names == ["doc0.html", "doc1.html", "doc2.html"]
+        assert z.read("doc1.html").decode() == html
+
+    # render_new (template from the working directory) matches the renderer
+    os.makedirs(tmp_path / "new")
+    cwd = os.getcwd()
+    try:
+        os.chdir(template_dir)
+        render_new(attributor, dict(metadata), color_key, save_file=True, out_dir=str(tmp_path / "new"))
+    finally:
+        os.chdir(cwd)
+    assert open(tmp_path / "new" / "doc1.html").read() == html
+
+def reference_yield_quotes(a):
+    """
+    The original yield_quotes, which scans all quote_matches and ent_matches for every quote.
+    """
+    for quote_index, quote in enumerate(a.quotes):
+        for m in (qm for qm in a.quote_matches if qm.quote_index==quote_index):
+            base_dict = render_quote(quote)
+            base_dict['cluster_index'] = m.cluster_index
+            base_dict['cluster'] = ', '.join(
+                set([c.text for c in a.clusters[m.cluster_index] if c[0].pos_ !="PRON"])
+            )
+            try:
+                ent = next(em for em in a.ent_matches if em.quote_index==m.quote_index)
+                base_dict['ent_index'] = ent.ent_index
+                base_dict['ent'] = a.ents[ent.ent_index].text
+            except StopIteration:
+                pass
+            yield base_dict
+
+@pytest.mark.parametrize("seed", range(10))
+def test_yield_quotes_matches_reference(nlp, seed):
+    rng = random.Random(seed)
+    doc = nlp(TEXT * 3)
+    for t in doc:
+        if t.lower_ in ("he", "it", "anyone"):
+            t.pos_ = "PRON"
+    def span():
+        start = rng.randrange(len(doc) - 1)
+        return doc[start:rng.randint(start + 1, min(start + 4, len(doc)))]
+    n_quotes, n_clusters, n_ents = rng.randint(1, 40), rng.randint(1, 8), rng.randint(1, 6)
+    a = SimpleNamespace(
+        quotes=[SimpleNamespace(content=span(), cue=list(span())) for _ in range(n_quotes)],
+        clusters={n: [span() for _ in range(rng.randint(1, 5))] for n in range(n_clusters)},
+        ents=[span() for _ in range(n_ents)],
+        quote_matches=sorted(
+            set(QuoteClusterMatch(rng.randrange(n_quotes), rng.randrange(n_clusters)) for _ in range(2 * n_quotes)),
+            key=lambda m: m.quote_index
+            ),
+        ent_matches=[QuoteEntMatch(rng.randrange(n_quotes), ent_index=rng.randrange(n_ents)) for _ in range(n_quotes)]
+    )
+    assert list(yield_quotes(a)) == list(reference_yield_quotes(a))
+
+def reference_pair_quote_matches(quotes, matches):
+    """
+    The original pair_quote_matches, which compares every quote with every match.
+    """
+    quote_matches = []
+    for q in quotes:
+        qm = []
+        for m in matches:
+            if m.content == q.content.text:
+                qm.append(m)
+        quote_matches.append((q, qm))
+    return quote_matches
+
+def test_pair_quote_matches():
+    quotes = [SimpleNamespace(content=SimpleNamespace(text=t)) for t in ["a", "b", "a", "c"]]
+    matches = [SimpleNamespace(content=t, n=n) for n, t in enumerate(["a", "c", "a", "d"])]
+    assert pair_quote_matches(quotes, matches) == reference_pair_quote_matches(quotes, matches)
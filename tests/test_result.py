@@ -0,0 +1,31 @@
+import pickle
+from sayswho.sayswho import evaluate
+from sayswho.result import AttributionResult
+
+def test_result_matches_attributor(attributor):
+    result = attributor.to_result("doc1")
+    assert evaluate(result) == evaluate(attributor)
+    assert evaluate(result).n_ent_quotes == 1
+    assert len(result.quotes) == len(attributor.quotes) == 1
+    quote, quote_spans = attributor.quotes[0], result.quotes[0]
+    assert result.text[quote_spans.content.start:quote_spans.content.end] == quote.content.text
+    assert [t.text for t in quote_spans.speaker] == [t.text for t in quote.speaker]
+    assert [t.text for t in quote_spans.cue] == ["said"]
+    assert [m.text for m in result.clusters[0]] == ["John Smith", "Smith", "He"]
+    assert [m.label for m in result.clusters[0]] == ["PROPN", "PROPN", "PRON"]
+    assert [e.label for e in result.ents] == ["LAW ENFORCEMENT"] * 2
+    assert result.quote_matches == attributor.quote_matches
+    assert result.ent_matches == attributor.ent_matches
+
+def test_result_round_trips(attributor):
+    result = attributor.to_result("doc1")
+    assert pickle.loads(pickle.dumps(result)) == result
+    rebuilt = AttributionResult.from_json(result.to_json())
+    assert rebuilt == result
+    assert rebuilt.clusters.keys() == result.clusters.keys()
+    assert not hasattr(result, "__dict__")
+
+def test_drop_docs(attributor):
+    attributor.drop_docs()
+    for k in ["coref_doc", "doc", "ner_doc", "quotes", "clusters", "persons"]:
+        assert not hasattr(attributor, k)
@@ -0,0 +1,69 @@
+import random
+import spacy
+from spacy.language import Language
+from sayswho.sayswho import Attributor, evaluate
+
+def test_prescreen_skips_models(attributor):
+    attributor.prescreen = True
+    text = attributor.doc.text
+    assert attributor.screen(text) is None
+    assert not attributor.prescreened
+
+    attributor.parse_text("The sign read \"No Parking Any Time\" all day.\nNobody said anything.")
+    assert attributor.prescreened
+    attributor.get_matches()
+    assert tuple(evaluate(attributor)) == (0, 0, 0)
+    assert attributor.parse_stats["screened"] == 2
+    assert attributor.parse_stats["skipped"] == 1
+    assert attributor.prescreen_report()["skip_rate"] == 0.5
+
+@Language.component("name_coref")
+def name_coref(doc):
+    """
+    Stand-in for the coref model: every capitalized word that shows up more than once is a cluster.
+    """
+    mentions = {}
+    for tok in doc:
+        if tok.is_title:
+            mentions.setdefault(tok.text, []).append(doc[tok.i:tok.i+1])
+    for n, spans in enumerate(s for s in mentions.values() if len(s) > 1):
+        doc.spans[f"coref_clusters_{n+1}"] = spans
+    return doc
+
+def clusters_of(doc):
+    return [[(span.start, span.end) for span in doc.spans[k]] for k in sorted(doc.spans, key=lambda k: int(k.split("_")[-1]))]
+
+def test_chunked_coref_matches_whole():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("name_coref")
+    rng = random.Random(0)
+    names = ["Smith", "Jones", "Garcia", "Lee"]
+    # every name is in every paragraph, so every cluster runs through the overlaps
+    paras = [
+        " ".join(rng.sample(names + ["said", "the", "car", "was", "there"], 9))
+        for _ in range(20)
+        ]
+    t = "\n".join(paras)
+
+    whole = Attributor()
+    whole.coref_nlp = nlp
+    chunked = Attributor(coref_chunk_tokens=40, coref_overlap=1)
+    chunked.coref_nlp = nlp
+    expected = clusters_of(whole.parse_coref(t))
+    assert clusters_of(chunked.parse_coref(t)) == expected
+    assert [clusters_of(doc) for doc in chunked.pipe_coref(["Smith said Smith left.", t, t[:50]], batch_size=3)] == [
+        clusters_of(whole.parse_coref(t_)) for t_ in ["Smith said Smith left.", t, t[:50]]
+        ]
+    assert chunked.fingerprint != whole.fingerprint
+
+def test_coref_batcher_matches_pipe():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("name_coref")
+    texts = ["Smith said Smith left.", "Jones and Lee met Jones. " * 30, "Nobody."] * 5
+    plain = Attributor()
+    plain.coref_nlp = nlp
+    batched = Attributor(coref_batch_tokens=200)
+    batched.coref_nlp = nlp
+    assert [clusters_of(doc) for doc in batched.pipe_coref(texts)] == [clusters_of(doc) for doc in plain.pipe_coref(texts)]
+    assert batched.coref_batch_report()["docs"] == len(texts)
+    assert plain.coref_batch_report() is None
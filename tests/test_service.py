@@ -0,0 +1,100 @@
+import json
+import socket
+import threading
+import time
+import http.client
+import spacy
+from sayswho.sayswho import Attributor
+from sayswho.service import MicroBatcher, AttributorProcess, make_server, request_items
+
+def blank_attributor(**kwargs):
+    """
+    Attributor with blank pipelines in place of the models: no quotes or clusters, but every step runs.
+    """
+    a = Attributor(ner_nlp=None, **kwargs)
+    a.coref_nlp = spacy.blank("en")
+    a.base_nlp = spacy.blank("en")
+    a.base_nlp.add_pipe("sentencizer")
+    return a
+
+def slow_upper(items):
+    time.sleep(0.05)
+    return [value.upper() for _, value in items]
+
+def test_micro_batcher_coalesces_requests():
+    batcher = MicroBatcher([slow_upper, slow_upper], max_batch=4, max_wait=0.05)
+    results = {}
+    def client(n):
+        results[n] = batcher.map([("text", f"a{n}"), ("text", f"b{n}")])
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    assert results == {n: [f"A{n}", f"B{n}"] for n in range(8)}
+    report = batcher.report()
+    assert report["items"] == 16
+    assert report["mean_batch_size"] > 1
+
+def test_request_items():
+    assert request_items({"text": "x", "doc_ids": ["a", "b"]}) == [("text", "x"), ("doc_id", "a"), ("doc_id", "b")]
+    for bad in [{}, {"texts": [1]}]:
+        try:
+            request_items(bad)
+            assert False
+        except ValueError:
+            pass
+
+def post(conn, body):
+    conn.request("POST", "/attribute", body=json.dumps(body), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def test_http_server():
+    batcher = MicroBatcher([slow_upper], max_wait=0.01)
+    server = make_server(batcher, port=0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*server.server_address[:2])
+        assert post(conn, {"texts": ["one", "two"]})[1]["results"] == ["ONE", "TWO"]
+        assert post(conn, {"nothing": 1})[0] == 400
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+        assert health["status"] == "ok" and health["items"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+def test_unix_socket_server(tmp_path):
+    batcher = MicroBatcher([slow_upper], max_wait=0.01)
+    path = str(tmp_path / "sayswho.sock")
+    server = make_server(batcher, socket_path=path, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert post(UnixConnection(path), {"text": "one"})[1]["results"] == ["ONE"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+def test_attributor_process():
+    worker = AttributorProcess(attributor_factory=blank_attributor)
+    try:
+        results = worker([("text", 'He said "nothing much at all here today."'), ("doc_id", "not-a-doc-id"), ("text", "Second one.")])
+        assert results[0]["text"] == 'He said "nothing much at all here today."'
+        assert results[0]["quotes"] == [] and results[0]["ents"] is None
+        assert "error" in results[1]
+        assert results[2]["text"] == "Second one."
+    finally:
+        worker.close()